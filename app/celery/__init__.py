@@ -1,6 +1,12 @@
 from celery import Celery
+from celery.signals import worker_process_init, setup_logging as celery_setup_logging, task_prerun, task_postrun
 import os
+import asyncio
 from dotenv import load_dotenv
+from app.providers import WARM_UP_PROVIDERS, warm_up
+from app.metrics import queue_depth
+from app.logs import current_job, setup_logging
+from app.usage import flush_usage
 
 load_dotenv()
 REDIS_URI = os.getenv("REDIS_URI", "redis://127.0.0.1:6379/0")
@@ -18,3 +24,37 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
 )
+
+def broker_queue_length(queue: str = "celery") -> int:
+    """Number of tasks waiting in a Redis broker queue"""
+    with celery_app.connection_for_read() as conn:
+        # Fail the scrape quickly when Redis is down instead of retrying the connection
+        conn.ensure_connection(max_retries=1)
+        return conn.default_channel.client.llen(queue)
+
+queue_depth.set_function(broker_queue_length, queue="celery")
+
+@worker_process_init.connect
+def warm_up_worker(**kwargs):
+    """Each worker process connects to the embedding API and Pinecone once, before taking tasks"""
+    if WARM_UP_PROVIDERS:
+        warm_up("embeddings", "vector_store")
+
+@celery_setup_logging.connect
+def configure_worker_logging(**kwargs):
+    """Use the app's queued structured logging instead of Celery's default handlers"""
+    setup_logging()
+
+@worker_process_init.connect
+def restart_log_listener(**kwargs):
+    """The listener thread does not survive the fork into pool processes"""
+    setup_logging()
+
+@task_prerun.connect
+def correlate_task(task_id=None, **kwargs):
+    current_job.set(task_id or "")
+
+@task_postrun.connect
+def flush_task_usage(**kwargs):
+    """Store the embedding and LLM usage of each task once it finishes"""
+    asyncio.run(flush_usage())
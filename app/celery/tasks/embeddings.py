@@ -1,7 +1,8 @@
-from langchain_core.documents import Document
-from app.vector_stores.pinecone import vector_store
+import logging
+from app.vector_stores import pinecone
+
+logger = logging.getLogger(__name__)
 
 def process_embeddings(pdf_id: str, serialized_docs: list[dict]):
-    docs = [Document(**d) for d in serialized_docs]
-    vector_store.add_documents(docs)
-    print(f"✅ Embeddings created for PDF ID {pdf_id}")
\ No newline at end of file
+    pinecone.process_embeddings(pdf_id, serialized_docs)
+    logger.info("Embeddings created", extra={"pdf_id": pdf_id})
\ No newline at end of file
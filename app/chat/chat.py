@@ -1,46 +1,132 @@
-from langchain.chains.history_aware_retriever import create_history_aware_retriever
+import os
+import re
+import threading
+from collections import OrderedDict
 from langchain.chains.retrieval import create_retrieval_chain
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from app.vector_stores.pinecone import build_retriever
 from langchain.memory import ConversationBufferMemory
-from app.llms.chatopenai import build_llm
+from app.llms.chatopenai import build_llm, light_llm
 from app.memories.sql_memory import build_memory
-from langchain_core.runnables import Runnable
+from langchain_core.runnables import Runnable, RunnableBranch
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.retrievers import BaseRetriever
 from langchain_core.language_models import BaseChatModel
 from app.models import ChatArgs
+from app.metrics import record_cache
 from sqlalchemy.orm import Session
-    
-def build_chat(chat_args: ChatArgs, db: Session):
+
+CHAIN_CACHE_SIZE = int(os.getenv("CHAT_CHAIN_CACHE_SIZE", "128"))
+REWRITE_WITH_LIGHT_LLM = os.getenv("CHAT_REWRITE_WITH_LIGHT_LLM", "false").lower() in ("1", "true", "yes")
+MIN_SELF_CONTAINED_WORDS = 6
+
+# Words that usually point back to earlier turns, so the question needs rewriting
+REFERENCE_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "their", "he", "she",
+    "his", "her", "above", "previous", "earlier", "same", "former", "latter", "else", "also",
+    "again", "more", "further", "why", "how",
+}
+
+contextualize_q_prompt = ChatPromptTemplate.from_messages([
+    ("system", "Rewrite follow-up questions to be standalone. Only rewrite if needed."),
+    MessagesPlaceholder("chat_history"),
+    ("human", "{input}"),
+])
+
+qa_prompt = ChatPromptTemplate.from_messages([
+    ("system", "Answer based only on the following context. Don't make things up.\n\n{context}"),
+    MessagesPlaceholder("chat_history"),
+    ("human", "{input}"),
+])
+
+_chain_cache: "OrderedDict[tuple, Runnable]" = OrderedDict()
+_chain_cache_lock = threading.Lock()
+
+def is_self_contained(question: str) -> bool:
+    """Cheap check that a question is long enough and has no words referring to earlier turns"""
+    words = re.findall(r"[a-z']+", question.lower())
+    return len(words) >= MIN_SELF_CONTAINED_WORDS and not REFERENCE_WORDS.intersection(words)
+
+def needs_rewrite(inputs: dict) -> bool:
+    """Only rewrite follow-up questions: skip the first turn and self-contained questions"""
+    return bool(inputs.get("chat_history")) and not is_self_contained(inputs["input"])
+
+def build_history_aware_retriever(llm: BaseChatModel, retriever: BaseRetriever) -> Runnable:
     """
-    Builds a Retrieval-Augmented Generation (RAG) chat pipeline using LangChain components.
-    This includes setting up the LLM, retriever, conversational memory, and history-aware retrieval
-    to support context-rich question answering.
+    Retriever that rewrites the question into a standalone one before retrieval,
+    bypassing the rewrite LLM call when it isn't needed.
+    """
+    rewrite_chain = contextualize_q_prompt | llm | StrOutputParser() | retriever
+    return RunnableBranch(
+        (needs_rewrite, rewrite_chain),
+        (lambda inputs: inputs["input"]) | retriever,
+    ).with_config(run_name="chat_retriever_chain")
+
+def chain_cache_key(chat_args: ChatArgs) -> tuple:
+    """
+    Key identifying the compiled chain for a chat: the llm, retriever and memory
+    components configured for the conversation, the PDF and the streaming mode.
+    """
+    return (
+        getattr(chat_args, "llm", None),
+        getattr(chat_args, "retriever", None),
+        getattr(chat_args, "memory", None),
+        chat_args.pdf_id,
+        chat_args.streaming,
+    )
+
+def build_rag_chain(chat_args: ChatArgs) -> Runnable:
+    """
+    Compiles the Retrieval-Augmented Generation (RAG) chain: the LLM, retriever,
+    history-aware retrieval and the stuff-documents answering chain.
     """
     llm: BaseChatModel = build_llm(chat_args)
     retriever: BaseRetriever = build_retriever(chat_args)
-    memory: ConversationBufferMemory = build_memory(chat_args, db)
 
-    contextualize_q_prompt = ChatPromptTemplate.from_messages([
-        ("system", "Rewrite follow-up questions to be standalone. Only rewrite if needed."),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{input}"),
-    ])
-    history_aware_retriever = create_history_aware_retriever(
-        llm=llm, retriever=retriever, prompt=contextualize_q_prompt
-    )
+    rewrite_llm: BaseChatModel = light_llm if REWRITE_WITH_LIGHT_LLM else llm
 
-    qa_prompt = ChatPromptTemplate.from_messages([
-        ("system", "Answer based only on the following context. Don't make things up.\n\n{context}"),
-        MessagesPlaceholder("chat_history"),
-        ("human", "{input}"),
-    ])
+    history_aware_retriever = build_history_aware_retriever(rewrite_llm, retriever)
     question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
 
-    rag_chain: Runnable = create_retrieval_chain(
+    return create_retrieval_chain(
         retriever=history_aware_retriever,
         combine_docs_chain=question_answer_chain
     )
 
-    return rag_chain, memory
\ No newline at end of file
+def get_rag_chain(chat_args: ChatArgs) -> Runnable:
+    """
+    Returns the compiled RAG chain for the chat arguments, building it on first use
+    and keeping the most recently used chains in an LRU cache.
+    """
+    key = chain_cache_key(chat_args)
+    with _chain_cache_lock:
+        if key in _chain_cache:
+            _chain_cache.move_to_end(key)
+            record_cache("chat_chain", hit=True)
+            return _chain_cache[key]
+
+    record_cache("chat_chain", hit=False)
+    rag_chain = build_rag_chain(chat_args)
+
+    with _chain_cache_lock:
+        _chain_cache[key] = rag_chain
+        _chain_cache.move_to_end(key)
+        while len(_chain_cache) > CHAIN_CACHE_SIZE:
+            _chain_cache.popitem(last=False)
+    return rag_chain
+
+def clear_chain_cache() -> None:
+    with _chain_cache_lock:
+        _chain_cache.clear()
+    
+def build_chat(chat_args: ChatArgs, db: Session):
+    """
+    Builds a Retrieval-Augmented Generation (RAG) chat pipeline using LangChain components.
+    The compiled chain is shared between messages of the same configuration; only the
+    conversational memory is bound per request.
+    """
+    rag_chain: Runnable = get_rag_chain(chat_args)
+    memory: ConversationBufferMemory = build_memory(chat_args, db)
+
+    return rag_chain, memory
@@ -0,0 +1,79 @@
+import os
+from functools import lru_cache
+from typing import List, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHECKLIST_PRESELECTION = os.getenv("CHECKLIST_PRESELECTION", "false").lower() in ("1", "true", "yes")
+
+# Keywords in a document section title that suggest which checklist part (## heading) applies
+SECTION_KEYWORDS = {
+    "TITLE": ["title"],
+    "ABSTRACT": ["abstract", "summary", "highlights"],
+    "INTRODUCTION": ["introduction", "background", "rationale", "objective", "aim"],
+    "METHODS": [
+        "method", "materials", "participants", "patients", "design", "search", "eligibility",
+        "selection", "statistic", "analysis", "data collection", "setting", "procedure", "test",
+    ],
+    "RESULTS": ["result", "finding", "outcome", "characteristics", "accuracy"],
+    "DISCUSSION": ["discussion", "conclusion", "limitation", "interpretation", "implication"],
+    "OTHER INFORMATION": [
+        "funding", "registration", "protocol", "competing", "conflict", "acknowledg", "availability", "support",
+    ],
+}
+
+@lru_cache(maxsize=None)
+def load_checklist(path: str) -> str:
+    """Read a checklist file once, on first use"""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def split_checklist_sections(checklist: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """Split a markdown checklist into its preamble and its top-level (##) sections"""
+
+    preamble = []
+    sections = []
+    for line in checklist.splitlines(keepends=True):
+        if line.startswith("## "):
+            sections.append([line[3:].strip(), line])
+        elif sections:
+            sections[-1][1] += line
+        else:
+            preamble.append(line)
+    return "".join(preamble), [(heading, text) for heading, text in sections]
+
+def match_checklist_headings(section_title: str, headings: List[str]) -> set:
+    """Find the checklist headings that a document section title likely relates to"""
+
+    title = section_title.lower()
+    matched = set()
+    for part, keywords in SECTION_KEYWORDS.items():
+        if any(keyword in title for keyword in keywords):
+            matched.update(heading for heading in headings if part in heading.upper())
+    return matched
+
+def select_checklist_sections(checklist: str, section_titles: List[str]) -> str:
+    """
+    Keep only the checklist sections relevant to the given document section titles.
+    Falls back to the full checklist if any title can't be matched.
+    """
+
+    preamble, sections = split_checklist_sections(checklist)
+    headings = [heading for heading, _ in sections]
+
+    selected = set()
+    for section_title in section_titles:
+        matched = match_checklist_headings(section_title or "", headings)
+        if not matched:
+            return checklist
+        selected.update(matched)
+
+    return preamble + "".join(text for heading, text in sections if heading in selected)
+
+def checklist_for_sections(checklist: str, section_titles: List[str]) -> str:
+    """Return the checklist to send for the given sections, trimmed if pre-selection is enabled"""
+
+    if not CHECKLIST_PRESELECTION:
+        return checklist
+    return select_checklist_sections(checklist, section_titles)
@@ -1,4 +1,6 @@
 import re
+from typing import Literal, Optional
+from pydantic import BaseModel, Field, ValidationError, create_model
 
 criteria_dict = {
     "PICO": ["Population", "Intervention", "Comparison", "Outcome"],
@@ -69,30 +71,77 @@ CRITERIA_GUIDANCE = {
     }
 }
 
-def parse_llm_screening_output(raw: str, criteria: list[str]):
-    """Parse the raw output from LLM screening into a structured format."""
+SCREENING_FIELD_DESCRIPTIONS = {
+    "decision": "Whether the document should be included: Include, Exclude or Unclear.",
+    "confidence": "Confidence in the decision from 1 (low) to 5 (high).",
+    "rationale": "Brief explanation of the decision.",
+}
+
+def criterion_field_name(criterion: str) -> str:
+    """Convert a criterion label (e.g. "Study Design") into a schema field name (e.g. "study_design")"""
+    return re.sub(r"\W+", "_", criterion.lower()).strip("_")
+
+def screening_field_names(criteria: list[str]) -> list[str]:
+    """List the schema field names used for screening with the given criteria"""
+    return ["decision", "confidence", *[criterion_field_name(c) for c in criteria], "rationale"]
+
+def build_screening_schema(criteria: list[str], fields: list[str] | None = None) -> type[BaseModel]:
+    """
+    Build a pydantic model describing the structured screening output for the given criteria.
+    If fields is given, only those fields are included and they are all required.
+    """
     
-    result = {
-        "decision": "Unclear",
-        "confidence": 0,
-        "rationale": "",
-        "criteria_matches": {}
+    definitions = {
+        "decision": Literal["Include", "Exclude", "Unclear"],
+        "confidence": int,
+        "rationale": str,
     }
+    constraints = {"confidence": {"ge": 1, "le": 5}}
+    descriptions = dict(SCREENING_FIELD_DESCRIPTIONS)
+    for crit in criteria:
+        name = criterion_field_name(crit)
+        definitions[name] = str
+        descriptions[name] = f"{crit}: Matched / Not Matched / N/A, followed by a brief summary."
+
+    model_fields = {}
+    for name in fields or screening_field_names(criteria):
+        field_kwargs = {"description": descriptions[name], **constraints.get(name, {})}
+        if fields:
+            model_fields[name] = (definitions[name], Field(..., **field_kwargs))
+        else:
+            model_fields[name] = (Optional[definitions[name]], Field(None, **field_kwargs))
+
+    return create_model("ScreeningResult", __doc__="Screening decision for a document.", **model_fields)
+
+def validate_screening_fields(data: dict | None, criteria: list[str], fields: list[str] | None = None) -> tuple[dict, list[str]]:
+    """
+    Validate structured screening output field by field against the criteria schema.
+    Returns the valid field values and the names of fields that are missing or invalid.
+    """
     
-    decision_match = re.search(r"Decision:\s*(Include|Exclude|Unclear)", raw, re.IGNORECASE)
-    confidence_match = re.search(r"Confidence:\s*(\d)", raw)
-    rationale_match = re.search(r"Rationale:\s*(.+)", raw, re.DOTALL)
+    expected = fields or screening_field_names(criteria)
+    schema = build_screening_schema(criteria)
+    data = {k: v for k, v in (data or {}).items() if k in expected and v not in (None, "")}
 
-    if decision_match:
-        result["decision"] = decision_match.group(1).capitalize()
-    if confidence_match:
-        result["confidence"] = int(confidence_match.group(1))
-    if rationale_match:
-        result["rationale"] = rationale_match.group(1).strip()
+    try:
+        validated = schema.model_validate(data)
+    except ValidationError as e:
+        invalid = {err["loc"][0] for err in e.errors() if err["loc"]}
+        data = {k: v for k, v in data.items() if k not in invalid}
+        validated = schema.model_validate(data)
 
-    for crit in criteria:
-        pattern = rf"{crit}:\s*(.+)"
-        match = re.search(pattern, raw, re.IGNORECASE)
-        result["criteria_matches"][crit] = match.group(1).strip() if match else "N/A"
+    valid = {k: v for k, v in validated.model_dump().items() if k in expected and v is not None}
+    missing = [name for name in expected if name not in valid]
+    return valid, missing
 
-    return result
\ No newline at end of file
+def to_screening_result(fields: dict, criteria: list[str]) -> dict:
+    """Convert validated screening fields into the stored screening result format"""
+    
+    return {
+        "decision": fields.get("decision", "Unclear"),
+        "confidence": fields.get("confidence", 0),
+        "rationale": fields.get("rationale", ""),
+        "criteria_matches": {
+            crit: fields.get(criterion_field_name(crit), "N/A") for crit in criteria
+        },
+    }
@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import hashlib
+import threading
+from array import array
+from typing import Dict, List, Tuple
+from langchain_core.embeddings import Embeddings
+from app.metrics import record_cache
+from app.providers import LazyProvider
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(os.getcwd(), "embeddings.db"))
+
+def content_hash(text: str) -> str:
+    """Hash of a chunk's text with whitespace normalised, used as its vector ID"""
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Persistent content hash -> vector store, plus which PDFs and projects each chunk
+    belongs to. Kept outside the app database so vectors survive a fresh instance.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS vectors ("
+                "model TEXT NOT NULL, content_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, content_hash))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_members ("
+                "content_hash TEXT NOT NULL, pdf_id TEXT NOT NULL, project_id TEXT NOT NULL DEFAULT '', "
+                "shard INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (content_hash, pdf_id))"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunk_members)")}
+            if "shard" not in columns:
+                self._conn.execute("ALTER TABLE chunk_members ADD COLUMN shard INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_chunk_members_pdf_id ON chunk_members (pdf_id)")
+
+    def _select(self, query: str, keys: List[str], *params) -> List[tuple]:
+        rows = []
+        # Stay under SQLite's bound parameter limit
+        for i in range(0, len(keys), 500):
+            batch = keys[i:i + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows.extend(self._conn.execute(query.format(placeholders), (*params, *batch)).fetchall())
+        return rows
+
+    def get_vectors(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        with self._lock:
+            rows = self._select(
+                "SELECT content_hash, vector FROM vectors WHERE model = ? AND content_hash IN ({})", hashes, model
+            )
+        return {content_hash: array("f", blob).tolist() for content_hash, blob in rows}
+
+    def put_vectors(self, model: str, vectors: Dict[str, List[float]]) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO vectors (model, content_hash, vector) VALUES (?, ?, ?)",
+                [(model, content_hash, array("f", vector).tobytes()) for content_hash, vector in vectors.items()],
+            )
+
+    def add_members(self, pdf_id: str, project_id: str, shards: Dict[str, int]) -> None:
+        """Record that a PDF (of a project) contains these chunks, and which vector shard lists it"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO chunk_members (content_hash, pdf_id, project_id, shard) VALUES (?, ?, ?, ?)",
+                [(content_hash, pdf_id, project_id or "", shard) for content_hash, shard in shards.items()],
+            )
+
+    def members(self, hashes: List[str], exclude_pdf: str | None = None) -> Dict[str, Dict[int, Tuple[List[str], List[str]]]]:
+        """Per chunk, each shard's (pdf IDs, project IDs), sorted for stable metadata"""
+        with self._lock:
+            rows = self._select(
+                "SELECT content_hash, shard, pdf_id, project_id FROM chunk_members WHERE content_hash IN ({})", hashes
+            )
+        shards: Dict[str, Dict[int, Tuple[set, set]]] = {content_hash: {} for content_hash in hashes}
+        for content_hash, shard, pdf_id, project_id in rows:
+            if pdf_id == exclude_pdf:
+                continue
+            pdfs, projects = shards[content_hash].setdefault(shard, (set(), set()))
+            pdfs.add(pdf_id)
+            if project_id:
+                projects.add(project_id)
+        return {
+            content_hash: {shard: (sorted(pdfs), sorted(projects)) for shard, (pdfs, projects) in sorted(by_shard.items())}
+            for content_hash, by_shard in shards.items()
+        }
+
+    def pdf_shards(self, pdf_id: str) -> Dict[str, int]:
+        """Content hash -> vector shard of each chunk the PDF contains"""
+        with self._lock:
+            return dict(self._conn.execute(
+                "SELECT content_hash, shard FROM chunk_members WHERE pdf_id = ?", (pdf_id,)
+            ).fetchall())
+
+    def member_pdf_ids(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT DISTINCT pdf_id FROM chunk_members")}
+
+    def remove_members(self, pdf_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunk_members WHERE pdf_id = ?", (pdf_id,))
+
+    def prune_vectors(self) -> int:
+        """Drop cached vectors that no PDF contains any more; returns how many were removed"""
+        with self._lock:
+            with self._conn:
+                removed = self._conn.execute(
+                    "DELETE FROM vectors WHERE content_hash NOT IN (SELECT content_hash FROM chunk_members)"
+                ).rowcount
+            if removed:
+                self._conn.execute("VACUUM")
+        return removed
+
+    def clear_members(self) -> None:
+        """Forget all membership, e.g. after the vector index is wiped; cached vectors are kept"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunk_members")
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeds each distinct chunk text once: vectors are looked up by content hash and
+    only unseen texts are sent to the wrapped embeddings. Queries are not cached.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: "EmbeddingCache | LazyProvider"):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = getattr(embeddings, "model", "unknown")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [content_hash(text) for text in texts]
+        vectors = self.cache.get_vectors(self.model, list(dict.fromkeys(hashes)))
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(hashes, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        record_cache("embedding", hit=True, count=len(texts) - len(missing))
+        record_cache("embedding", hit=False, count=len(missing))
+
+        if missing:
+            embedded = dict(zip(missing, self.embeddings.embed_documents(list(missing.values()))))
+            self.cache.put_vectors(self.model, embedded)
+            vectors.update(embedded)
+        return [vectors[key] for key in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+embedding_cache = LazyProvider("embedding_cache", EmbeddingCache)
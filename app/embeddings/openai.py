@@ -1,5 +1,41 @@
-from langchain_openai import OpenAIEmbeddings
+import time
+from typing import List
 from dotenv import load_dotenv
+from langchain_core.embeddings import Embeddings
+from app.providers import LazyProvider
+from app.metrics import record_llm_call
+from app.tokens import count_tokens
+from app.embeddings.cache import CachedEmbeddings, embedding_cache
 load_dotenv()
 
-embeddings = OpenAIEmbeddings()
\ No newline at end of file
+class InstrumentedEmbeddings(Embeddings):
+    """
+    Counts the tokens sent to the embedding API (it does not report usage itself)
+    so embedding cost is accounted alongside LLM calls.
+    """
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", "unknown")
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start = time.perf_counter()
+        vectors = self.embeddings.embed_documents(texts)
+        record_llm_call("embed_documents", self.model, sum(count_tokens(text) for text in texts), 0, time.perf_counter() - start)
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        start = time.perf_counter()
+        vector = self.embeddings.embed_query(text)
+        record_llm_call("embed_query", self.model, count_tokens(text), 0, time.perf_counter() - start)
+        return vector
+
+def wrap_embeddings(inner: Embeddings) -> Embeddings:
+    """Usage accounting and the content-hash cache around an embedding client"""
+    return CachedEmbeddings(InstrumentedEmbeddings(inner), embedding_cache)
+
+def build_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    return wrap_embeddings(OpenAIEmbeddings())
+
+embeddings = LazyProvider("embeddings", build_embeddings)
@@ -1,4 +1,4 @@
-import time
+import logging
 from dotenv import load_dotenv
 from langchain.prompts import PromptTemplate
 from typing import List, Dict
@@ -6,8 +6,12 @@ from langchain_core.documents import Document
 from app.vector_stores.pinecone import vector_store
 from app.llms.chatopenai import light_llm
 from app.criteria.criteria import CRITERIA_GUIDANCE
+from app.metrics import attributed_to, instrument_chain, timed
+from app.logs import sampled
 from web.db.models.pdf import Pdf
 
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 prompt_template = PromptTemplate.from_template(
@@ -25,7 +29,7 @@ Answer:
 """
 )
 
-evidence_table_chain = prompt_template | light_llm
+evidence_table_chain = instrument_chain(prompt_template | light_llm, "evidence_table")
 
 async def extract_component(element: str, docs: List[Document], fallback_docs: List[Document], k: int = 5) -> str:
     """Extract a summary of a specific criteria component from the provided chunks"""
@@ -46,42 +50,43 @@ async def extract_component(element: str, docs: List[Document], fallback_docs: L
         })
         return response.content.strip()
     except Exception as e:
-        print(f"Error extracting '{element}': {e}")
+        logger.exception("Error extracting %s", element)
         return "Extraction failed."
 
+@timed("evidence_table")
 async def create_evidence_table(pdfs: Dict[str, Pdf], criteria: List[str], k: int = 5) -> List[dict]:
     """Create an evidence table from the provided PDFs based on specified criteria"""
     
     all_data = []
-    start_time = time.perf_counter()
-    print(f"Creating evidence table for {len(pdfs)} PDFs with criteria: {criteria}")
+    logger.info("Creating evidence table for %d PDFs", len(pdfs), extra={"criteria": criteria})
 
     for pdf_id, pdf_obj in pdfs.items():
-        print(f"\n Processing: {pdf_id}")
-        entry = {
-            "Document": pdf_obj.title or pdf_obj.name or pdf_id
-        }
-
-        try:
-            fallback_docs = vector_store.similarity_search("full text", k=100, filter={"pdf_id": pdf_id})
-        except Exception as e:
-            print(f"Failed to load full document for {pdf_id}: {e}")
-            fallback_docs = []
-
-        for element in criteria:
-            guidance = CRITERIA_GUIDANCE.get(element, {})
-            query = guidance.get("query", f"{element} of the study")
-            print(f"Querying: {query}")
+        with attributed_to(pdf_id=pdf_id):
+            logger.debug("Extracting evidence", extra={"pdf_id": pdf_id})
+            entry = {
+                "Document": pdf_obj.title or pdf_obj.name or pdf_id
+            }
 
             try:
-                docs = vector_store.similarity_search(query=query, k=k, filter={"pdf_id": pdf_id})
-                print(f"Retrieved {len(docs)} chunks")
+                fallback_docs = vector_store.similarity_search("full text", k=100, filter={"pdf_id": pdf_id})
             except Exception as e:
-                print(f"Error during similarity search: {e}")
-                docs = []
+                logger.warning("Failed to load full document for %s: %s", pdf_id, e)
+                fallback_docs = []
+
+            for element in criteria:
+                guidance = CRITERIA_GUIDANCE.get(element, {})
+                query = guidance.get("query", f"{element} of the study")
+
+                try:
+                    docs = vector_store.similarity_search(query=query, k=k, filter={"pdf_id": pdf_id})
+                    logger.debug("Retrieved %d chunks for %s", len(docs), element,
+                                 extra={**sampled(), "pdf_id": pdf_id, "query": query})
+                except Exception as e:
+                    logger.warning("Similarity search failed for %s: %s", pdf_id, e)
+                    docs = []
 
-            summary = await extract_component(element, docs, fallback_docs, k)
-            entry[element] = summary
+                summary = await extract_component(element, docs, fallback_docs, k)
+                entry[element] = summary
 
         all_data.append(entry)
 
@@ -89,8 +94,6 @@ async def create_evidence_table(pdfs: Dict[str, Pdf], criteria: List[str], k: in
     #     json.dump(all_data, f, indent=2)
 
     # print("Evidence table written to evidence_table.json")
-    end_time = time.perf_counter() - start_time
-    # print(f"Evidence table created in {end_time:.2f} seconds for {len(pdfs)} PDFs.")
     return all_data
 
         
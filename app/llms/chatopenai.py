@@ -1,8 +1,48 @@
-from langchain_openai import ChatOpenAI
+from typing import Any, AsyncIterator, Iterator, Optional
+from langchain_core.runnables import Runnable, RunnableConfig
+from app.providers import LazyProvider
 
-light_llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0, max_tokens=4000)
-strong_llm = ChatOpenAI(model="gpt-4-turbo", temperature=0, max_tokens=4000)
+def chat_openai(**kwargs):
+    """
+    Factory for ChatOpenAI clients; the import is deferred until a client is needed.
+    Streams report token usage on their final chunk so streamed calls are costed too.
+    """
+    def build():
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(**{"stream_usage": True, **kwargs})
+    return build
+
+class LazyChatModel(Runnable):
+    """
+    Runnable stand-in for a chat model that constructs the client on first use, so
+    chains can still be composed at module level (prompt | light_llm) without
+    creating API clients at import time.
+    """
+
+    def __init__(self, name: str, factory):
+        self.provider = LazyProvider(name, factory)
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return self.provider.get().invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Any:
+        return await self.provider.get().ainvoke(input, config, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> Iterator[Any]:
+        yield from self.provider.get().stream(input, config, **kwargs)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs: Any) -> AsyncIterator[Any]:
+        async for chunk in self.provider.get().astream(input, config, **kwargs):
+            yield chunk
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__") or name == "provider":
+            raise AttributeError(name)
+        return getattr(self.provider.get(), name)
+
+light_llm = LazyChatModel("light_llm", chat_openai(model="gpt-3.5-turbo", temperature=0, max_tokens=4000))
+strong_llm = LazyChatModel("strong_llm", chat_openai(model="gpt-4-turbo", temperature=0, max_tokens=4000))
 
 def build_llm(chat_args):
     """Helper function to build an LLM instance with given arguments."""
-    return ChatOpenAI()
\ No newline at end of file
+    return chat_openai(streaming=chat_args.streaming)()
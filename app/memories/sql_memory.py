@@ -1,17 +1,81 @@
+import logging
+import os
+import asyncio
 from langchain.memory import ConversationBufferMemory
 from langchain.schema import BaseChatMessageHistory
-from web.api import get_messages_by_conversation_id, add_message_to_conversation
+from langchain.schema.messages import SystemMessage
+from langchain.prompts import PromptTemplate
+from web.api import (
+    get_messages_by_conversation_id, add_message_to_conversation, get_messages_outside_window,
+    get_conversation_summary, set_conversation_summary
+)
+from app.llms.chatopenai import light_llm
+from app.metrics import instrument_chain
+from app.tokens import count_tokens
 from sqlalchemy.orm import Session
+from web.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+HISTORY_WINDOW_MESSAGES = int(os.getenv("CHAT_HISTORY_WINDOW", "10"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+HISTORY_SUMMARY = os.getenv("CHAT_HISTORY_SUMMARY", "false").lower() in ("1", "true", "yes")
+SUMMARY_BATCH_MESSAGES = 4
+
+history_summary_prompt = PromptTemplate(
+    input_variables=["summary", "messages"],
+    template="""
+Update the running summary of a conversation about a research paper with the new messages below.
+Keep facts, numbers and open questions the user may refer back to. Write at most 8 sentences.
+
+Current Summary:
+{summary}
+
+New Messages:
+{messages}
+
+Updated Summary:
+"""
+)
+
+history_summary_chain = instrument_chain(history_summary_prompt | light_llm, "history_summary")
+
+def trim_to_token_budget(messages: list, max_tokens: int) -> list:
+    """Keep the most recent messages whose combined size fits within the token budget"""
+    
+    kept = []
+    total = 0
+    for message in reversed(messages):
+        total += count_tokens(message.content)
+        if total > max_tokens and kept:
+            break
+        kept.append(message)
+    return list(reversed(kept))
 
 class SQLMessageHistory(BaseChatMessageHistory):
-    """SQL-based message history for LangChain conversations"""
-    def __init__(self, conversation_id: str, db: Session):
+    """
+    SQL-based message history for LangChain conversations. Only the most recent
+    messages within a window and token budget are loaded, preceded by the rolling
+    summary of older turns if one has been stored.
+    """
+    def __init__(
+        self, conversation_id: str, db: Session,
+        window: int = HISTORY_WINDOW_MESSAGES, max_tokens: int = HISTORY_TOKEN_BUDGET
+    ):
         self.conversation_id = conversation_id
         self.db = db
+        self.window = window
+        self.max_tokens = max_tokens
     
     @property
     def messages(self):
-        return get_messages_by_conversation_id(self.conversation_id, self.db)
+        messages = get_messages_by_conversation_id(self.conversation_id, self.db, limit=self.window)
+        messages = trim_to_token_budget(messages, self.max_tokens)
+
+        summary, _ = get_conversation_summary(self.db, self.conversation_id)
+        if summary:
+            messages = [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] + messages
+        return messages
     
     def add_message(self, message):
         return add_message_to_conversation(
@@ -23,6 +87,39 @@ class SQLMessageHistory(BaseChatMessageHistory):
         
     def clear(self):
         pass
+
+async def update_history_summary(conversation_id: str, window: int = HISTORY_WINDOW_MESSAGES):
+    """
+    Folds messages that have dropped out of the history window into the conversation's
+    rolling summary, once enough of them have accumulated. The queries run in a worker
+    thread on their own session so the event loop is never blocked.
+    """
+    if not HISTORY_SUMMARY:
+        return
+
+    db = SessionLocal()
+    try:
+        summary, summarised_until = await asyncio.to_thread(get_conversation_summary, db, conversation_id)
+        older_messages = await asyncio.to_thread(
+            get_messages_outside_window, conversation_id, db, window, after=summarised_until
+        )
+        if len(older_messages) < SUMMARY_BATCH_MESSAGES:
+            return
+
+        transcript = "\n".join(f"{m.role}: {m.content}" for m in older_messages)
+        try:
+            response = await history_summary_chain.ainvoke({
+                "summary": summary or "None yet.",
+                "messages": transcript
+            })
+        except Exception as e:
+            logger.warning("Error updating history summary for %s: %s", conversation_id, e)
+            return
+        await asyncio.to_thread(
+            set_conversation_summary, db, conversation_id, response.content.strip(), older_messages[-1].created_on
+        )
+    finally:
+        db.close()
     
 def build_memory(chat_args, db: Session):
     """
@@ -36,4 +133,4 @@ def build_memory(chat_args, db: Session):
         memory_key="chat_history",
         return_messages=True,
         output_key="answer",
-    )
\ No newline at end of file
+    )
@@ -0,0 +1,284 @@
+import logging
+import os
+import time
+import bisect
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Tuple
+from app.usage import current_pdf, ledger
+
+logger = logging.getLogger(__name__)
+
+METRICS_PROJECT_LABELS = os.getenv("METRICS_PROJECT_LABELS", "true").lower() in ("1", "true", "yes")
+OTEL_TRACING = os.getenv("OTEL_TRACING", "false").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Project being processed by the current task, used to label per-project metrics
+current_project: ContextVar[str] = ContextVar("current_project", default="")
+# Innermost pipeline stage running in the current task, used to attribute LLM usage
+current_stage: ContextVar[str] = ContextVar("current_stage", default="")
+
+_tracer = None
+if OTEL_TRACING:
+    try:
+        from opentelemetry import trace
+        _tracer = trace.get_tracer("systematic_review")
+    except ImportError:
+        logger.warning("OTEL_TRACING is set but opentelemetry is not installed; tracing disabled")
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class Metric:
+    """Minimal labelled metric rendered in the Prometheus text exposition format"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def format_labels(self, key: Tuple[str, ...], extra: dict | None = None) -> str:
+        pairs = list(zip(self.labels, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{escape_label(v)}"' for k, v in pairs) + "}"
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, self.format_labels(key), value) for key, value in self._values.items()]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{name}{labels} {value}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._functions = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, func, **labels) -> None:
+        """Read the value from func at scrape time, e.g. the length of a broker queue"""
+        with self._lock:
+            self._functions[self.key(labels)] = func
+
+    def samples(self):
+        with self._lock:
+            functions = list(self._functions.items())
+        for key, func in functions:
+            try:
+                value = func()
+            except Exception as e:
+                logger.warning("Failed to read gauge %s: %s", self.name, e)
+                continue
+            with self._lock:
+                self._values[key] = value
+        return super().samples()
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = list(self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", self.format_labels(key, {"le": bound}), cumulative))
+            samples.append((f"{self.name}_sum", self.format_labels(key), round(total, 6)))
+            samples.append((f"{self.name}_count", self.format_labels(key), cumulative))
+        return samples
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """(count, sum) of the observations per label values"""
+        with self._lock:
+            return {key: (sum(counts), total) for key, (counts, total) in self._values.items()}
+
+_registry: Dict[str, Metric] = {}
+
+stage_latency = Histogram("pipeline_stage_seconds", "Wall time of pipeline stages", ("stage", "project"))
+stage_errors = Counter("pipeline_stage_errors_total", "Pipeline stages that raised", ("stage", "project"))
+stage_inflight = Gauge("pipeline_stage_inflight", "Pipeline stages currently running", ("stage",))
+llm_calls = Counter("llm_calls_total", "LLM calls per chain and model", ("chain", "model"))
+llm_tokens = Counter("llm_tokens_total", "LLM tokens per chain, model and direction", ("chain", "model", "kind"))
+llm_latency = Histogram("llm_call_seconds", "Latency of LLM calls per chain", ("chain",))
+queue_depth = Gauge("queue_depth", "Tasks waiting in a work queue", ("queue",))
+cache_requests = Counter("cache_requests_total", "Cache lookups by cache and result", ("cache", "result", "project"))
+
+def project_label() -> str:
+    return current_project.get() if METRICS_PROJECT_LABELS else ""
+
+@contextmanager
+def span(stage: str, **attributes):
+    """Time a block as a pipeline stage, counting failures and in-flight work"""
+    project = project_label()
+    stage_inflight.inc(stage=stage)
+    stage_token = current_stage.set(stage)
+    start = time.perf_counter()
+    otel_span = _tracer.start_as_current_span(stage, attributes=attributes) if _tracer else None
+    if otel_span:
+        otel_span.__enter__()
+    exc_info = (None, None, None)
+    try:
+        yield
+    except BaseException as e:
+        exc_info = (type(e), e, e.__traceback__)
+        stage_errors.inc(stage=stage, project=project)
+        raise
+    finally:
+        if otel_span:
+            # Passing the exception marks the span as failed and records it as an event
+            otel_span.__exit__(*exc_info)
+        current_stage.reset(stage_token)
+        stage_inflight.dec(stage=stage)
+        stage_latency.observe(time.perf_counter() - start, stage=stage, project=project)
+
+@contextmanager
+def attributed_to(project_id: str | None = None, pdf_id: str | None = None):
+    """Attribute the metrics, logs and LLM usage of a block to a project and/or PDF"""
+    tokens = []
+    if project_id:
+        tokens.append((current_project, current_project.set(project_id)))
+    if pdf_id:
+        tokens.append((current_pdf, current_pdf.set(pdf_id)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+def timed(stage: str):
+    """Decorator form of span() for sync and async functions"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def usage_from_message(message) -> Tuple[int, int]:
+    """Prompt and completion token counts reported on an LLM response, if any"""
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+
+def model_from_message(message) -> str:
+    return (getattr(message, "response_metadata", None) or {}).get("model_name", "unknown")
+
+def record_llm_call(chain: str, model: str, prompt_tokens: int, completion_tokens: int, seconds: float) -> None:
+    """Count an LLM or embedding call and add its tokens to the project's usage ledger"""
+    llm_calls.inc(chain=chain, model=model)
+    llm_tokens.inc(prompt_tokens, chain=chain, model=model, kind="prompt")
+    llm_tokens.inc(completion_tokens, chain=chain, model=model, kind="completion")
+    llm_latency.observe(seconds, chain=chain)
+    ledger.record(current_project.get(), current_pdf.get(), current_stage.get() or chain, model,
+                  prompt_tokens, completion_tokens)
+
+def record_cache(cache: str, hit: bool, count: int = 1) -> None:
+    if count:
+        cache_requests.inc(count, cache=cache, result="hit" if hit else "miss", project=project_label())
+
+class InstrumentedChain:
+    """
+    Wraps a prompt | llm chain so each call is counted and timed under the chain's name,
+    with the model and token usage read from the response. Other attributes pass through.
+    Structured chains are built with include_raw=True: usage is read from the raw
+    message and only the parsed output is returned.
+    """
+
+    def __init__(self, chain, name: str, structured: bool = False):
+        self.chain = chain
+        self.name = name
+        self.structured = structured
+
+    def record(self, result, seconds: float):
+        message = result.get("raw") if self.structured and isinstance(result, dict) else result
+        record_llm_call(self.name, model_from_message(message), *usage_from_message(message), seconds)
+        if self.structured and isinstance(result, dict):
+            return result.get("parsed")
+        return result
+
+    async def ainvoke(self, *args, **kwargs):
+        start = time.perf_counter()
+        result = await self.chain.ainvoke(*args, **kwargs)
+        return self.record(result, time.perf_counter() - start)
+
+    def invoke(self, *args, **kwargs):
+        start = time.perf_counter()
+        result = self.chain.invoke(*args, **kwargs)
+        return self.record(result, time.perf_counter() - start)
+
+    async def astream(self, *args, **kwargs):
+        start = time.perf_counter()
+        model, prompt_tokens, completion_tokens = "unknown", 0, 0
+        async for chunk in self.chain.astream(*args, **kwargs):
+            chunk_prompt, chunk_completion = usage_from_message(chunk)
+            prompt_tokens += chunk_prompt
+            completion_tokens += chunk_completion
+            model = model_from_message(chunk) if model == "unknown" else model
+            yield chunk
+        record_llm_call(self.name, model, prompt_tokens, completion_tokens, time.perf_counter() - start)
+
+    def __getattr__(self, name: str):
+        if name.startswith("__") or name == "chain":
+            raise AttributeError(name)
+        return getattr(self.chain, name)
+
+def instrument_chain(chain, name: str, structured: bool = False) -> InstrumentedChain:
+    return InstrumentedChain(chain, name, structured)
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in _registry.values()) + "\n"
@@ -0,0 +1,73 @@
+import logging
+import os
+import time
+import threading
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_PROVIDERS = os.getenv("WARM_UP_PROVIDERS", "true").lower() in ("1", "true", "yes")
+
+_providers: Dict[str, "LazyProvider"] = {}
+
+class LazyProvider:
+    """
+    Builds an expensive resource (API client, remote index) on first use and caches it.
+    Attribute access is forwarded to the resource, so a provider can stand in for it
+    at module level without anything being constructed at import time.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self._name = name
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+        _providers[name] = self
+
+    def get(self) -> Any:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    self._instance = self._factory()
+                    logger.info("Initialised %s in %.2fs", self._name, time.perf_counter() - start)
+        return self._instance
+
+    @property
+    def initialised(self) -> bool:
+        return self._instance is not None
+
+    def override(self, instance: Any) -> None:
+        """Use the given object instead of building the resource (benchmarks, local runs)"""
+        with self._lock:
+            self._instance = instance
+
+    def reset(self) -> None:
+        with self._lock:
+            self._instance = None
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("__") or name in ("_name", "_factory", "_instance", "_lock"):
+            raise AttributeError(name)
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        state = "initialised" if self.initialised else "not initialised"
+        return f"<LazyProvider {self._name} ({state})>"
+
+def get_provider(name: str) -> LazyProvider:
+    return _providers[name]
+
+def warm_up(*names: str) -> None:
+    """
+    Initialise the given providers (all registered ones by default) ahead of the first
+    request. Failures are logged rather than raised so the app can still start offline.
+    """
+    for name in names or list(_providers):
+        provider = _providers.get(name)
+        if provider is None:
+            continue
+        try:
+            provider.get()
+        except Exception as e:
+            logger.warning("Failed to initialise %s: %s", name, e)
@@ -1,5 +1,7 @@
+import logging
 import os
 import time
+import aiofiles
 from dotenv import load_dotenv
 import asyncio
 from typing import List
@@ -7,14 +9,20 @@ from collections import defaultdict
 from langchain_core.documents import Document
 from langchain.prompts import PromptTemplate
 from app.llms.chatopenai import light_llm, strong_llm
+from app.checklist_selection import checklist_for_sections, load_checklist
+from app.metrics import instrument_chain, timed
+from app.tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 CHECKLIST_DIR = "app/checklists"
 STARD_CHECKLIST_PATH = os.path.join(CHECKLIST_DIR, "stard.md")
-
-with open(STARD_CHECKLIST_PATH, "r", encoding="utf-8") as f:
-    stard_checklist = f.read()
+PARTIAL_FLUSH_CHARS = 200
+REDUCE_GROUP_TOKENS = 6000
+FINAL_REDUCE_TOKENS = 8000
+MAX_REDUCE_LEVELS = 4
 
 chunk_summary_prompt = PromptTemplate(
     input_variables=["text"],
@@ -32,7 +40,7 @@ Chunk:
 """
 )
 
-chunk_summary_chain = chunk_summary_prompt | light_llm
+chunk_summary_chain = instrument_chain(chunk_summary_prompt | light_llm, "chunk_summary")
 
 section_summary_prompt = PromptTemplate(
     input_variables=["section_title", "summaries"],
@@ -54,32 +62,53 @@ Summaries:
 """
 )
 
-section_summary_chain = section_summary_prompt | strong_llm
+section_summary_chain = instrument_chain(section_summary_prompt | strong_llm, "section_summary")
+
+section_merge_prompt = PromptTemplate(
+    input_variables=["summaries"],
+    template="""
+You are condensing several section summaries of a diagnostic accuracy paper into one shorter summary.
+
+Summarisation Rules:
+- Keep every <h2> section heading, in the original order.
+- Keep 2-4 of the most important <li> points under each heading.
+- Preserve numbers, sample sizes and accuracy measures exactly.
+- Output raw HTML only.
 
+Section Summaries:
+
+{summaries}
+"""
+)
+
+section_merge_chain = instrument_chain(section_merge_prompt | strong_llm, "section_merge")
+
+# The checklist and instructions come first so the shared prefix can be served
+# from the provider's prompt cache; per-document input goes last.
 document_reduce_prompt = PromptTemplate(
     input_variables=["text", "main_title", "checklist"],
     template="""
 You are writing a structured narrative summary of a diagnostic accuracy paper using the STARD checklist as a guide.
 
+Checklist Structure:
+{checklist}
+
 Instructions:
-- Use the structure of the STARD checklist provided below.
+- Use the structure of the STARD checklist provided above.
 - Summarise each applicable section based on the content.
 - Ignore checklist items not covered in the summaries.
 - Do not repeat the checklist verbatim.
 - Do not critique or evaluate — focus on reporting what is present.
-- Output only valid raw HTML.
+- Output only valid raw HTML, beginning with the title heading below.
 
 <h1>{main_title}</h1>
 
-Checklist Structure:
-{checklist}
-
 Section Summaries:
 {text}
 """
 )
 
-document_reduce_chain = document_reduce_prompt | strong_llm
+document_reduce_chain = instrument_chain(document_reduce_prompt | strong_llm, "document_reduce")
 
 def group_doc_by_section(docs: List[Document]):
     """Group documents by their section titles"""
@@ -89,41 +118,136 @@ def group_doc_by_section(docs: List[Document]):
         section_map[doc.metadata.get("section_title", "Unknown Section")].append(doc)
     return section_map.values()
 
-async def llm_summary(sections: List[Document]):
-    """Generate a structured summary of the provided sections using LLMs"""
+async def write_partial_summary(partial_path: str, html: str):
+    """Persist the summary generated so far so it can be shown while streaming"""
     
-    start_time = time.perf_counter()
-    print(f"Summarising {len(sections)} sections...")
-    section_summaries = []
-
-    for section_docs in group_doc_by_section(sections):
-        section_title = section_docs[0].metadata["section_title"]
+    async with aiofiles.open(partial_path, 'w', encoding='utf-8') as f:
+        await f.write(html)
 
-        chunk_tasks = [
-            chunk_summary_chain.ainvoke({"text": doc.page_content})
-            for doc in section_docs
-        ]
-        chunk_summaries = await asyncio.gather(*chunk_tasks)
-        merged_chunk_text = "\n".join([r.content for r in chunk_summaries])
+async def stream_document_reduce(inputs: dict, partial_path: str) -> str:
+    """Stream the document reduce step, flushing the partial HTML to disk as tokens arrive"""
+    
+    parts = []
+    unflushed = 0
+    async for chunk in document_reduce_chain.astream(inputs):
+        parts.append(chunk.content)
+        unflushed += len(chunk.content)
+        if unflushed >= PARTIAL_FLUSH_CHARS:
+            await write_partial_summary(partial_path, "".join(parts))
+            unflushed = 0
+
+    final_html = "".join(parts)
+    await write_partial_summary(partial_path, final_html)
+    return final_html
+
+def group_by_token_budget(texts: List[str], max_tokens: int) -> List[List[str]]:
+    """Greedily pack consecutive texts into groups that stay within a token budget"""
+    
+    groups = []
+    current = []
+    current_tokens = 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and current_tokens + tokens > max_tokens:
+            groups.append(current)
+            current = []
+            current_tokens = 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+async def merge_summary_group(group: List[str], max_tokens: int = REDUCE_GROUP_TOKENS) -> str:
+    """Merge a group of section summaries into one condensed summary"""
+    
+    # A lone summary is condensed on its own only if it is over the group budget
+    if len(group) == 1 and count_tokens(group[0]) <= max_tokens:
+        return group[0]
+    merged = await section_merge_chain.ainvoke({"summaries": "\n\n".join(group)})
+    return merged.content
+
+async def tree_reduce_summaries(
+    summaries: List[str],
+    group_tokens: int = REDUCE_GROUP_TOKENS,
+    final_tokens: int = FINAL_REDUCE_TOKENS,
+    max_levels: int = MAX_REDUCE_LEVELS,
+) -> List[str]:
+    """
+    Hierarchically merge section summaries in token-bounded groups until the combined
+    text fits the final reduce budget. Groups at each level are merged concurrently.
+    If merging stops making progress or runs out of levels, each summary is truncated
+    to an equal share of the budget, so the final reduce input is always bounded.
+    """
+    
+    for level in range(max_levels):
+        if count_tokens("\n\n".join(summaries)) <= final_tokens:
+            return list(summaries)
+        groups = group_by_token_budget(summaries, group_tokens)
+        if len(groups) == len(summaries) and all(count_tokens(s) <= group_tokens for s in summaries):
+            break
+        logger.debug("Reduce level %d: merging %d summaries into %d groups", level + 1, len(summaries), len(groups))
+        summaries = await asyncio.gather(*[merge_summary_group(group, group_tokens) for group in groups])
+
+    if count_tokens("\n\n".join(summaries)) <= final_tokens:
+        return list(summaries)
+    # One token of each share is left for the separator
+    share = max(1, final_tokens // len(summaries) - 1)
+    logger.warning("Truncating %d section summaries to %d tokens each to fit the final reduce", len(summaries), share)
+    return [truncate_tokens(summary, share) for summary in summaries]
+
+async def summarise_section(section_docs: List[Document]) -> str:
+    """Summarise the chunks of one section, then merge them into a section summary"""
+    
+    section_title = section_docs[0].metadata["section_title"]
+
+    chunk_tasks = [
+        chunk_summary_chain.ainvoke({"text": doc.page_content})
+        for doc in section_docs
+    ]
+    chunk_summaries = await asyncio.gather(*chunk_tasks)
+    merged_chunk_text = "\n".join([r.content for r in chunk_summaries])
+
+    section_summary = await section_summary_chain.ainvoke({
+        "section_title": section_title,
+        "summaries": merged_chunk_text
+    })
+    return section_summary.content
+
+@timed("summarise")
+async def llm_summary(sections: List[Document], partial_path: str | None = None):
+    """
+    Generate a structured summary of the provided sections using LLMs.
+    Long documents are reduced hierarchically before the final STARD reduce step.
+    If a partial_path is given, the final reduce step is streamed and the HTML
+    generated so far is written to that path as it arrives.
+    """
+    
+    logger.info("Summarising %d sections", len(sections))
 
-        section_summary = await section_summary_chain.ainvoke({
-            "section_title": section_title,
-            "summaries": merged_chunk_text
-        })
+    if partial_path:
+        await write_partial_summary(partial_path, "")
 
-        section_summaries.append(section_summary.content)
+    section_summaries = await asyncio.gather(*[
+        summarise_section(section_docs) for section_docs in group_doc_by_section(sections)
+    ])
+    section_summaries = await tree_reduce_summaries(list(section_summaries))
 
-    final_document_html = await document_reduce_chain.ainvoke({
+    section_titles = list(dict.fromkeys(doc.metadata.get("section_title", "Unknown Section") for doc in sections))
+    reduce_inputs = {
         "text": "\n\n".join(section_summaries),
         "main_title": sections[0].metadata.get("main_title", "Untitled Document"),
-        "checklist": stard_checklist
-    })
+        "checklist": checklist_for_sections(load_checklist(STARD_CHECKLIST_PATH), section_titles)
+    }
+
+    if partial_path:
+        final_document_html = await stream_document_reduce(reduce_inputs, partial_path)
+    else:
+        final_document_html = (await document_reduce_chain.ainvoke(reduce_inputs)).content
     
-    print(f"Document summarised")
-    end_time = time.perf_counter() - start_time
-    # print(f"Summary completed in {end_time:.2f} seconds.")
+    logger.info("Document summarised")
 
-    return final_document_html.content
+    return final_document_html
 
 # async def process_single_pdf(file_path: str, docs: List[Document]) -> str:
 #     base_name = os.path.splitext(os.path.basename(file_path))[0]
@@ -1,3 +1,4 @@
+import logging
 import os
 import asyncio
 import aiofiles
@@ -5,29 +6,45 @@ import time
 import json
 from dotenv import load_dotenv
 from langchain.prompts import PromptTemplate
-from typing import List
+from typing import Awaitable, Callable, List
 from collections import defaultdict
 from langchain_core.documents import Document
-from collections import defaultdict
 from app.vector_stores.pinecone import vector_store
 from app.stard_summary import llm_summary, group_doc_by_section
-from app.criteria.criteria import parse_llm_screening_output
+from app.checklist_selection import checklist_for_sections, load_checklist
+from app.criteria.criteria import (
+    build_screening_schema, criterion_field_name, to_screening_result, validate_screening_fields
+)
 from app.llms.chatopenai import light_llm, strong_llm
+from app.metrics import attributed_to, instrument_chain, timed
+from app.usage import flush_usage
+from app.logs import sampled
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 CHECKLIST_DIR = "app/checklists"
 PRISMA_CHECKLIST_PATH = os.path.join(CHECKLIST_DIR, "prisma.md")
 
-with open(PRISMA_CHECKLIST_PATH, "r", encoding="utf-8") as f:
-    prisma_checklist = f.read()
+CASCADE_SCREENING = os.getenv("CASCADE_SCREENING", "false").lower() in ("1", "true", "yes")
+PRESCREEN_CONFIDENCE_THRESHOLD = int(os.getenv("PRESCREEN_CONFIDENCE_THRESHOLD", "4"))
+PRESCREEN_CHUNKS = int(os.getenv("PRESCREEN_CHUNKS", "3"))
+MAX_SCREENING_REASKS = 2
 
-def generate_review_prompt(criteria: list[str]) -> PromptTemplate:
-    """Generates a prompt template for systematic review screening"""
+def screening_output_instructions(criteria: list[str]) -> str:
+    """Describe the structured screening fields expected from the model"""
     
     criteria_format = "\n".join(
-        f"{c}: [Matched / Not Matched / N/A] [brief summary]" for c in criteria
+        f"- {criterion_field_name(c)}: [Matched / Not Matched / N/A] [brief summary of {c}]" for c in criteria
     )
+    return f"""Return your answer using the provided schema:
+- decision: [Include / Exclude / Unclear]
+- confidence: [1 to 5]
+{criteria_format}
+- rationale: [brief explanation]"""
+
+def generate_review_prompt(criteria: list[str]) -> PromptTemplate:
+    """Generates a prompt template for systematic review screening"""
 
     template = f"""
 Given the systematic review question and the summary of the document, decide if the document should be included in the systematic review. Use the following criteria to guide your decision: {", ".join(criteria)}.
@@ -38,11 +55,7 @@ Systematic Review Question:
 Summary:
 {{summary}}
 
-Return your answer in the following format:
-Decision: [Include / Exclude / Unclear]  
-Confidence: [1 to 5]  
-{criteria_format}
-Rationale: [brief explanation]
+{screening_output_instructions(criteria)}
 """
     return PromptTemplate(
         input_variables=["review_question", "summary"],
@@ -50,106 +63,242 @@ Rationale: [brief explanation]
     )
 
 
+def generate_prescreen_prompt(criteria: list[str]) -> PromptTemplate:
+    """Generates a prompt template for cheap title/abstract pre-screening"""
+
+    template = f"""
+Given the systematic review question and the opening of a document (title, abstract and first sections), decide if the document is relevant to the systematic review. Use the following criteria to guide your decision: {", ".join(criteria)}.
+
+Only answer Exclude if the document is clearly off-topic for the review question. If the opening text is ambiguous or the relevant details may appear later in the document, answer Unclear.
+
+Systematic Review Question:
+{{review_question}}
+
+Title:
+{{title}}
+
+Opening Text:
+{{text}}
+
+{screening_output_instructions(criteria)}
+"""
+    return PromptTemplate(
+        input_variables=["review_question", "title", "text"],
+        template=template.strip()
+    )
+
+
+def generate_reask_prompt(prompt: PromptTemplate, missing: list[str]) -> PromptTemplate:
+    """Extends a screening prompt to ask only for the fields missing from a previous answer"""
+    
+    template = f"""{prompt.template}
+
+Your previous answer was missing or had invalid values for these fields: {", ".join(missing)}.
+Return only these fields."""
+    return PromptTemplate(
+        input_variables=prompt.input_variables,
+        template=template
+    )
+
+
+async def invoke_structured_screening(prompt: PromptTemplate, inputs: dict, criteria: list[str], max_reasks: int = MAX_SCREENING_REASKS) -> dict:
+    """
+    Run a screening prompt with structured output validated against the criteria schema.
+    Fields that are missing or invalid are re-asked on their own, up to max_reasks times.
+    """
+    
+    schema = build_screening_schema(criteria)
+    chain = instrument_chain(
+        prompt | light_llm.with_structured_output(schema.model_json_schema(), include_raw=True),
+        "screening",
+        structured=True,
+    )
+    fields, missing = validate_screening_fields(await chain.ainvoke(inputs), criteria)
+
+    for _ in range(max_reasks):
+        if not missing:
+            break
+        logger.info("Re-asking for missing screening fields", extra={"fields": missing})
+        reask_schema = build_screening_schema(criteria, fields=missing)
+        reask_chain = instrument_chain(
+            generate_reask_prompt(prompt, missing)
+            | light_llm.with_structured_output(reask_schema.model_json_schema(), include_raw=True),
+            "screening_reask",
+            structured=True,
+        )
+        reask_fields, missing = validate_screening_fields(await reask_chain.ainvoke(inputs), criteria, fields=missing)
+        fields.update(reask_fields)
+
+    return to_screening_result(fields, criteria)
+
+
+@timed("prescreen")
+async def llm_prescreening(review_question: str | None, docs: List[Document], criteria: list[str], n_chunks: int = PRESCREEN_CHUNKS):
+    """Pre-screen a document on its title and first chunks with the light model"""
+
+    if not review_question:
+        raise ValueError("Review question is required for screening.")
+    if not docs:
+        return None
+
+    title = docs[0].metadata.get("main_title", "Untitled Document")
+    opening_text = "\n\n".join(doc.page_content for doc in docs[:n_chunks])
+
+    try:
+        prompt = generate_prescreen_prompt(criteria)
+        return await invoke_structured_screening(prompt, {
+            "review_question": review_question,
+            "title": title,
+            "text": opening_text
+        }, criteria)
+    except Exception as e:
+        logger.exception("Error in llm_prescreening: %s", e)
+        return None
+
+
+def is_confident_exclusion(screening_result: dict, threshold: int = PRESCREEN_CONFIDENCE_THRESHOLD) -> bool:
+    """Check whether a pre-screening result is an exclusion at or above the confidence threshold"""
+    return screening_result.get("decision") == "Exclude" and screening_result.get("confidence", 0) >= threshold
+
+
+@timed("screen")
 async def llm_screening(review_question: str | None, summary: str, criteria: list[str]):
     """Screen documents for systematic review based on the provided question and criteria"""
     
-    start_time = time.perf_counter()
-    print(f"Screening documents for question: {review_question} with criteria: {criteria}")
+    logger.debug("Screening document", extra={"review_question": review_question, "criteria": criteria})
     if not review_question:
         raise ValueError("Review question is required for screening.")
 
     try:
         prompt = generate_review_prompt(criteria)
-        print(prompt.template)
-        review_question_chain = prompt | light_llm
-        response = await review_question_chain.ainvoke({
+        logger.debug("Screening prompt: %s", prompt.template, extra=sampled())
+        response = await invoke_structured_screening(prompt, {
             "review_question": review_question,
             "summary": summary
-        })
-        end_time = time.perf_counter() - start_time
-        # print(f"Screening completed in {end_time:.2f} seconds.")
-        return response.content
+        }, criteria)
+        return response
     except Exception as e:
-        print(f"Error in llm_screening: {e}")
+        logger.exception("Error in llm_screening: %s", e)
         return None
     
-async def get_screening_result(
-    pdf_id, review_question, summary_folder, review_result_folder,
-    docs: List[Document], criteria: List[str]
-):
-    """Get the screening result for a PDF document based on the summary, question and criteria"""
-    
-    start_time = time.perf_counter()
-    print(f"Getting screening result for PDF ID: {pdf_id}")
-    summary_text = await llm_summary(docs)
-    raw_screening = await llm_screening(review_question, summary_text, criteria)
-    screening_result = parse_llm_screening_output(raw_screening, criteria)
-
-    summary_path = os.path.join(summary_folder, f"{pdf_id}.txt")
+async def write_summary(summary_path: str, partial_path: str, summary_text: str | None, on_checkpoint=None) -> None:
     async with aiofiles.open(summary_path, 'w', encoding='utf-8') as f:
         await f.write(summary_text or "No summary generated.")
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+    if on_checkpoint:
+        await on_checkpoint("summarised")
 
-    review_result_path = os.path.join(review_result_folder, f"{pdf_id}_screening_result.json")
-    async with aiofiles.open(review_result_path, 'w', encoding='utf-8') as f:
-        await f.write(json.dumps(screening_result, indent=2))
-
-    end_time = time.perf_counter() - start_time
-    # print(f"Screening result for {pdf_id} total time taken: {end_time:.2f} seconds.")
+@timed("screen_pdf")
+async def get_screening_result(
+    pdf_id, project_id, review_question, summary_folder,
+    docs: List[Document], criteria: List[str], cascade: bool = CASCADE_SCREENING,
+    reuse_summary: bool = False, on_checkpoint: Callable[[str], Awaitable[None]] | None = None,
+    on_result: Callable[[dict, str | None], Awaitable[None]] | None = None,
+):
+    """
+    Get the screening result for a PDF document based on the summary, question and criteria.
+    In cascade mode the document is first pre-screened on its opening chunks, and the full
+    summary and screening only run if it is not confidently excluded.
+    With reuse_summary, a summary written by an earlier run is screened instead of
+    summarising again; on_checkpoint is awaited with "summarised" once the summary is saved.
+    on_result is awaited with the screening result and the screening model, to store it.
+    """
+    
+    with attributed_to(project_id, pdf_id):
+        logger.info("Getting screening result", extra={"pdf_id": pdf_id})
+
+        summary_path = os.path.join(summary_folder, f"{pdf_id}.txt")
+        partial_path = os.path.join(summary_folder, f"{pdf_id}.partial")
+        screening_result = None
+        summary_text = None
+        summary_reused = reuse_summary and os.path.exists(summary_path)
+        if summary_reused:
+            async with aiofiles.open(summary_path, 'r', encoding='utf-8') as f:
+                summary_text = await f.read()
+        elif cascade:
+            prescreen_result = await llm_prescreening(review_question, docs, criteria)
+            if prescreen_result and is_confident_exclusion(prescreen_result):
+                prescreen_result["screening_stage"] = "prescreen"
+                screening_result = prescreen_result
+                summary_text = "<p>Summary not generated: document excluded at pre-screening.</p>"
+
+        if not summary_reused:
+            if screening_result is None:
+                summary_text = await llm_summary(docs, partial_path=partial_path)
+                # Saved before screening so a rerun can pick up from here
+                await write_summary(summary_path, partial_path, summary_text, on_checkpoint)
+            else:
+                # The placeholder is not a summary to screen, so a rerun pre-screens again instead
+                await write_summary(summary_path, partial_path, summary_text)
+
+        if screening_result is None:
+            screening_result = await llm_screening(review_question, summary_text, criteria)
+            if screening_result is None:
+                screening_result = to_screening_result({}, criteria)
+
+        if on_result:
+            await on_result(screening_result, getattr(light_llm, "model_name", None))
+    await flush_usage()
     return summary_path
 
 
-def filter_documents_by_similarity(
+@timed("filter")
+def rank_documents_by_similarity(
     query: str,
     ids: List[str],
     n: int = 10,
-) -> List[str]:
+) -> List[tuple[str, float]]:
     """
-    Filter documents based on similarity to a query, restricting to a provided list of document IDs.
+    Rank documents by similarity to a query, restricting to a provided list of document IDs.
+    Returns (pdf_id, mean chunk score) pairs for the top n documents.
     """
-    start_time = time.perf_counter()
-    print(f"Filtering documents for query: {query} with IDs: {ids}")
+    logger.info("Ranking %d documents by similarity", len(ids))
+    logger.debug("Ranking candidates", extra={"query": query, "pdf_ids": ids})
     results = vector_store.similarity_search_with_score(query, k=100)
 
     doc_scores = defaultdict(list)
     for doc, score in results:
-        pdf_id = doc.metadata.get("pdf_id")
-        if pdf_id in ids:
-            doc_scores[pdf_id].append(score)
+        pdf_ids = doc.metadata.get("pdf_id")
+        # Deduplicated chunks list every PDF that contains them
+        for pdf_id in pdf_ids if isinstance(pdf_ids, list) else [pdf_ids]:
+            if pdf_id in ids:
+                doc_scores[pdf_id].append(score)
 
-    ranked_docs = sorted(doc_scores.items(), key=lambda x: sum(x[1]) / len(x[1]), reverse=True)
-    top_docs = [pdf_id for pdf_id, _ in ranked_docs[:n]]
-    end_time = time.perf_counter() - start_time
-    # print(f"Filtered {len(top_docs)} documents in {end_time:.2f} seconds.")
+    mean_scores = {pdf_id: sum(scores) / len(scores) for pdf_id, scores in doc_scores.items()}
+    top_docs = sorted(mean_scores.items(), key=lambda x: x[1], reverse=True)[:n]
 
     return top_docs
 
 async def wait_for_embeddings(pdf_ids: List[str], timeout: int = 60, poll_interval: int = 5) -> None:
     """Wait for embeddings to be ready in the vector store for the given PDF IDs"""
     
-    print(f"Waiting for embeddings for {len(pdf_ids)} PDFs...")
+    logger.info("Waiting for embeddings for %d PDFs", len(pdf_ids))
 
     start = time.time()
     remaining = set(pdf_ids)
 
     while time.time() - start < timeout and remaining:
-        print(f"Checking Pinecone for {len(remaining)} remaining PDFs...")
+        logger.debug("Checking vector store for %d remaining PDFs", len(remaining))
         for pdf_id in list(remaining):
             try:
                 results = vector_store.similarity_search("placeholder", k=1, filter={"pdf_id": pdf_id})
                 if results:
                     remaining.remove(pdf_id)
             except Exception as e:
-                print(f"Error querying vector store for {pdf_id}: {e}")
+                logger.warning("Error querying vector store for %s: %s", pdf_id, e)
         if remaining:
             await asyncio.sleep(poll_interval)
 
     if remaining:
-        print(f"Timeout. Missing embeddings for: {remaining}")
+        logger.warning("Timed out waiting for embeddings", extra={"pdf_ids": sorted(remaining)})
     else:
-        print("All embeddings ready.")
+        logger.info("All embeddings ready")
 
 
 ###------------------------------------ SYSTEMATIC REVIEW EVALUATION ------------------------------------###
+# Prompts keep the checklist and instructions before any per-document input so the
+# shared prefix can be served from the provider's prompt cache.
 chunk_evaluation_prompt = PromptTemplate(
     input_variables=["chunk_text", "checklist"],
     template="""
@@ -158,9 +307,6 @@ You are assessing whether this part of a systematic review satisfies relevant it
 Checklist:
 {checklist}
 
-Document Chunk:
-{chunk_text}
-
 Instructions:
 - Review the chunk against the checklist.
 - Only comment on checklist items that this chunk addresses.
@@ -168,10 +314,13 @@ Instructions:
   - Rating: Yes / Partially / No
   - Justification
 - Format your answer as a list of items with headings and bullet points.
+
+Document Chunk:
+{chunk_text}
 """
 )
 
-chunk_evaluation_chain = chunk_evaluation_prompt | strong_llm
+chunk_evaluation_chain = instrument_chain(chunk_evaluation_prompt | strong_llm, "prisma_chunk_evaluation")
 
 doc_evaluation_prompt = PromptTemplate(
     input_variables=["chunk_evaluations", "main_title", "checklist"],
@@ -181,14 +330,6 @@ You are an expert reviewer synthesizing a final evaluation of a systematic revie
 Checklist:
 {checklist}
 
-Title of Systematic Review:
-{main_title}
-
-Below are evaluations of different parts of the document, each judged against the PRISMA checklist:
-
-Chunk-Level Evaluations:
-{chunk_evaluations}
-
 Instructions:
 - For each checklist item, combine the insights from the chunk evaluations.
 - Decide on a final rating: Yes / Partially / No.
@@ -197,20 +338,30 @@ Instructions:
   - Item number or name
   - Final rating
   - Final justification
+
+Title of Systematic Review:
+{main_title}
+
+Below are evaluations of different parts of the document, each judged against the PRISMA checklist:
+
+Chunk-Level Evaluations:
+{chunk_evaluations}
 """
 )
 
 
-doc_evaluation_chain = doc_evaluation_prompt | strong_llm
+doc_evaluation_chain = instrument_chain(doc_evaluation_prompt | strong_llm, "prisma_doc_evaluation")
 
 async def llm_evaluate(sections: List[Document]) -> str:
     chunk_tasks = []
 
     for section_docs in group_doc_by_section(sections):
+        section_title = section_docs[0].metadata.get("section_title", "Unknown Section")
+        section_checklist = checklist_for_sections(load_checklist(PRISMA_CHECKLIST_PATH), [section_title])
         for doc in section_docs:
             chunk_tasks.append(chunk_evaluation_chain.ainvoke({
                 "chunk_text": doc.page_content,
-                "checklist": prisma_checklist
+                "checklist": section_checklist
             }))
 
     chunk_evaluations = await asyncio.gather(*chunk_tasks)
@@ -222,10 +373,10 @@ async def llm_evaluate(sections: List[Document]) -> str:
     final_evaluation = await doc_evaluation_chain.ainvoke({
         "chunk_evaluations": combined_chunk_evaluations,
         "main_title": main_title,
-        "checklist": prisma_checklist
+        "checklist": load_checklist(PRISMA_CHECKLIST_PATH)
     })
 
-    print("Final PRISMA evaluation complete.")
+    logger.info("Final PRISMA evaluation complete")
     return final_evaluation.content
 
 
@@ -1,19 +1,16 @@
+import logging
 import os
 import fitz
 import re
-import json
-import time
 from typing import List, Tuple
 from langchain_core.documents import Document
-from unstructured.partition.pdf import partition_pdf
 from unstructured.documents.elements import Title
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from unstructured.documents.elements import Title, NarrativeText, ListItem, Text, Element, Table, Header
-from tiktoken import encoding_for_model
+from app.metrics import timed
+from app.tokens import TOKEN_ENCODING, count_tokens
 
-enc = encoding_for_model("gpt-4")
-def count_tokens(text: str) -> int:
-    return len(enc.encode(text))
+logger = logging.getLogger(__name__)
 
 def extract_main_title(doc: open) -> str:
     first_page = doc[0]
@@ -87,6 +84,8 @@ def extract_mupdf_titles(file_path: str) -> Tuple[set, str]:
     return headers, main_title
 
 def get_partitioned_elements(file_path: str) -> list[Element]:
+    # Deferred: unstructured's PDF partitioner pulls in layout models at import time
+    from unstructured.partition.pdf import partition_pdf
     return partition_pdf(filename=file_path, strategy="hi_res")
 
 def extract_titles_from_elements(elements: list[Element]) -> list[str]:
@@ -135,39 +134,36 @@ def get_title_positions_by_lines(full_text: str, titles: List[str]) -> List[tupl
 
     return positions
 
+@timed("parse_chunk")
 def chunk_document_by_titles(file_path: str, chunk_size: int, chunk_overlap: int) -> Tuple[List[Document], str]:
     MIN_TOKEN_THRESHOLD = 500
-    output_dir = "app/chunks"
-    os.makedirs(output_dir, exist_ok=True)
     
-    start = time.perf_counter()
-    print(f"Processing {file_path} for title extraction and chunking...")
+    logger.info("Chunking %s by titles", file_path)
 
     elements = get_partitioned_elements(file_path)
-    print(f"Extracted {len(elements)} elements from {file_path}")
+    logger.debug("Extracted %d elements from %s", len(elements), file_path)
         
     titles, main_title = get_intersecting_titles(file_path, elements)
-    print("main_title:", main_title)
+    logger.debug("Main title: %s", main_title)
     
     full_text = extract_cleaned_text(elements)
     
     title_positions = get_title_positions_by_lines(full_text, titles)
     title_positions.sort(key=lambda x: x[1])
-    print(f"Found {len(title_positions)} matched title positions.")
+    logger.debug("Found %d matched title positions", len(title_positions))
     
 
     splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        model_name="gpt-4",
+        encoding_name=TOKEN_ENCODING,
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap
     )
 
     all_chunks = []
-    doc_id = os.path.splitext(os.path.basename(file_path))[0]
     chunk_index = 0
     
     if not title_positions:
-        print("No title positions found. Chunking full document instead.")
+        logger.info("No title positions found in %s, chunking full document", file_path)
         chunks = splitter.split_text(full_text)
         for i, chunk_text in enumerate(chunks):
             chunk = Document(
@@ -175,8 +171,7 @@ def chunk_document_by_titles(file_path: str, chunk_size: int, chunk_overlap: int
                 metadata={"source": file_path, "main_title": main_title, "section_title": "Full Document", "table": False}
             )
             all_chunks.append(chunk)
-            # _write_chunk_to_file(output_dir, doc_id, i, chunk)
-        return all_chunks
+        return all_chunks, main_title
 
     for i, (title, start_idx) in enumerate(title_positions):
         end_idx = title_positions[i + 1][1] if i + 1 < len(title_positions) else len(full_text)
@@ -209,19 +204,9 @@ def chunk_document_by_titles(file_path: str, chunk_size: int, chunk_overlap: int
                     }
                 )
                 all_chunks.append(chunk)
-                
-    end_time = time.perf_counter() - start
-    # print(f"Chunking {file_path} completed in {end_time:.2f} seconds.")
 
-    return all_chunks, main_title
 
-def _write_chunk_to_file(output_dir: str, doc_id: str, chunk_index: int, doc: Document):
-    chunk_filename = os.path.join(output_dir, f"{doc_id}_chunk_{chunk_index}.json")
-    with open(chunk_filename, "w", encoding="utf-8") as f:
-        json.dump({
-            "page_content": doc.page_content,
-            "metadata": doc.metadata
-        }, f, indent=2, ensure_ascii=False)
+    return all_chunks, main_title
 
 # def chunk_docs(file_path: str, chunk_size: int, chunk_overlap: int) -> List[Document]:
 #     docs = PyMuPDFLoader(file_path).load()
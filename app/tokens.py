@@ -0,0 +1,16 @@
+from functools import lru_cache
+
+# Encoding of the gpt-4 family and the text-embedding-3 models, used for every token budget and count
+TOKEN_ENCODING = "cl100k_base"
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    from tiktoken import get_encoding as tiktoken_encoding
+    return tiktoken_encoding(TOKEN_ENCODING)
+
+def count_tokens(text: str) -> int:
+    return len(get_encoding().encode(text))
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    tokens = get_encoding().encode(text)
+    return text if len(tokens) <= max_tokens else get_encoding().decode(tokens[:max_tokens])
@@ -0,0 +1,105 @@
+import os
+import json
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# USD per million (prompt, completion) tokens; MODEL_PRICES='{"gpt-4o": [2.5, 10]}' overrides or adds models
+DEFAULT_MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4": (30.00, 60.00),
+    "text-embedding-ada-002": (0.10, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+MODEL_PRICES = {**DEFAULT_MODEL_PRICES, **{
+    model: tuple(prices) for model, prices in json.loads(os.getenv("MODEL_PRICES", "{}")).items()
+}}
+
+# PDF being processed by the current task, so usage can be attributed to it
+current_pdf: ContextVar[str] = ContextVar("current_pdf", default="")
+
+def price_for(model: str) -> Tuple[float, float]:
+    """Prices for a model, matching dated snapshots (gpt-4o-2024-08-06) by longest prefix"""
+    if model in MODEL_PRICES:
+        return MODEL_PRICES[model]
+    matches = [name for name in MODEL_PRICES if model.startswith(name)]
+    return MODEL_PRICES[max(matches, key=len)] if matches else (0.0, 0.0)
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = price_for(model)
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+class UsageLedger:
+    """
+    In-memory totals of calls, tokens and cost keyed by (project, pdf, stage, model).
+    LLM calls only add to it; flush_usage() drains it into the usage sink in one batch.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str, str, str], List[float]] = {}
+
+    def record(self, project_id: str, pdf_id: str, stage: str, model: str,
+               prompt_tokens: int, completion_tokens: int) -> None:
+        if not project_id:
+            return
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        key = (project_id, pdf_id, stage, model)
+        with self._lock:
+            totals = self._totals.setdefault(key, [0, 0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += prompt_tokens
+            totals[2] += completion_tokens
+            totals[3] += cost
+
+    def restore(self, rows: List[dict]) -> None:
+        """Add drained rows back, e.g. when storing them failed"""
+        with self._lock:
+            for row in rows:
+                key = (row["project_id"], row["pdf_id"], row["stage"], row["model"])
+                totals = self._totals.setdefault(key, [0, 0, 0, 0.0])
+                totals[0] += row["calls"]
+                totals[1] += row["prompt_tokens"]
+                totals[2] += row["completion_tokens"]
+                totals[3] += row["cost_usd"]
+
+    def drain(self) -> List[dict]:
+        with self._lock:
+            totals, self._totals = self._totals, {}
+        return [
+            {
+                "project_id": project_id, "pdf_id": pdf_id, "stage": stage, "model": model,
+                "calls": calls, "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens, "cost_usd": cost,
+            }
+            for (project_id, pdf_id, stage, model), (calls, prompt_tokens, completion_tokens, cost) in totals.items()
+        ]
+
+ledger = UsageLedger()
+
+# Stores drained usage rows; set by the process's entry point, e.g. to write them to the web database
+_usage_sink: Callable[[List[dict]], Awaitable[None]] | None = None
+
+def set_usage_sink(sink: Callable[[List[dict]], Awaitable[None]] | None) -> None:
+    global _usage_sink
+    _usage_sink = sink
+
+async def flush_usage() -> None:
+    """Hand the usage recorded since the last flush to the usage sink, keeping it if that fails"""
+    if _usage_sink is None:
+        return
+    rows = ledger.drain()
+    if not rows:
+        return
+    try:
+        await _usage_sink(rows)
+    except Exception as e:
+        logger.exception("Failed to store LLM usage: %s", e)
+        ledger.restore(rows)
@@ -0,0 +1,135 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter, OrderedDict
+from typing import List, Tuple
+from langchain_core.documents import Document
+from app.metrics import record_cache
+
+CHUNK_FOLDER = os.getenv("CHUNK_FOLDER", os.path.join(os.getcwd(), "chunks"))
+BM25_CACHE_SIZE = int(os.getenv("BM25_CACHE_SIZE", "256"))
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "for", "from", "how",
+    "in", "is", "it", "of", "on", "or", "the", "to", "was", "were", "what", "which", "who", "with",
+}
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, keeping hyphenated and decimal terms such as "il-6" or "2.5" intact"""
+    return [t for t in re.findall(r"[a-z0-9]+(?:[-.][a-z0-9]+)*", text.lower()) if t not in STOPWORDS]
+
+class BM25Index:
+    """In-memory Okapi BM25 index over the chunks of a single PDF"""
+
+    def __init__(self, docs: List[Document], k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(doc.page_content)) for doc in docs]
+        self.doc_lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = sum(self.doc_lengths) / len(docs) if docs else 0
+
+        doc_freqs = Counter()
+        for tf in self.term_freqs:
+            doc_freqs.update(tf.keys())
+        n = len(docs)
+        self.idf = {
+            term: math.log((n - df + 0.5) / (df + 0.5) + 1)
+            for term, df in doc_freqs.items()
+        }
+
+    def score(self, query_terms: List[str], i: int) -> float:
+        tf = self.term_freqs[i]
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[i] / (self.avg_length or 1))
+        return sum(
+            self.idf[term] * tf[term] * (self.k1 + 1) / (tf[term] + norm)
+            for term in query_terms if term in tf
+        )
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """Return the top k chunks with a positive BM25 score for the query"""
+
+        query_terms = tokenize(query)
+        scored = [(i, self.score(query_terms, i)) for i in range(len(self.docs))]
+        scored = sorted((s for s in scored if s[1] > 0), key=lambda s: s[1], reverse=True)
+        return [(self.docs[i], score) for i, score in scored[:k]]
+
+    def coverage(self, query: str, doc: Document) -> Tuple[float, float]:
+        """
+        Fraction of query terms found in a chunk, and the highest idf among them.
+        Used to decide whether a lexical match is strong enough on its own.
+        """
+
+        query_terms = set(tokenize(query))
+        if not query_terms:
+            return 0.0, 0.0
+        doc_terms = set(tokenize(doc.page_content))
+        matched = query_terms & doc_terms
+        max_idf = max((self.idf.get(term, 0.0) for term in matched), default=0.0)
+        return len(matched) / len(query_terms), max_idf
+
+def chunk_path(pdf_id: str) -> str:
+    return os.path.join(CHUNK_FOLDER, f"{pdf_id}.json")
+
+def save_chunks(pdf_id: str, serialized_docs: list[dict]) -> None:
+    """Persist the ingested chunks of a PDF so its lexical index can be rebuilt after a restart"""
+
+    os.makedirs(CHUNK_FOLDER, exist_ok=True)
+    with open(chunk_path(pdf_id), "w", encoding="utf-8") as f:
+        json.dump(serialized_docs, f, ensure_ascii=False)
+
+def load_chunks(pdf_id: str) -> List[Document]:
+    path = chunk_path(pdf_id)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [Document(**d) for d in json.load(f)]
+
+_indexes: "OrderedDict[str, BM25Index]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def remove_chunks(pdf_id: str) -> None:
+    """Delete a PDF's persisted chunks and drop its cached lexical index"""
+
+    with _indexes_lock:
+        _indexes.pop(pdf_id, None)
+    if os.path.exists(chunk_path(pdf_id)):
+        os.remove(chunk_path(pdf_id))
+
+def stored_pdf_ids() -> List[str]:
+    if not os.path.isdir(CHUNK_FOLDER):
+        return []
+    return [name[:-len(".json")] for name in os.listdir(CHUNK_FOLDER) if name.endswith(".json")]
+
+def add_pdf_chunks(pdf_id: str, serialized_docs: list[dict]) -> None:
+    """Persist a PDF's chunks and build its lexical index"""
+
+    save_chunks(pdf_id, serialized_docs)
+    index = BM25Index([Document(**d) for d in serialized_docs])
+    _store_index(pdf_id, index)
+
+def get_index(pdf_id: str) -> BM25Index | None:
+    """Return the lexical index for a PDF, loading it from the persisted chunks if needed"""
+
+    with _indexes_lock:
+        if pdf_id in _indexes:
+            _indexes.move_to_end(pdf_id)
+            record_cache("bm25_index", hit=True)
+            return _indexes[pdf_id]
+
+    record_cache("bm25_index", hit=False)
+    docs = load_chunks(pdf_id)
+    if not docs:
+        return None
+    index = BM25Index(docs)
+    _store_index(pdf_id, index)
+    return index
+
+def _store_index(pdf_id: str, index: BM25Index) -> None:
+    with _indexes_lock:
+        _indexes[pdf_id] = index
+        _indexes.move_to_end(pdf_id)
+        while len(_indexes) > BM25_CACHE_SIZE:
+            _indexes.popitem(last=False)
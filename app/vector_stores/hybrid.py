@@ -0,0 +1,82 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from app.embeddings.cache import content_hash
+from app.vector_stores.bm25 import get_index
+
+logger = logging.getLogger(__name__)
+
+VECTOR_TIMEOUT = float(os.getenv("HYBRID_VECTOR_TIMEOUT", "3"))
+LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "0.5"))
+RARE_TERM_IDF = 2.0
+RRF_K = 60
+
+_vector_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-vector")
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], weights: List[float], k: int = RRF_K) -> List[Document]:
+    """
+    Fuse ranked result lists with weighted reciprocal rank fusion.
+    Chunks are matched across lists by their content.
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank + 1)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+class HybridRetriever(BaseRetriever):
+    """
+    Per-PDF retriever that fuses BM25 lexical matches with dense similarity search.
+    Strong exact-term matches are answered lexically without a remote lookup, and
+    lexical results are used alone if the vector backend is slow or failing.
+    """
+    vector_store: Any
+    pdf_id: str
+    k: int = 4
+    lexical_weight: float = LEXICAL_WEIGHT
+    vector_timeout: float = VECTOR_TIMEOUT
+
+    def is_confident_lexical_match(self, index, query: str, lexical: List[Document]) -> bool:
+        if len(lexical) < self.k:
+            return False
+        coverage, max_idf = index.coverage(query, lexical[0])
+        return coverage == 1.0 and max_idf >= RARE_TERM_IDF
+
+    def vector_search(self, query: str) -> List[Document]:
+        future = _vector_executor.submit(
+            self.vector_store.similarity_search, query, k=self.k * 2, filter={"pdf_id": self.pdf_id}
+        )
+        try:
+            return future.result(timeout=self.vector_timeout)
+        except FutureTimeoutError:
+            logger.warning("Vector search timed out for PDF %s, using lexical results", self.pdf_id)
+        except Exception as e:
+            logger.warning("Vector search failed for PDF %s: %s", self.pdf_id, e)
+        return []
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        index = get_index(self.pdf_id)
+        lexical = [doc for doc, _ in index.search(query, k=self.k * 2)] if index else []
+
+        if index and self.is_confident_lexical_match(index, query, lexical):
+            return lexical[:self.k]
+
+        vector = self.vector_search(query)
+        if not vector:
+            return lexical[:self.k]
+        if index:
+            # Shared vectors carry no per-PDF metadata, so answer with this PDF's own chunk
+            own = {content_hash(doc.page_content): doc for doc in index.docs}
+            vector = [own.get(content_hash(doc.page_content), doc) for doc in vector]
+
+        fused = reciprocal_rank_fusion([lexical, vector], [self.lexical_weight, 1 - self.lexical_weight])
+        return fused[:self.k]
@@ -0,0 +1,532 @@
+import os
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+logger = logging.getLogger(__name__)
+
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", os.path.join(os.getcwd(), "vector_index"))
+# none: exact search over the vectors on disk; int8: 4x smaller codes; pq: 4 * dim / PQ_SUBSPACES times smaller
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION", "int8").lower()
+PQ_SUBSPACES = int(os.getenv("PQ_SUBSPACES", "0"))
+PQ_TRAIN_SIZE = int(os.getenv("PQ_TRAIN_SIZE", "10000"))
+# Approximate candidates re-ranked with full-precision vectors, per result requested
+RERANK_FACTOR = int(os.getenv("LOCAL_INDEX_RERANK_FACTOR", "10"))
+
+# Metadata fields kept in memory for filtering; other filter keys are checked on candidates
+FILTER_FIELDS = ("pdf_id", "project_id")
+SCAN_BLOCK = 2048
+
+def normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+class Int8Quantizer:
+    """Per-vector symmetric int8 codes with a float32 scale"""
+
+    trained = True
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def empty(self, capacity: int) -> Tuple[np.ndarray, ...]:
+        return np.zeros((capacity, self.dim), dtype=np.int8), np.zeros(capacity, dtype=np.float32)
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, ...]:
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        return (codes.astype(np.float32) @ query) * scales
+
+class ProductQuantizer:
+    """
+    Splits vectors into sub-vectors and stores the index of the nearest of 256 trained
+    centroids for each, one byte per sub-vector. Scores are summed from per-query tables.
+    """
+
+    def __init__(self, dim: int, subspaces: int = 0, centroids: Optional[np.ndarray] = None):
+        self.dim = dim
+        self.subspaces = subspaces or dim // 4
+        if dim % self.subspaces:
+            raise ValueError(f"PQ_SUBSPACES must divide the vector dimension {dim}")
+        self.centroids = centroids
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def split(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.reshape(len(vectors), self.subspaces, -1)
+
+    def fit(self, sample: np.ndarray, iterations: int = 15, seed: int = 0) -> None:
+        """k-means per subspace on a sample of vectors"""
+        rng = np.random.default_rng(seed)
+        parts = self.split(sample)
+        k = min(256, len(sample))
+        centroids = np.zeros((self.subspaces, 256, parts.shape[2]), dtype=np.float32)
+        for s in range(self.subspaces):
+            points = parts[:, s, :]
+            centres = points[rng.choice(len(points), k, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = self.nearest(points, centres)
+                counts = np.bincount(assignment, minlength=k)
+                sums = np.stack([
+                    np.bincount(assignment, weights=points[:, d], minlength=k) for d in range(points.shape[1])
+                ], axis=1)
+                used = counts > 0
+                centres[used] = sums[used] / counts[used, None]
+            centroids[s, :k] = centres
+            # Unused slots repeat real centroids so any code decodes to a sensible value
+            centroids[s, k:] = centres[np.arange(256 - k) % k]
+        self.centroids = centroids
+
+    @staticmethod
+    def nearest(points: np.ndarray, centres: np.ndarray) -> np.ndarray:
+        distances = (centres ** 2).sum(axis=1) - 2 * points @ centres.T
+        return distances.argmin(axis=1)
+
+    def empty(self, capacity: int) -> Tuple[np.ndarray, ...]:
+        return (np.zeros((capacity, self.subspaces), dtype=np.uint8),)
+
+    def encode(self, vectors: np.ndarray) -> Tuple[np.ndarray, ...]:
+        parts = self.split(vectors)
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        for s in range(self.subspaces):
+            codes[:, s] = self.nearest(parts[:, s, :], self.centroids[s])
+        return (codes,)
+
+    def tables(self, query: np.ndarray) -> np.ndarray:
+        return np.einsum("sd,skd->sk", query.reshape(self.subspaces, -1), self.centroids)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray, tables: Optional[np.ndarray] = None) -> np.ndarray:
+        tables = self.tables(query) if tables is None else tables
+        return tables[np.arange(self.subspaces), codes].sum(axis=1)
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top])]
+    return np.argsort(-scores)
+
+def filter_values(value: Any) -> List[Any]:
+    """Values a filter condition accepts: a plain value, {"$eq": value} or {"$in": [...]}"""
+    if isinstance(value, dict):
+        if set(value) == {"$eq"}:
+            return [value["$eq"]]
+        if set(value) == {"$in"}:
+            return list(value["$in"])
+        raise ValueError(f"Unsupported filter condition: {value}")
+    return [value]
+
+def metadata_values(value: Any) -> List[Any]:
+    # List-valued metadata (deduplicated chunks) matches any of its members, as in Pinecone
+    return value if isinstance(value, list) else [value]
+
+def matches(metadata: dict, filter: dict) -> bool:
+    return all(
+        set(metadata_values(metadata.get(key))) & set(filter_values(value))
+        for key, value in filter.items()
+    )
+
+class LocalVectorStore(VectorStore):
+    """
+    Single-node vector store. Full-precision vectors are appended to a file on disk and
+    memory mapped; only compact quantised codes are held in memory. A search scores the
+    codes, then re-ranks the best k * rerank_factor candidates exactly from the mapped
+    vectors. Texts and metadata live in SQLite next to the vectors. Vectors are
+    normalised, so scores are cosine similarities.
+    """
+
+    def __init__(self, path: str, embedding: Embeddings, quantization: str = LOCAL_INDEX_QUANTIZATION,
+                 subspaces: int = PQ_SUBSPACES, rerank_factor: int = RERANK_FACTOR,
+                 pq_train_size: int = PQ_TRAIN_SIZE):
+        if quantization not in ("none", "int8", "pq"):
+            raise ValueError(f"Unknown quantization: {quantization}")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.embedding = embedding
+        self.quantization = quantization
+        self.subspaces = subspaces
+        self.rerank_factor = max(1, rerank_factor)
+        self.pq_train_size = pq_train_size
+
+        self._lock = threading.RLock()
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._codebook_path = os.path.join(path, "pq_centroids.npy")
+        self._db = sqlite3.connect(os.path.join(path, "entries.db"), check_same_thread=False)
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        self.dim: Optional[int] = None
+        self._size = 0
+        self._mapped: Optional[np.ndarray] = None
+        self._quantizer = None
+        self._codes: Tuple[np.ndarray, ...] = ()
+        self._postings: Dict[str, Dict[Any, set]] = {field: {} for field in FILTER_FIELDS}
+        # Rows still in use; deleted rows stay in the vectors file until compact()
+        self._live = np.zeros(0, dtype=bool)
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    @property
+    def bytes_per_vector(self) -> float:
+        """Memory held per vector for its codes (0 when searching the vectors on disk directly)"""
+        if not self._size or not self._quantized():
+            return 0.0
+        return sum(codes[:self._size].nbytes for codes in self._codes) / self._size
+
+    @property
+    def deleted_count(self) -> int:
+        return self._size - int(self._live[:self._size].sum())
+
+    def __len__(self) -> int:
+        return self._size - self.deleted_count
+
+    # Loading and storage
+
+    def _load(self) -> None:
+        row = self._db.execute("SELECT value FROM settings WHERE key = 'dim'").fetchone()
+        if row is None:
+            return
+        self.dim = int(row[0])
+        self._size = self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM entries").fetchone()[0]
+        self._live = np.zeros(self._size, dtype=bool)
+        for row_id, metadata in self._db.execute("SELECT row, metadata FROM entries"):
+            self._index_metadata(row_id, json.loads(metadata))
+            self._live[row_id] = True
+        self._remap()
+        self._build_quantizer()
+        if self._quantizer is not None and self._quantizer.trained:
+            self._encode_all()
+        logger.info("Loaded local vector index", extra={"vectors": self._size, "quantization": self.quantization})
+
+    def _remap(self) -> None:
+        self._mapped = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(self._size, self.dim)) \
+            if self._size else None
+
+    def _build_quantizer(self) -> None:
+        if self.quantization == "int8":
+            self._quantizer = Int8Quantizer(self.dim)
+        elif self.quantization == "pq":
+            centroids = np.load(self._codebook_path) if os.path.exists(self._codebook_path) else None
+            self._quantizer = ProductQuantizer(self.dim, self.subspaces, centroids)
+
+    def _quantized(self) -> bool:
+        return self._quantizer is not None and self._quantizer.trained
+
+    def _encode_all(self) -> None:
+        self._codes = self._quantizer.empty(max(self._size, 1024))
+        for start in range(0, self._size, SCAN_BLOCK):
+            block = np.asarray(self._mapped[start:start + SCAN_BLOCK])
+            for codes, encoded in zip(self._codes, self._quantizer.encode(block)):
+                codes[start:start + len(block)] = encoded
+
+    def _reserve(self, size: int) -> None:
+        capacity = len(self._codes[0]) if self._codes else 0
+        if size <= capacity:
+            return
+        grown = self._quantizer.empty(max(size, capacity * 2))
+        for new, old in zip(grown, self._codes):
+            new[:capacity] = old
+        self._codes = grown
+
+    def _maybe_train(self) -> None:
+        """Train the product quantiser once enough vectors exist; until then search is exact"""
+        if self.quantization != "pq" or self._quantizer.trained or self._size < self.pq_train_size:
+            return
+        rng = np.random.default_rng(0)
+        sample_rows = np.sort(rng.choice(self._size, min(self._size, self.pq_train_size), replace=False))
+        self._quantizer.fit(np.asarray(self._mapped[sample_rows]))
+        np.save(self._codebook_path, self._quantizer.centroids)
+        self._encode_all()
+        logger.info("Trained product quantiser", extra={"vectors": self._size, "subspaces": self._quantizer.subspaces})
+
+    def _index_metadata(self, row: int, metadata: dict, remove: bool = False) -> None:
+        for field in FILTER_FIELDS:
+            if field not in metadata:
+                continue
+            for value in metadata_values(metadata[field]):
+                rows = self._postings[field].setdefault(value, set())
+                if remove:
+                    rows.discard(row)
+                    if not rows:
+                        del self._postings[field][value]
+                else:
+                    rows.add(row)
+
+    # Adding vectors
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        vectors = np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+        return self.add_vectors(vectors, texts, metadatas, ids)
+
+    def add_vectors(self, vectors: np.ndarray, texts: List[str], metadatas: Optional[List[dict]] = None,
+                    ids: Optional[List[str]] = None) -> List[str]:
+        """Upsert precomputed vectors; an existing ID is overwritten in place"""
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        vectors = normalise(np.asarray(vectors, dtype=np.float32))
+        if not len(vectors):
+            return ids
+        # The last entry wins when an ID is repeated within a batch
+        keep = sorted({id_: i for i, id_ in enumerate(ids)}.values())
+        if len(keep) < len(ids):
+            vectors = vectors[keep]
+            texts, metadatas, ids = [texts[i] for i in keep], [metadatas[i] for i in keep], [ids[i] for i in keep]
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with self._db:
+                    self._db.execute("INSERT INTO settings (key, value) VALUES ('dim', ?)", (str(self.dim),))
+                self._build_quantizer()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {vectors.shape[1]}")
+
+            existing = {}
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                for id_, row, metadata in self._db.execute(
+                    f"SELECT id, row, metadata FROM entries WHERE id IN ({','.join('?' * len(batch))})", batch
+                ):
+                    existing[id_] = (row, json.loads(metadata))
+
+            rows = []
+            next_row = self._size
+            for id_ in ids:
+                if id_ in existing:
+                    row, old_metadata = existing[id_]
+                    self._index_metadata(row, old_metadata, remove=True)
+                else:
+                    row, next_row = next_row, next_row + 1
+                    existing[id_] = (row, {})
+                rows.append(row)
+
+            open(self._vectors_path, "ab").close()
+            with open(self._vectors_path, "r+b") as f:
+                for row, vector in zip(rows, vectors):
+                    f.seek(row * self.dim * 4)
+                    f.write(vector.tobytes())
+
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO entries (row, id, text, metadata) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET text = excluded.text, metadata = excluded.metadata",
+                    [(row, id_, text, json.dumps(metadata)) for row, id_, text, metadata in zip(rows, ids, texts, metadatas)],
+                )
+            for row, metadata in zip(rows, metadatas):
+                self._index_metadata(row, metadata)
+
+            if len(self._live) < next_row:
+                self._live = np.concatenate([self._live, np.zeros(max(next_row, 2 * len(self._live)) - len(self._live), dtype=bool)])
+            self._live[rows] = True
+            self._size = next_row
+            self._remap()
+            if self._quantized():
+                self._reserve(self._size)
+                for codes, encoded in zip(self._codes, self._quantizer.encode(vectors)):
+                    codes[rows] = encoded
+            else:
+                self._maybe_train()
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, path: str = LOCAL_INDEX_PATH, **kwargs: Any) -> "LocalVectorStore":
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    def _entries(self, ids: List[str]) -> List[Tuple[str, int, dict]]:
+        entries = []
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            entries.extend(
+                (id_, row, json.loads(metadata)) for id_, row, metadata in self._db.execute(
+                    f"SELECT id, row, metadata FROM entries WHERE id IN ({','.join('?' * len(batch))})", batch
+                )
+            )
+        return entries
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None, **kwargs: Any) -> Optional[bool]:
+        """Delete entries by ID and/or by a filter on the indexed metadata fields"""
+        if filter and set(filter) - set(FILTER_FIELDS):
+            raise ValueError(f"Can only delete by filter on {', '.join(FILTER_FIELDS)}")
+        with self._lock:
+            entries = self._entries(list(ids or []))
+            if filter:
+                rows = [int(row) for row in self._candidate_rows(filter)]
+                for start in range(0, len(rows), 500):
+                    batch = rows[start:start + 500]
+                    entries.extend(
+                        (id_, row, json.loads(metadata)) for id_, row, metadata in self._db.execute(
+                            f"SELECT id, row, metadata FROM entries WHERE row IN ({','.join('?' * len(batch))})", batch
+                        )
+                    )
+            for _, row, metadata in entries:
+                self._index_metadata(row, metadata, remove=True)
+                self._live[row] = False
+            with self._db:
+                self._db.executemany("DELETE FROM entries WHERE row = ?", [(row,) for _, row, _ in entries])
+        return True
+
+    def update_metadata(self, updates: Dict[str, dict]) -> None:
+        """Overwrite metadata fields of existing entries, keeping their vectors"""
+        with self._lock:
+            entries = self._entries(list(updates))
+            for id_, row, metadata in entries:
+                self._index_metadata(row, metadata, remove=True)
+                self._index_metadata(row, {**metadata, **updates[id_]})
+            with self._db:
+                self._db.executemany(
+                    "UPDATE entries SET metadata = ? WHERE row = ?",
+                    [(json.dumps({**metadata, **updates[id_]}), row) for id_, row, metadata in entries],
+                )
+
+    def compact(self) -> int:
+        """
+        Rewrite the vectors file without deleted rows and renumber the rest, so scans and
+        disk use track the live entries. Returns the number of rows reclaimed.
+        """
+        with self._lock:
+            removed = self.deleted_count
+            if not removed:
+                return 0
+            live_rows = np.flatnonzero(self._live[:self._size])
+            compacted_path = self._vectors_path + ".compact"
+            with open(compacted_path, "wb") as f:
+                for start in range(0, len(live_rows), SCAN_BLOCK):
+                    f.write(np.asarray(self._mapped[live_rows[start:start + SCAN_BLOCK]]).tobytes())
+
+            with self._db:
+                self._db.execute("UPDATE entries SET row = -row - 1")
+                self._db.executemany(
+                    "UPDATE entries SET row = ? WHERE row = ?",
+                    [(new, -int(old) - 1) for new, old in enumerate(live_rows)],
+                )
+            self._mapped = None
+            os.replace(compacted_path, self._vectors_path)
+
+            self._postings = {field: {} for field in FILTER_FIELDS}
+            self._load()
+        logger.info("Compacted local vector index", extra={"removed": removed, "vectors": self._size})
+        return removed
+
+    # Search
+
+    def _candidate_rows(self, filter: Optional[dict]) -> Optional[np.ndarray]:
+        """Rows allowed by the indexed filter fields, or None for all rows"""
+        allowed = None
+        for key, value in (filter or {}).items():
+            if key not in FILTER_FIELDS:
+                continue
+            rows = set()
+            for accepted in filter_values(value):
+                rows |= self._postings[key].get(accepted, set())
+            allowed = rows if allowed is None else allowed & rows
+        return None if allowed is None else np.fromiter(sorted(allowed), dtype=np.int64, count=len(allowed))
+
+    def _approximate_scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        count = self._size if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        tables = self._quantizer.tables(query) if isinstance(self._quantizer, ProductQuantizer) else None
+        for start in range(0, count, SCAN_BLOCK):
+            selection = slice(start, min(start + SCAN_BLOCK, count)) if rows is None else rows[start:start + SCAN_BLOCK]
+            codes = [codes[selection] for codes in self._codes]
+            if tables is not None:
+                scores[start:start + SCAN_BLOCK] = self._quantizer.scores(query, *codes, tables=tables)
+            else:
+                scores[start:start + SCAN_BLOCK] = self._quantizer.scores(query, *codes)
+        return scores
+
+    def _exact_scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        count = self._size if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCAN_BLOCK):
+            selection = slice(start, min(start + SCAN_BLOCK, count)) if rows is None else rows[start:start + SCAN_BLOCK]
+            scores[start:start + SCAN_BLOCK] = np.asarray(self._mapped[selection]) @ query
+        return scores
+
+    def search_rows(self, query: np.ndarray, k: int, filter: Optional[dict] = None,
+                    rerank_factor: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(row, cosine similarity) of the k best matches for a query vector"""
+        query = normalise(np.asarray(query, dtype=np.float32))
+        with self._lock:
+            if not self._size:
+                return []
+            rows = self._candidate_rows(filter)
+            if rows is None and self.deleted_count:
+                rows = np.flatnonzero(self._live[:self._size])
+            if rows is not None and not len(rows):
+                return []
+            count = self._size if rows is None else len(rows)
+
+            if self._quantized():
+                approximate = self._approximate_scores(query, rows)
+                top = top_k(approximate, k * (rerank_factor or self.rerank_factor))
+                candidates = top if rows is None else rows[top]
+                # Sorted rows read the mapped file sequentially
+                candidates = np.sort(candidates)
+                scores = np.asarray(self._mapped[candidates]) @ query
+            else:
+                scores = self._exact_scores(query, rows)
+                candidates = np.arange(count) if rows is None else rows
+
+        return [(int(candidates[i]), float(scores[i])) for i in top_k(scores, k)]
+
+    def _load_documents(self, rows: List[int]) -> Dict[int, Document]:
+        documents = {}
+        with self._lock:
+            for start in range(0, len(rows), 500):
+                batch = rows[start:start + 500]
+                for row, text, metadata in self._db.execute(
+                    f"SELECT row, text, metadata FROM entries WHERE row IN ({','.join('?' * len(batch))})", batch
+                ):
+                    documents[row] = Document(page_content=text, metadata=json.loads(metadata))
+        return documents
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[dict] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        residual = {key: value for key, value in (filter or {}).items() if key not in FILTER_FIELDS}
+        # Filters on fields without postings are applied afterwards, so fetch spare matches
+        limit = k * self.rerank_factor if residual else k
+        ranked = self.search_rows(np.asarray(embedding, dtype=np.float32), limit, filter)
+        documents = self._load_documents([row for row, _ in ranked])
+        results = [
+            (documents[row], score) for row, score in ranked
+            if row in documents and matches(documents[row].metadata, residual)
+        ]
+        return results[:k]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
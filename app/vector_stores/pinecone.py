@@ -1,33 +1,161 @@
 import os
-import time
-from langchain_community.vectorstores import Pinecone as LangchainPinecone
-from langchain_core.documents import Document
+import logging
+import threading
 from app.embeddings.openai import embeddings
+from app.embeddings.cache import content_hash, embedding_cache
+from app.providers import LazyProvider
+from app.metrics import attributed_to, current_project, timed
+from app.vector_stores.bm25 import add_pdf_chunks
+from app.vector_stores.hybrid import HybridRetriever
 from dotenv import load_dotenv
 
 load_dotenv()
 
-vector_store = LangchainPinecone.from_existing_index(
-    index_name=os.getenv("PINECONE_INDEX_NAME"),
-    embedding=embeddings
-)
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_MODE = os.getenv("CHAT_RETRIEVAL_MODE", "hybrid")
+# "local" keeps the index on this machine (app/vector_stores/local.py) instead of Pinecone
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone").lower()
+
+def connect_vector_store():
+    """Connect to the existing Pinecone index; deferred until the store is first used"""
+    if VECTOR_STORE == "local":
+        from app.vector_stores.local import LOCAL_INDEX_PATH, LocalVectorStore
+        return LocalVectorStore(LOCAL_INDEX_PATH, embeddings.get())
+
+    from langchain_community.vectorstores import Pinecone as LangchainPinecone
+    return LangchainPinecone.from_existing_index(
+        index_name=os.getenv("PINECONE_INDEX_NAME"),
+        embedding=embeddings.get()
+    )
+
+# PDFs listed in one vector's metadata; a chunk found in more PDFs gets further copies of
+# its vector, so metadata stays well under Pinecone's 40 KB per-vector limit
+MEMBERS_PER_VECTOR = int(os.getenv("VECTOR_MEMBERS_PER_SHARD", "200"))
+# Chunk metadata kept on shared vectors: fields that depend only on the chunk's text
+SHARED_METADATA_FIELDS = ("table",)
+# Vectors per Pinecone upsert request
+UPSERT_BATCH_SIZE = 100
+
+vector_store = LazyProvider("vector_store", connect_vector_store)
+
+# Held while a chunk's membership metadata is read, upserted and recorded, so PDFs
+# sharing a chunk cannot overwrite each other's entry in the index. Chunk metadata
+# holds lists of PDF and project IDs, which {"pdf_id": ...} filters match by membership.
+_membership_lock = threading.Lock()
+
+def vector_id(content_hash: str, shard: int) -> str:
+    return content_hash if shard == 0 else f"{content_hash}-{shard}"
+
+def free_shard(shards: dict) -> int:
+    """Lowest shard of a chunk with room for another PDF, or a new one"""
+    for shard, (pdf_ids, _) in shards.items():
+        if len(pdf_ids) < MEMBERS_PER_VECTOR:
+            return shard
+    return max(shards, default=-1) + 1
 
 def build_retriever(chat_args):
     """
     Builds a retriever for the vector store based on the provided chat arguments
     """
+    if RETRIEVAL_MODE == "hybrid":
+        return HybridRetriever(vector_store=vector_store, pdf_id=chat_args.pdf_id)
+
     search_kwargs = {"filter": {"pdf_id": chat_args.pdf_id}}
     return vector_store.as_retriever(
         search_kwargs=search_kwargs,
     )
     
-def process_embeddings(pdf_id: str, serialized_docs: list[dict]):
+@timed("embed")
+def process_embeddings(pdf_id: str, serialized_docs: list[dict], project_id: str | None = None):
     """
-    Processes and adds embeddings to the vector store for provided PDF chunks
+    Adds a PDF's chunks to the vector store with one vector per distinct chunk text,
+    keyed by its content hash. Chunks already embedded for another PDF or project reuse
+    the stored vector and only gain this PDF and project in their metadata. Per-PDF
+    fields such as titles stay in the PDF's own chunks (app/vector_stores/bm25.py).
     """
-    start = time.perf_counter()
-    # print(f"Creating embeddings for PDF ID {pdf_id}...")
-    docs = [Document(**d) for d in serialized_docs]
-    vector_store.add_documents(docs)
-    end_time = time.perf_counter() - start
-    # print(f"Embeddings created for PDF ID {pdf_id} in {end_time:.2f} seconds.")
\ No newline at end of file
+    add_pdf_chunks(pdf_id, serialized_docs)
+    project_id = project_id or current_project.get()
+    chunks = {}
+    for d in serialized_docs:
+        chunks.setdefault(content_hash(d["page_content"]), d)
+
+    with attributed_to(pdf_id=pdf_id):
+        # Outside the lock: only text without a cached vector is sent to the API
+        vectors = dict(zip(chunks, embeddings.embed_documents([d["page_content"] for d in chunks.values()])))
+
+        with _membership_lock:
+            members = embedding_cache.members(list(chunks))
+            placed = {
+                h: free_shard(members[h]) for h in chunks
+                if not any(pdf_id in pdf_ids for pdf_ids, _ in members[h].values())
+            }
+            if not placed:
+                return
+            metadatas = []
+            for h, shard in placed.items():
+                pdf_ids, project_ids = members[h].get(shard, ([], []))
+                metadata = {k: v for k, v in chunks[h]["metadata"].items() if k in SHARED_METADATA_FIELDS}
+                metadata["pdf_id"] = sorted({*pdf_ids, pdf_id})
+                if project_id or project_ids:
+                    metadata["project_id"] = sorted({*project_ids, project_id} - {""})
+                metadatas.append(metadata)
+            upsert_vectors(
+                [vectors[h] for h in placed],
+                [chunks[h]["page_content"] for h in placed],
+                metadatas,
+                [vector_id(h, shard) for h, shard in placed.items()],
+            )
+            # Recorded only once the upsert succeeded, so a failed PDF is retried in full
+            embedding_cache.add_members(pdf_id, project_id, placed)
+
+def upsert_vectors(vectors: list, texts: list[str], metadatas: list[dict], ids: list[str]) -> None:
+    """Upsert vectors already computed, so their texts are not embedded or looked up in the cache again"""
+    store = vector_store.get()
+    if hasattr(store, "add_vectors"):
+        store.add_vectors(vectors, texts, metadatas=metadatas, ids=ids)
+        return
+    # LangChain's Pinecone store keeps each chunk's text in its metadata under the text key
+    entries = [
+        (id_, list(vector), {**metadata, store._text_key: text})
+        for id_, vector, text, metadata in zip(ids, vectors, texts, metadatas)
+    ]
+    for start in range(0, len(entries), UPSERT_BATCH_SIZE):
+        store._index.upsert(vectors=entries[start:start + UPSERT_BATCH_SIZE])
+
+def update_chunk_metadata(updates: dict[str, dict]) -> None:
+    """Overwrite metadata fields of stored vectors without re-embedding or re-upserting them"""
+    store = vector_store.get()
+    if hasattr(store, "update_metadata"):
+        store.update_metadata(updates)
+        return
+    for vector_id, metadata in updates.items():
+        store._index.update(id=vector_id, set_metadata=metadata)
+
+def remove_embeddings(pdf_id: str) -> None:
+    """
+    Removes a PDF from the vector index. Chunks only it contained are deleted; shared
+    chunks stay and lose the PDF (and its project, unless another PDF of it remains)
+    from their metadata. Cached vectors are kept for reuse until garbage collection.
+    """
+    with _membership_lock:
+        shards = embedding_cache.pdf_shards(pdf_id)
+        members = embedding_cache.members(list(shards), exclude_pdf=pdf_id)
+        orphaned, shared = [], {}
+        for h, shard in shards.items():
+            pdf_ids, project_ids = members[h].get(shard, ([], []))
+            if pdf_ids:
+                shared[vector_id(h, shard)] = {"pdf_id": pdf_ids, "project_id": project_ids}
+            else:
+                orphaned.append(vector_id(h, shard))
+        if orphaned:
+            vector_store.delete(ids=orphaned)
+        if shared:
+            update_chunk_metadata(shared)
+        embedding_cache.remove_members(pdf_id)
+
+    # Vectors added before chunks were deduplicated are keyed by random IDs
+    try:
+        vector_store.delete(filter={"pdf_id": pdf_id})
+    except Exception as e:
+        logger.warning("Could not delete vectors by filter for PDF %s: %s", pdf_id, e)
@@ -2,6 +2,7 @@ import os
 import pinecone as pc
 from langchain_community.vectorstores import Pinecone as LangchainPinecone
 from app.embeddings.openai import embeddings
+from app.embeddings.cache import embedding_cache
 from dotenv import load_dotenv
 
 ### Resets Pinecone Vector Store upon startup
@@ -10,7 +11,7 @@ load_dotenv()
 
 vector_store = LangchainPinecone.from_existing_index(
     index_name=os.getenv("PINECONE_INDEX_NAME"),
-    embedding=embeddings
+    embedding=embeddings.get()
 )
 
 pinecone_index = vector_store._index
@@ -19,4 +20,7 @@ try:
     vector_store._index.delete(delete_all=True)
     print("✅ Cleared namespace.")
 except pc.core.client.exceptions.NotFoundException:
-    print("⚠️ Namespace is empty or already deleted.")
\ No newline at end of file
+    print("⚠️ Namespace is empty or already deleted.")
+
+# Cached vectors are kept for reuse, but no chunk is in the index any more
+embedding_cache.clear_members()
\ No newline at end of file
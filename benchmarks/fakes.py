@@ -0,0 +1,196 @@
+import math
+import asyncio
+import hashlib
+import time
+import threading
+import uuid
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from app.vector_stores.bm25 import tokenize
+
+EMBEDDING_DIM = 256
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def prompt_text(input: Any) -> str:
+    if hasattr(input, "to_string"):
+        return input.to_string()
+    return str(input)
+
+class CallStats:
+    """Thread-safe counters shared by the fakes and reported by the benchmark"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = Counter()
+        self.tokens = defaultdict(Counter)
+
+    def record(self, name: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        with self._lock:
+            self.counts[name] += 1
+            self.tokens[name]["prompt"] += prompt_tokens
+            self.tokens[name]["completion"] += completion_tokens
+
+    def as_dict(self) -> dict:
+        return {
+            name: {"calls": count, **self.tokens[name]}
+            for name, count in sorted(self.counts.items())
+        }
+
+class FakeChatModel(Runnable):
+    """
+    Deterministic chat model with configurable latency. Free-text calls echo a short
+    digest of the prompt; structured calls fill every schema field with a fixed value.
+    """
+
+    def __init__(self, name: str, stats: CallStats, latency: float = 0.0, per_token_latency: float = 0.0,
+                 completion_tokens: int = 120):
+        self.name = name
+        self.model_name = f"fake-{name}"
+        self.stats = stats
+        self.latency = latency
+        self.per_token_latency = per_token_latency
+        self.completion_tokens = completion_tokens
+
+    def completion(self, text: str) -> str:
+        digest = hashlib.sha1(text.encode()).hexdigest()[:8]
+        words = " ".join(f"finding{i}" for i in range(self.completion_tokens // 2))
+        return f"<p>Summary {digest}: {words}</p>"
+
+    def delay(self, prompt_tokens: int) -> float:
+        return self.latency + self.per_token_latency * (prompt_tokens + self.completion_tokens)
+
+    def message(self, content: str, prompt_tokens: int, completion_tokens: int) -> AIMessage:
+        return AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+            response_metadata={"model_name": self.model_name},
+        )
+
+    def invoke(self, input: Any, config: Optional[dict] = None, **kwargs: Any) -> AIMessage:
+        text = prompt_text(input)
+        prompt_tokens = estimate_tokens(text)
+        time.sleep(self.delay(prompt_tokens))
+        self.stats.record(self.name, prompt_tokens, self.completion_tokens)
+        return self.message(self.completion(text), prompt_tokens, self.completion_tokens)
+
+    async def ainvoke(self, input: Any, config: Optional[dict] = None, **kwargs: Any) -> AIMessage:
+        text = prompt_text(input)
+        prompt_tokens = estimate_tokens(text)
+        await asyncio.sleep(self.delay(prompt_tokens))
+        self.stats.record(self.name, prompt_tokens, self.completion_tokens)
+        return self.message(self.completion(text), prompt_tokens, self.completion_tokens)
+
+    async def astream(self, input: Any, config: Optional[dict] = None, **kwargs: Any):
+        message = await self.ainvoke(input, config)
+        for word in message.content.split(" "):
+            yield AIMessageChunk(content=word + " ")
+
+    def with_structured_output(self, schema: dict, include_raw: bool = False, **kwargs: Any) -> Runnable:
+        async def answer(input: Any) -> dict:
+            text = prompt_text(input)
+            prompt_tokens = estimate_tokens(text)
+            await asyncio.sleep(self.delay(prompt_tokens))
+            self.stats.record(f"{self.name}.structured", prompt_tokens, 40)
+            parsed = {field: self.structured_value(field) for field in schema.get("properties", {})}
+            if include_raw:
+                return {"raw": self.message("", prompt_tokens, 40), "parsed": parsed, "parsing_error": None}
+            return parsed
+        return RunnableLambda(answer)
+
+    @staticmethod
+    def structured_value(field: str) -> Any:
+        if field == "decision":
+            return "Include"
+        if field == "confidence":
+            return 4
+        if field == "rationale":
+            return "Meets the review criteria in the benchmark corpus."
+        return "Matched benchmark criterion"
+
+class FakeEmbeddings:
+    """Hashed bag-of-words embeddings: deterministic, offline, and similar texts stay similar"""
+
+    model = "fake-embeddings"
+
+    def __init__(self, stats: CallStats, latency: float = 0.0, dim: int = EMBEDDING_DIM):
+        self.stats = stats
+        self.latency = latency
+        self.dim = dim
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for token in tokenize(text):
+            vector[int(hashlib.md5(token.encode()).hexdigest(), 16) % self.dim] += 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        self.stats.record("embeddings.documents", sum(estimate_tokens(t) for t in texts))
+        return [self.embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        self.stats.record("embeddings.query", estimate_tokens(text))
+        return self.embed(text)
+
+class FakeVectorStore:
+    """In-memory cosine-similarity store with the subset of the Pinecone store API the app uses"""
+
+    def __init__(self, embeddings: FakeEmbeddings, stats: CallStats, latency: float = 0.0):
+        self.embeddings = embeddings
+        self.stats = stats
+        self.latency = latency
+        # Upserts replace the entry with the same ID, as in Pinecone
+        self.entries: Dict[str, Tuple[Document, List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def add_texts(self, texts: List[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        return self.add_vectors(self.embeddings.embed_documents(texts), texts, metadatas, ids)
+
+    def add_vectors(self, vectors: List[List[float]], texts: List[str], metadatas: Optional[List[dict]] = None,
+                    ids: Optional[List[str]] = None) -> List[str]:
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [uuid.uuid4().hex for _ in texts]
+        time.sleep(self.latency)
+        self.stats.record("vector_store.upsert")
+        with self._lock:
+            for id_, text, metadata, vector in zip(ids, texts, metadatas, vectors):
+                self.entries[id_] = (Document(page_content=text, metadata=metadata), vector)
+        return ids
+
+    def add_documents(self, docs: List[Document], **kwargs: Any) -> List[str]:
+        return self.add_texts([d.page_content for d in docs], [d.metadata for d in docs], **kwargs)
+
+    @staticmethod
+    def matches(value: Any, expected: Any) -> bool:
+        # List-valued metadata matches when it contains the value, as in Pinecone
+        return expected in value if isinstance(value, list) else value == expected
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any):
+        query_vector = self.embeddings.embed_query(query)
+        time.sleep(self.latency)
+        self.stats.record("vector_store.query")
+        with self._lock:
+            candidates = list(self.entries.values())
+        if filter:
+            candidates = [
+                (doc, vec) for doc, vec in candidates
+                if all(self.matches(doc.metadata.get(key), value) for key, value in filter.items())
+            ]
+        scored = [(doc, sum(a * b for a, b in zip(query_vector, vec))) for doc, vec in candidates]
+        return sorted(scored, key=lambda s: s[1], reverse=True)[:k]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None, **kwargs: Any):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
@@ -0,0 +1,202 @@
+"""
+End-to-end benchmark of the project creation pipeline:
+parse -> chunk -> embed -> filter -> summarise -> screen -> evidence table.
+
+Runs the production pipeline (web.pipeline.run_project_pipeline) on a local corpus,
+with its checkpoints, concurrency limits and database writes. PDF parsing and chunking
+run for real; the LLMs, the embedding client and the vector store are deterministic
+in-process fakes with configurable latency, installed through their providers, so runs
+are repeatable offline while embeddings still go through the usage accounting and the
+embedding cache. Writes wall time and peak memory, the time the pipeline's own stage
+metrics recorded, call counts and token totals as JSON, plus the token and cost
+accounting the app stored per stage.
+
+    python -m benchmarks.pipeline --corpus path/to/pdfs --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import shutil
+import tempfile
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; the report then has no max_rss_mb figure
+    resource = None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the screening pipeline with fake backends")
+    parser.add_argument("--corpus", required=True, help="Directory of PDFs to process")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--review-question", default="What is the diagnostic accuracy of the index test?")
+    parser.add_argument("--criteria", default="PICOS", help="Eligibility criteria framework")
+    parser.add_argument("--top-n", type=int, default=3, help="PDFs kept by the similarity filter")
+    parser.add_argument("--workers", type=int, default=0, help="PDFs in flight per stage; 0 means all at once")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per LLM call")
+    parser.add_argument("--per-token-latency", type=float, default=0.0, help="Extra seconds per LLM token")
+    parser.add_argument("--embedding-latency", type=float, default=0.01, help="Seconds per embedding request")
+    parser.add_argument("--vector-latency", type=float, default=0.005, help="Seconds per vector store request")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    return parser.parse_args(argv)
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            self.stages[name] = {
+                "wall_s": round(time.perf_counter() - start, 4),
+                "peak_mem_mb": round(peak / 1024 / 1024, 2),
+            }
+
+def isolate_environment(workdir: str) -> None:
+    """Point the database and local stores at a scratch directory before the app is imported"""
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["CHUNK_FOLDER"] = os.path.join(workdir, "chunks")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embeddings.db")
+    os.environ["UPLOAD_FOLDER"] = os.path.join(workdir, "uploads")
+    os.environ["SUMMARY_FOLDER"] = os.path.join(workdir, "summaries")
+    os.environ["REVIEW_RESULT_FOLDER"] = os.path.join(workdir, "review_results")
+    os.environ["WARM_UP_PROVIDERS"] = "false"
+
+def install_fakes(args, stats):
+    from benchmarks.fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore
+    from app.llms.chatopenai import light_llm, strong_llm
+    from app.embeddings.openai import embeddings, wrap_embeddings
+    from app.vector_stores.pinecone import vector_store
+
+    # Wrapped like the OpenAI client, so embedding usage and cache hits are counted as in production
+    embeddings.override(wrap_embeddings(FakeEmbeddings(stats, latency=args.embedding_latency)))
+    vector_store.override(FakeVectorStore(embeddings.get(), stats, latency=args.vector_latency))
+    light_llm.provider.override(FakeChatModel("light_llm", stats, args.llm_latency, args.per_token_latency))
+    strong_llm.provider.override(FakeChatModel("strong_llm", stats, args.llm_latency, args.per_token_latency))
+
+async def run_pipeline(args, timer: StageTimer) -> dict:
+    from sqlalchemy import select
+    from web.db import AsyncSessionLocal, engine
+    from web.db.models.project import Project
+    from web.db.models.pdf import Pdf
+    from web.api import get_filtered_pdf_ids, get_project_usage, store_llm_usage, upgrade_schema
+    from web.pipeline import UPLOAD_FOLDER, SUMMARY_FOLDER, REVIEW_RESULT_FOLDER, upload_path, run_project_pipeline
+    from app.metrics import current_project, stage_latency
+    from app.usage import flush_usage, set_usage_sink
+    from app.vector_stores.bm25 import load_chunks
+    from app.evidence_table import create_evidence_table
+    from app.criteria.criteria import criteria_dict
+
+    upgrade_schema(engine)
+    set_usage_sink(store_llm_usage)
+    for folder in (UPLOAD_FOLDER, SUMMARY_FOLDER, REVIEW_RESULT_FOLDER):
+        os.makedirs(folder, exist_ok=True)
+    criteria = criteria_dict.get(args.criteria, [])
+
+    pdf_names = sorted(name for name in os.listdir(args.corpus) if name.endswith(".pdf"))
+    if not pdf_names:
+        raise SystemExit(f"No PDFs found in {args.corpus}")
+
+    async with AsyncSessionLocal() as db:
+        project = Project(name="benchmark", review_question=args.review_question,
+                          review_type="diagnostic", search_criteria=args.criteria)
+        db.add(project)
+        await db.commit()
+        current_project.set(project.id)
+
+        # Uploaded as the web app does: the file under the PDF's ID, then its row
+        pdfs = [Pdf(name=name, project_id=project.id) for name in pdf_names]
+        db.add_all(pdfs)
+        await db.flush()
+        for pdf in pdfs:
+            shutil.copyfile(os.path.join(args.corpus, pdf.name), upload_path(pdf.id))
+        await db.commit()
+        pdf_ids = [pdf.id for pdf in pdfs]
+
+    with timer.stage("pipeline"):
+        await run_project_pipeline(project, pdf_ids, workers=args.workers, top_n=args.top_n)
+
+    async with AsyncSessionLocal() as db:
+        shortlisted = await get_filtered_pdf_ids(db, project.id)
+        shortlisted_pdfs = {pdf.id: pdf for pdf in await db.scalars(select(Pdf).where(Pdf.id.in_(shortlisted)))}
+
+        with timer.stage("evidence_table"):
+            await create_evidence_table(shortlisted_pdfs, criteria)
+
+        await flush_usage()
+        usage = await get_project_usage(db, project.id, group_by="stage_model")
+
+    stage_seconds = {}
+    for (stage, _), (count, total) in stage_latency.totals().items():
+        totals = stage_seconds.setdefault(stage, {"calls": 0, "total_s": 0.0})
+        totals["calls"] += count
+        totals["total_s"] = round(totals["total_s"] + total, 4)
+
+    return {
+        "pdfs": len(pdf_ids),
+        "chunks": sum(len(load_chunks(pdf_id)) for pdf_id in pdf_ids),
+        "screened": len(shortlisted),
+        "stage_seconds": stage_seconds,
+        "usage": usage,
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="pipeline-bench-")
+    isolate_environment(workdir)
+
+    from benchmarks.fakes import CallStats
+    stats = CallStats()
+    install_fakes(args, stats)
+
+    tracemalloc.start()
+    timer = StageTimer()
+    start = time.perf_counter()
+    # Keep the pipeline's progress logging off stdout so the report stays valid JSON
+    with redirect_stdout(sys.stderr):
+        corpus = asyncio.run(run_pipeline(args, timer))
+    usage = corpus.pop("usage")
+    stage_seconds = corpus.pop("stage_seconds")
+    total = time.perf_counter() - start
+    tracemalloc.stop()
+
+    report = {
+        "corpus": corpus,
+        "config": {
+            "llm_latency": args.llm_latency,
+            "per_token_latency": args.per_token_latency,
+            "embedding_latency": args.embedding_latency,
+            "vector_latency": args.vector_latency,
+            "top_n": args.top_n,
+            "workers": args.workers,
+        },
+        "total_wall_s": round(total, 4),
+        # ru_maxrss is KiB on Linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2) if resource else None,
+        "stages": timer.stages,
+        # Summed over PDFs, so concurrent stages can add up to more than the wall time
+        "stage_seconds": stage_seconds,
+        "calls": stats.as_dict(),
+        "usage": usage,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return report
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
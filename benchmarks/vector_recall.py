@@ -0,0 +1,125 @@
+"""
+Recall, latency and memory of the local vector store for each quantisation mode.
+
+Builds a LocalVectorStore per mode over the same vectors and compares its top-k results
+with exact brute-force search. Vectors are synthetic clustered embeddings by default, or
+the real vectors in an embedding cache (embeddings.db). Writes the report as JSON.
+
+    python -m benchmarks.vector_recall --vectors 100000 --output recall.json
+"""
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+import numpy as np
+
+from app.vector_stores.local import LocalVectorStore, normalise
+
+MODES = ("none", "int8", "pq")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark quantised local vector search")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--vectors", type=int, default=50000, help="Synthetic vectors to index")
+    parser.add_argument("--dim", type=int, default=1536, help="Synthetic vector dimension")
+    parser.add_argument("--clusters", type=int, default=200, help="Topics the synthetic vectors cluster around")
+    parser.add_argument("--embedding-cache", help="Use the vectors in this embeddings.db instead of synthetic ones")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank-factors", default="1,4,10", help="Comma-separated candidates per result to re-rank")
+    parser.add_argument("--subspaces", type=int, default=0, help="PQ sub-vectors (default dim / 4)")
+    parser.add_argument("--modes", default=",".join(MODES))
+    return parser.parse_args(argv)
+
+def synthetic_vectors(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    """
+    Clustered vectors with a decaying variance spectrum, so a few directions dominate
+    as in real text embeddings.
+    """
+    rng = np.random.default_rng(seed)
+    spectrum = 1 / np.sqrt(np.arange(1, dim + 1))
+    centres = rng.normal(size=(clusters, dim)) * spectrum
+    assignment = rng.integers(0, clusters, n)
+    return (centres[assignment] + rng.normal(size=(n, dim)) * spectrum * 0.6).astype(np.float32)
+
+def cached_vectors(path: str) -> np.ndarray:
+    conn = sqlite3.connect(path)
+    rows = [np.frombuffer(blob, dtype=np.float32) for (blob,) in conn.execute("SELECT vector FROM vectors")]
+    conn.close()
+    if not rows:
+        raise SystemExit(f"No vectors in {path}")
+    return np.stack(rows)
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> list:
+    scores = queries @ vectors.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+def evaluate(store: LocalVectorStore, queries: np.ndarray, truth: list, k: int, rerank_factor: int) -> dict:
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = {row for row, _ in store.search_rows(query, k, rerank_factor=rerank_factor)}
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(found & expected) / k)
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "recall_at_k": round(float(np.mean(recalls)), 4),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 3),
+    }
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.embedding_cache:
+        vectors = cached_vectors(args.embedding_cache)
+    else:
+        vectors = synthetic_vectors(args.vectors + args.queries, args.dim, args.clusters)
+    vectors = normalise(vectors)
+    # Held-out vectors are the queries, so none is its own nearest neighbour
+    queries, vectors = vectors[:args.queries], vectors[args.queries:]
+    truth = exact_top_k(vectors, queries, args.k)
+    rerank_factors = [int(f) for f in args.rerank_factors.split(",")]
+
+    results = {}
+    for mode in args.modes.split(","):
+        with tempfile.TemporaryDirectory(prefix="vector-bench-") as path:
+            store = LocalVectorStore(path, embedding=None, quantization=mode, subspaces=args.subspaces,
+                                     pq_train_size=min(len(vectors), 10000))
+            start = time.perf_counter()
+            for i in range(0, len(vectors), 5000):
+                batch = vectors[i:i + 5000]
+                store.add_vectors(batch, [""] * len(batch), ids=[str(j) for j in range(i, i + len(batch))])
+            build_s = time.perf_counter() - start
+
+            bytes_per_vector = store.bytes_per_vector
+            results[mode] = {
+                "build_s": round(build_s, 3),
+                "memory_bytes_per_vector": round(bytes_per_vector, 1),
+                # Exact search keeps nothing in memory but scans every vector on disk per query
+                "compression": round(vectors.shape[1] * 4 / bytes_per_vector, 1) if bytes_per_vector else None,
+                "rerank": {
+                    str(factor): evaluate(store, queries, truth, args.k, factor)
+                    for factor in (rerank_factors if mode != "none" else [1])
+                },
+            }
+
+    report = {
+        "vectors": len(vectors),
+        "dim": int(vectors.shape[1]),
+        "queries": len(queries),
+        "k": args.k,
+        "source": args.embedding_cache or "synthetic",
+        "modes": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+    return report
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
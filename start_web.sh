@@ -6,14 +6,14 @@ python3 -m app.vector_stores.reset_pinecone
 
 # Step 1: Remove old database
 echo "Removing old database..."
-rm -f test.db
+rm -f test.db test.db-wal test.db-shm
 
 # Step 2: Remove uploads and summaries
 echo "Cleaning up old uploads and summaries..."
-rm -rf uploads summaries review_results
+rm -rf uploads summaries review_results chunks
 
 # Step 3: Recreate directories
-mkdir -p uploads summaries review_results
+mkdir -p uploads summaries review_results chunks
 
 # Step 4: Initialize database
 echo "Initializing database..."
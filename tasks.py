@@ -1,4 +1,5 @@
 import os
+import shlex
 from invoke import task
 
 @task
@@ -10,10 +11,45 @@ def dev(ctx):
         env={"ENV": "development"}
     )
 
+@task
+def bench(ctx, corpus, output="bench.json", llm_latency=0.05):
+    """Benchmark the screening pipeline on a folder of PDFs with fake LLM and vector backends."""
+    ctx.run(
+        f"python -m benchmarks.pipeline --corpus {shlex.quote(corpus)} --output {shlex.quote(output)}"
+        f" --llm-latency {shlex.quote(str(llm_latency))}",
+        pty=os.name != "nt",
+    )
+
+@task
+def bench_vectors(ctx, vectors=50000, output="recall.json"):
+    """Benchmark recall, latency and memory of the quantised local vector store."""
+    ctx.run(
+        f"python -m benchmarks.vector_recall --vectors {shlex.quote(str(vectors))} --output {shlex.quote(output)}",
+        pty=os.name != "nt",
+    )
+
+@task
+def import_pdfs(ctx, source, project=None, name=None, review_question=None, review_type="diagnostic",
+                criteria="PICOS", workers=8):
+    """Import a directory or zip of PDFs into a new or existing project and process them; rerun to resume."""
+    args = [source, "--review-type", review_type, "--criteria", criteria, "--workers", str(workers)]
+    if project:
+        args += ["--project", project]
+    if name:
+        args += ["--name", name]
+    if review_question:
+        args += ["--review-question", review_question]
+    ctx.run(f"python -m web.bulk_import {' '.join(shlex.quote(arg) for arg in args)}", pty=os.name != "nt")
+
+@task
+def gc(ctx):
+    """Remove vectors, chunks and files left by deleted PDFs and projects, and compact the local index."""
+    ctx.run("python -m web.cleanup", pty=os.name != "nt")
+
 # @task
 # def devworker(ctx):
 #     ctx.run(
-#         "watchmedo auto-restart --directory=./app --pattern=*.py --recursive -- celery -A app.celery.worker worker --concurrency=1 --loglevel=INFO --pool=solo",
+#         "watchmedo auto-restart --directory=./app --pattern=*.py --recursive -- celery -A web.worker worker --concurrency=1 --loglevel=INFO --pool=solo",
 #         pty=os.name != "nt",
 #         env={"APP_ENV": "development"},
 #     )
\ No newline at end of file
@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+from benchmarks.fakes import CallStats, FakeChatModel, FakeEmbeddings, FakeVectorStore
+
+
+def test_fake_vector_store_filters_and_ranks_by_similarity():
+    stats = CallStats()
+    store = FakeVectorStore(FakeEmbeddings(stats), stats)
+    store.add_documents([
+        Document(page_content="sensitivity of the index test", metadata={"pdf_id": "a"}),
+        Document(page_content="weather in the alps", metadata={"pdf_id": "a"}),
+        Document(page_content="sensitivity and specificity", metadata={"pdf_id": "b"}),
+    ])
+
+    results = store.similarity_search("index test sensitivity", k=2, filter={"pdf_id": "a"})
+
+    assert [d.page_content for d in results] == ["sensitivity of the index test", "weather in the alps"]
+    assert stats.as_dict()["vector_store.query"]["calls"] == 1
+
+
+def test_fake_chat_model_fills_structured_fields_and_counts_tokens():
+    stats = CallStats()
+    llm = FakeChatModel("light_llm", stats)
+    schema = {"properties": {"decision": {}, "confidence": {}, "population": {}}}
+
+    result = asyncio.run(llm.with_structured_output(schema).ainvoke("Screen this study"))
+
+    assert result["decision"] == "Include"
+    assert result["confidence"] == 4
+    assert stats.as_dict()["light_llm.structured"]["calls"] == 1
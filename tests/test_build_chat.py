@@ -0,0 +1,94 @@
+import sys
+import types
+import importlib
+import pytest
+
+# Provide dummy modules required for import
+def stub_module(name, **attrs):
+    mod = types.ModuleType(name)
+    for key, value in attrs.items():
+        setattr(mod, key, value)
+    return sys.modules.setdefault(name, mod)
+
+class DummyPromptTemplate:
+    @classmethod
+    def from_messages(cls, messages):
+        return cls()
+
+class DummyRunnableBranch:
+    def __init__(self, *branches):
+        self.branches = branches
+    def with_config(self, **kwargs):
+        return self
+
+built = []
+
+def create_retrieval_chain(retriever=None, combine_docs_chain=None):
+    chain = object()
+    built.append(chain)
+    return chain
+
+stub_module("langchain.chains.retrieval", create_retrieval_chain=create_retrieval_chain)
+stub_module("langchain.chains.combine_documents", create_stuff_documents_chain=lambda llm, prompt: None)
+stub_module("langchain_core.prompts", ChatPromptTemplate=DummyPromptTemplate, MessagesPlaceholder=lambda name: name)
+stub_module("langchain.memory", ConversationBufferMemory=object)
+stub_module("langchain_core.runnables", Runnable=object, RunnableBranch=DummyRunnableBranch)
+stub_module("langchain_core.output_parsers", StrOutputParser=object)
+stub_module("langchain_core.retrievers", BaseRetriever=object)
+stub_module("langchain_core.language_models", BaseChatModel=object)
+stub_module("sqlalchemy.orm", Session=object)
+stub_module("app.vector_stores.pinecone", build_retriever=lambda chat_args: None)
+stub_module("app.llms.chatopenai", build_llm=lambda chat_args: None, light_llm=None)
+stub_module("app.memories.sql_memory", build_memory=lambda chat_args, db: ("memory", db))
+stub_module("app.models", ChatArgs=object)
+
+chat = importlib.import_module("app.chat.chat")
+
+@pytest.fixture(autouse=True)
+def stub_history_aware_retriever(monkeypatch):
+    monkeypatch.setattr(chat, "build_history_aware_retriever", lambda llm, retriever: None)
+
+def chat_args(pdf_id, llm=None):
+    return types.SimpleNamespace(pdf_id=pdf_id, streaming=False, llm=llm, retriever=None, memory=None)
+
+
+def test_build_chat_reuses_chain_for_same_configuration():
+    chat.clear_chain_cache()
+
+    chain_1, memory_1 = chat.build_chat(chat_args("pdf1"), db="db1")
+    chain_2, memory_2 = chat.build_chat(chat_args("pdf1"), db="db2")
+    chain_3, _ = chat.build_chat(chat_args("pdf1", llm="gpt-4"), db="db2")
+
+    assert chain_1 is chain_2
+    assert chain_3 is not chain_1
+    assert memory_1 == ("memory", "db1")
+    assert memory_2 == ("memory", "db2")
+
+
+def test_chain_cache_evicts_least_recently_used(monkeypatch):
+    chat.clear_chain_cache()
+    monkeypatch.setattr(chat, "CHAIN_CACHE_SIZE", 2)
+
+    chain_1 = chat.get_rag_chain(chat_args("pdf1"))
+    chat.get_rag_chain(chat_args("pdf2"))
+    assert chat.get_rag_chain(chat_args("pdf1")) is chain_1
+
+    chat.get_rag_chain(chat_args("pdf3"))
+
+    assert chat.get_rag_chain(chat_args("pdf1")) is chain_1
+    assert chat.chain_cache_key(chat_args("pdf2")) not in chat._chain_cache
+
+
+def test_is_self_contained():
+    assert chat.is_self_contained("What was the sensitivity of the MRI index test?")
+    assert not chat.is_self_contained("What about its specificity in the validation cohort?")
+    assert not chat.is_self_contained("And the specificity?")
+
+
+def test_needs_rewrite_skips_first_turn_and_self_contained_questions():
+    follow_up = "What was it compared against?"
+    standalone = "What reference standard did the diagnostic study use?"
+
+    assert not chat.needs_rewrite({"input": follow_up, "chat_history": []})
+    assert not chat.needs_rewrite({"input": standalone, "chat_history": ["previous turn"]})
+    assert chat.needs_rewrite({"input": follow_up, "chat_history": ["previous turn"]})
@@ -0,0 +1,52 @@
+import asyncio
+import zipfile
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("fitz")
+
+from web.bulk_import import source_pdfs, copy_pdf
+from web.pipeline import gather_limited
+
+
+def make_source(tmp_path):
+    source = tmp_path / "export"
+    (source / "batch2").mkdir(parents=True)
+    (source / "a.pdf").write_bytes(b"%PDF-1.4 first")
+    (source / "batch2" / "b.PDF").write_bytes(b"%PDF-1.4 second")
+    (source / "c.pdf").write_bytes(b"<html>not a pdf</html>")
+    (source / "notes.txt").write_text("ignored")
+    return source
+
+
+def test_directory_and_zip_sources_list_the_same_pdfs(tmp_path):
+    source = make_source(tmp_path)
+    archive = tmp_path / "export.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        for path in source.rglob("*"):
+            zf.write(path, path.relative_to(source).as_posix())
+        zf.writestr("__MACOSX/._a.pdf", b"resource fork")
+
+    for src in (source, archive):
+        names, copied = [], []
+        for i, (name, opener) in enumerate(source_pdfs(str(src))):
+            names.append(name)
+            if copy_pdf(opener, str(tmp_path / f"{i}.pdf")):
+                copied.append((tmp_path / f"{i}.pdf").read_bytes())
+        assert names == ["a.pdf", "batch2/b.PDF", "c.pdf"]
+        assert copied == [b"%PDF-1.4 first", b"%PDF-1.4 second"]
+
+
+def test_gather_limited_bounds_concurrency_and_keeps_order():
+    running, peak = 0, 0
+
+    async def work(i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return i
+
+    assert asyncio.run(gather_limited((work(i) for i in range(10)), workers=3)) == list(range(10))
+    assert peak == 3
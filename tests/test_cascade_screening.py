@@ -0,0 +1,209 @@
+import sys
+import types
+from dataclasses import dataclass
+import importlib
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, patch
+
+# Provide dummy modules required for import
+dotenv_mod = types.ModuleType("dotenv")
+dotenv_mod.load_dotenv = lambda *args, **kwargs: None
+sys.modules.setdefault("dotenv", dotenv_mod)
+
+# aiofiles with async open/write
+aiofiles_mod = types.ModuleType("aiofiles")
+class AsyncFile:
+    def __init__(self, path, mode="r", encoding=None):
+        self._f = open(path, mode, encoding=encoding)
+    async def __aenter__(self):
+        return self
+    async def __aexit__(self, exc_type, exc, tb):
+        self._f.close()
+    async def write(self, data):
+        self._f.write(data)
+    async def read(self):
+        return self._f.read()
+
+aiofiles_mod.open = lambda path, mode="r", encoding=None: AsyncFile(path, mode, encoding)
+sys.modules.setdefault("aiofiles", aiofiles_mod)
+
+# langchain_core.documents.Document
+@dataclass
+class Document:
+    page_content: str
+    metadata: dict
+
+doc_mod = types.ModuleType("langchain_core.documents")
+doc_mod.Document = Document
+sys.modules.setdefault("langchain_core.documents", doc_mod)
+core_mod = sys.modules.setdefault("langchain_core", types.ModuleType("langchain_core"))
+core_mod.documents = doc_mod
+
+# langchain.prompts.PromptTemplate
+class PromptTemplate:
+    def __init__(self, input_variables=None, template=""):
+        self.input_variables = input_variables
+        self.template = template
+    def __or__(self, other):
+        return other
+
+prompts_mod = types.ModuleType("langchain.prompts")
+prompts_mod.PromptTemplate = PromptTemplate
+sys.modules.setdefault("langchain.prompts", prompts_mod)
+
+class DummyLLM:
+    async def ainvoke(self, *args, **kwargs):
+        return types.SimpleNamespace(content="")
+
+llm_mod = types.ModuleType("app.llms.chatopenai")
+llm_mod.light_llm = DummyLLM()
+llm_mod.strong_llm = DummyLLM()
+sys.modules.setdefault("app.llms.chatopenai", llm_mod)
+
+vector_mod = types.ModuleType("app.vector_stores.pinecone")
+vector_mod.vector_store = None
+sys.modules.setdefault("app.vector_stores.pinecone", vector_mod)
+
+stard_mod = types.ModuleType("app.stard_summary")
+async def dummy_summary(docs):
+    return ""
+stard_mod.llm_summary = dummy_summary
+stard_mod.group_doc_by_section = lambda docs: [docs]
+sys.modules.setdefault("app.stard_summary", stard_mod)
+
+sr = importlib.import_module("app.systematic_review")
+
+docs = [Document(page_content="Abstract text", metadata={"section_title": "Abstract", "main_title": "Main"})]
+criteria = ["Population"]
+
+
+def test_cascade_skips_summary_for_confident_exclusion(tmp_path):
+    async def fake_prescreen(q, d, c):
+        return {
+            "decision": "Exclude",
+            "confidence": 5,
+            "rationale": "Off-topic",
+            "criteria_matches": {"Population": "Not Matched adults"},
+        }
+
+    async def fail_summary(d, partial_path=None):
+        raise AssertionError("full summary should not run")
+
+    on_result = AsyncMock()
+    with patch.object(sr, "llm_prescreening", side_effect=fake_prescreen), \
+         patch.object(sr, "llm_summary", side_effect=fail_summary):
+        asyncio.run(sr.get_screening_result(
+            "id1", "proj1", "question", str(tmp_path), docs, criteria, cascade=True, on_result=on_result
+        ))
+
+    written = on_result.call_args.args[0]
+    assert written["decision"] == "Exclude"
+    assert written["screening_stage"] == "prescreen"
+    assert (tmp_path / "id1.txt").exists()
+
+
+def test_resuming_an_excluded_pdf_prescreens_it_again(tmp_path):
+    checkpoints = []
+
+    async def on_checkpoint(stage):
+        checkpoints.append(stage)
+
+    async def fake_prescreen(q, d, c):
+        return {"decision": "Exclude", "confidence": 5, "rationale": "Off-topic", "criteria_matches": {}}
+
+    async def fail_screening(q, s, c):
+        raise AssertionError("the placeholder summary should not be screened")
+
+    # The run dies before the exclusion is stored
+    crashed = AsyncMock(side_effect=RuntimeError("worker killed"))
+    on_result = AsyncMock()
+    with patch.object(sr, "llm_prescreening", side_effect=fake_prescreen) as prescreen, \
+         patch.object(sr, "llm_screening", side_effect=fail_screening):
+        with pytest.raises(RuntimeError):
+            asyncio.run(sr.get_screening_result(
+                "id5", "proj1", "question", str(tmp_path), docs, criteria, cascade=True,
+                on_checkpoint=on_checkpoint, on_result=crashed,
+            ))
+        asyncio.run(sr.get_screening_result(
+            "id5", "proj1", "question", str(tmp_path), docs, criteria, cascade=True,
+            reuse_summary="summarised" in checkpoints, on_checkpoint=on_checkpoint, on_result=on_result,
+        ))
+
+    assert checkpoints == []
+    assert prescreen.call_count == 2
+    assert on_result.call_args.args[0]["screening_stage"] == "prescreen"
+
+
+def test_cascade_runs_full_screening_for_unclear(tmp_path):
+    async def fake_prescreen(q, d, c):
+        return {"decision": "Unclear", "confidence": 5, "rationale": "Needs full text", "criteria_matches": {}}
+
+    async def fake_summary(d, partial_path=None):
+        return "summary text"
+
+    async def fake_screening(q, s, c):
+        assert s == "summary text"
+        return {"decision": "Include", "confidence": 4, "rationale": "Relevant", "criteria_matches": {}}
+
+    on_result = AsyncMock()
+    with patch.object(sr, "llm_prescreening", side_effect=fake_prescreen), \
+         patch.object(sr, "llm_summary", side_effect=fake_summary) as psum, \
+         patch.object(sr, "llm_screening", side_effect=fake_screening):
+        asyncio.run(sr.get_screening_result(
+            "id2", "proj1", "question", str(tmp_path), docs, criteria, cascade=True, on_result=on_result
+        ))
+
+    written = on_result.call_args.args[0]
+    assert psum.called
+    assert written["decision"] == "Include"
+    assert "screening_stage" not in written
+    assert (tmp_path / "id2.txt").read_text() == "summary text"
+
+
+def test_resume_screens_saved_summary_without_summarising(tmp_path):
+    (tmp_path / "id3.txt").write_text("saved summary")
+    checkpoints = []
+
+    async def on_checkpoint(stage):
+        checkpoints.append(stage)
+
+    async def fail_summary(d, partial_path=None):
+        raise AssertionError("summary should be reused")
+
+    async def fake_screening(q, s, c):
+        assert s == "saved summary"
+        return {"decision": "Include", "confidence": 4, "rationale": "Relevant", "criteria_matches": {}}
+
+    on_result = AsyncMock()
+    with patch.object(sr, "llm_summary", side_effect=fail_summary), \
+         patch.object(sr, "llm_screening", side_effect=fake_screening):
+        asyncio.run(sr.get_screening_result(
+            "id3", "proj1", "question", str(tmp_path), docs, criteria,
+            reuse_summary=True, on_checkpoint=on_checkpoint, on_result=on_result,
+        ))
+
+    assert on_result.call_args.args[0]["decision"] == "Include"
+    assert checkpoints == []
+
+
+def test_summary_checkpoint_is_reported_before_screening(tmp_path):
+    events = []
+
+    async def on_checkpoint(stage):
+        events.append(stage)
+
+    async def fake_summary(d, partial_path=None):
+        return "summary text"
+
+    async def fake_screening(q, s, c):
+        events.append("screening")
+        return {"decision": "Exclude", "confidence": 3, "rationale": "Off-topic", "criteria_matches": {}}
+
+    with patch.object(sr, "llm_summary", side_effect=fake_summary), \
+         patch.object(sr, "llm_screening", side_effect=fake_screening):
+        asyncio.run(sr.get_screening_result(
+            "id4", "proj1", "question", str(tmp_path), docs, criteria, on_checkpoint=on_checkpoint,
+        ))
+
+    assert events == ["summarised", "screening"]
@@ -0,0 +1,56 @@
+import sys
+import types
+import importlib
+
+# Provide dummy modules required for import
+dotenv_mod = types.ModuleType("dotenv")
+dotenv_mod.load_dotenv = lambda *args, **kwargs: None
+sys.modules.setdefault("dotenv", dotenv_mod)
+
+cs = importlib.import_module("app.checklist_selection")
+
+checklist = """# Checklist
+
+## TITLE
+
+1. Title item
+
+## METHODS
+
+### Participants
+
+2. Methods item
+
+## RESULTS
+
+3. Results item
+"""
+
+
+def test_select_checklist_sections_keeps_matching_sections():
+    selected = cs.select_checklist_sections(checklist, ["Materials and Methods"])
+
+    assert selected.startswith("# Checklist")
+    assert "Methods item" in selected
+    assert "Title item" not in selected
+    assert "Results item" not in selected
+
+
+def test_select_checklist_sections_combines_titles():
+    selected = cs.select_checklist_sections(checklist, ["Methods", "Results"])
+
+    assert "Methods item" in selected
+    assert "Results item" in selected
+    assert "Title item" not in selected
+
+
+def test_select_checklist_sections_falls_back_for_unknown_titles():
+    assert cs.select_checklist_sections(checklist, ["Methods", "Full Document"]) == checklist
+
+
+def test_checklist_for_sections_respects_flag(monkeypatch):
+    monkeypatch.setattr(cs, "CHECKLIST_PRESELECTION", False)
+    assert cs.checklist_for_sections(checklist, ["Results"]) == checklist
+
+    monkeypatch.setattr(cs, "CHECKLIST_PRESELECTION", True)
+    assert "Methods item" not in cs.checklist_for_sections(checklist, ["Results"])
@@ -0,0 +1,129 @@
+import sys
+import types
+import importlib
+import asyncio
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+# Provide dummy modules required for import
+dotenv_mod = types.ModuleType("dotenv")
+dotenv_mod.load_dotenv = lambda *args, **kwargs: None
+sys.modules.setdefault("dotenv", dotenv_mod)
+
+messages_mod = types.ModuleType("langchain.schema.messages")
+messages_mod.AIMessage = messages_mod.HumanMessage = messages_mod.SystemMessage = object
+sys.modules.setdefault("langchain.schema.messages", messages_mod)
+
+db = importlib.import_module("web.db")
+Project = importlib.import_module("web.db.models.project").Project
+Pdf = importlib.import_module("web.db.models.pdf").Pdf
+Conversation = importlib.import_module("web.db.models.conversation").Conversation
+Message = importlib.import_module("web.db.models.message").Message
+ScreeningResult = importlib.import_module("web.db.models.screening_result").ScreeningResult
+LlmUsage = importlib.import_module("web.db.models.llm_usage").LlmUsage
+api = importlib.import_module("web.api")
+
+
+async def make_session(tmp_path):
+    engine = db.create_async_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(db.Base.metadata.create_all)
+    session = async_sessionmaker(bind=engine, expire_on_commit=False)()
+    for project_id in ["p1", "p2"]:
+        session.add(Project(id=project_id, name="Review", review_type="diagnostic"))
+    for pdf_id, project_id in [("a", "p1"), ("b", "p1"), ("c", "p2")]:
+        session.add(Pdf(id=pdf_id, name=f"{pdf_id}.pdf", project_id=project_id))
+        session.add(ScreeningResult(pdf_id=pdf_id, project_id=project_id, decision="Include"))
+        session.add(Conversation(id=f"conv-{pdf_id}", pdf_id=pdf_id))
+        session.add(Message(conversation_id=f"conv-{pdf_id}", role="human", content="hi"))
+    await session.commit()
+    await api.add_filtered_pdfs(session, "p1", [("a", 0.9), ("b", 0.8)])
+    await api.mark_pdf_stage(session, ["a", "b", "c"], "parsed")
+    await api.add_llm_usage(session, [{
+        "project_id": "p1", "pdf_id": "a", "stage": "screen", "model": "gpt-4o-mini",
+        "calls": 1, "prompt_tokens": 10, "completion_tokens": 2, "cost_usd": 0.001,
+    }])
+    return session
+
+
+async def count(session, model, *where):
+    return await session.scalar(select(func.count()).select_from(model).where(*where))
+
+
+def test_delete_pdf_rows_removes_everything_owned_by_the_pdf(tmp_path):
+    async def run_test():
+        session = await make_session(tmp_path)
+
+        await api.delete_pdf_rows(session, ["a"])
+
+        assert await count(session, Pdf) == 2
+        assert await count(session, ScreeningResult, ScreeningResult.pdf_id == "a") == 0
+        assert await count(session, Conversation, Conversation.pdf_id == "a") == 0
+        assert await count(session, Message, Message.conversation_id == "conv-a") == 0
+        assert await count(session, Message) == 2
+        assert await api.get_filtered_pdf_ids(session, "p1") == ["b"]
+        assert await api.get_pdf_stages(session, ["a", "b"]) == {"a": set(), "b": {"parsed"}}
+        # Spend already incurred still counts towards the project
+        assert await count(session, LlmUsage) == 1
+        await session.close()
+
+    asyncio.run(run_test())
+
+
+def test_delete_project_rows_leaves_other_projects_untouched(tmp_path):
+    async def run_test():
+        session = await make_session(tmp_path)
+
+        deleted = await api.delete_project_rows(session, "p1")
+
+        assert sorted(deleted) == ["a", "b"]
+        assert await count(session, Project) == 1
+        assert list(await session.scalars(select(Pdf.id))) == ["c"]
+        assert await count(session, ScreeningResult) == 1
+        assert await count(session, Message) == 1
+        assert await count(session, LlmUsage) == 0
+        assert await api.get_filtered_pdf_ids(session, "p1") == []
+        await session.close()
+
+    asyncio.run(run_test())
+
+
+def test_delete_orphaned_rows_removes_rows_written_after_a_delete(tmp_path):
+    async def run_test():
+        session = await make_session(tmp_path)
+        await api.delete_pdf_rows(session, ["a"])
+        # A pipeline still running for the deleted PDF records its progress
+        await api.mark_pdf_stage(session, ["a"], "summarised")
+        session.add(ScreeningResult(pdf_id="a", project_id="p1", decision="Exclude"))
+        session.add(Conversation(id="conv-a2", pdf_id="a"))
+        session.add(Message(conversation_id="conv-a2", role="human", content="hi"))
+        await session.commit()
+
+        assert await api.delete_orphaned_rows(session) == 4
+
+        assert await count(session, ScreeningResult) == 2
+        assert await count(session, Conversation) == 2
+        assert await count(session, Message) == 2
+        assert await api.get_pdf_stages(session, ["a", "b"]) == {"a": set(), "b": {"parsed"}}
+        assert await api.delete_orphaned_rows(session) == 0
+        await session.close()
+
+    asyncio.run(run_test())
+
+
+def test_chat_turn_answer_sorts_after_the_question(tmp_path):
+    async def run_test():
+        session = await make_session(tmp_path)
+
+        await api.add_chat_turn(session, "conv-c", "question", "answer")
+
+        rows = await session.execute(
+            select(Message.role, Message.created_on).where(Message.conversation_id == "conv-c")
+            .order_by(Message.created_on.desc()).limit(2)
+        )
+        (answer_role, answered_on), (question_role, asked_on) = rows.all()
+        assert (answer_role, question_role) == ("ai", "human")
+        assert answered_on > asked_on
+        await session.close()
+
+    asyncio.run(run_test())
@@ -0,0 +1,177 @@
+import sys
+import types
+import importlib
+from dataclasses import dataclass, field
+
+# Provide dummy modules required for import
+dotenv_mod = types.ModuleType("dotenv")
+dotenv_mod.load_dotenv = lambda *args, **kwargs: None
+sys.modules.setdefault("dotenv", dotenv_mod)
+
+@dataclass
+class Document:
+    page_content: str
+    metadata: dict = field(default_factory=dict)
+
+doc_mod = types.ModuleType("langchain_core.documents")
+doc_mod.Document = Document
+sys.modules.setdefault("langchain_core.documents", doc_mod)
+core_mod = sys.modules.setdefault("langchain_core", types.ModuleType("langchain_core"))
+core_mod.documents = doc_mod
+
+embeddings_mod = types.ModuleType("langchain_core.embeddings")
+embeddings_mod.Embeddings = object
+sys.modules.setdefault("langchain_core.embeddings", embeddings_mod)
+
+class BaseRetriever:
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+retrievers_mod = types.ModuleType("langchain_core.retrievers")
+retrievers_mod.BaseRetriever = BaseRetriever
+sys.modules.setdefault("langchain_core.retrievers", retrievers_mod)
+callbacks_mod = types.ModuleType("langchain_core.callbacks")
+callbacks_mod.CallbackManagerForRetrieverRun = object
+sys.modules.setdefault("langchain_core.callbacks", callbacks_mod)
+
+cache = importlib.import_module("app.embeddings.cache")
+bm25 = importlib.import_module("app.vector_stores.bm25")
+pinecone = importlib.import_module("app.vector_stores.pinecone")
+
+
+class CountingEmbeddings:
+    model = "test-embedding"
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class RecordingStore:
+    def __init__(self):
+        self.entries = {}
+        self.vectors = {}
+
+    def get(self):
+        return self
+
+    def add_vectors(self, vectors, texts, metadatas=None, ids=None):
+        for id_, text, metadata in zip(ids, texts, metadatas):
+            self.entries[id_] = (text, metadata)
+        self.vectors.update(zip(ids, vectors))
+        return ids
+
+    def update_metadata(self, updates):
+        for id_, metadata in updates.items():
+            text, old = self.entries[id_]
+            self.entries[id_] = (text, {**old, **metadata})
+
+    def delete(self, ids=None, filter=None):
+        for id_ in ids or []:
+            del self.entries[id_]
+        if filter:
+            self.entries = {
+                id_: (text, metadata) for id_, (text, metadata) in self.entries.items()
+                if filter["pdf_id"] not in metadata["pdf_id"]
+            }
+
+
+def test_cached_embeddings_embed_each_distinct_text_once(tmp_path):
+    inner = CountingEmbeddings()
+    store = cache.EmbeddingCache(str(tmp_path / "embeddings.db"))
+    embeddings = cache.CachedEmbeddings(inner, store)
+
+    first = embeddings.embed_documents(["licence text", "results", "licence  text\n"])
+    second = cache.CachedEmbeddings(inner, cache.EmbeddingCache(str(tmp_path / "embeddings.db")))
+    again = second.embed_documents(["results", "methods"])
+
+    assert inner.embedded == ["licence text", "results", "methods"]
+    assert first[0] == first[2] == [12.0, 1.0]
+    assert again[0] == first[1]
+
+
+def test_duplicate_chunks_share_one_vector_across_projects(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25, "CHUNK_FOLDER", str(tmp_path / "chunks"))
+    inner = CountingEmbeddings()
+    store = cache.EmbeddingCache(str(tmp_path / "embeddings.db"))
+    vector_store = RecordingStore()
+    monkeypatch.setattr(pinecone, "embedding_cache", store)
+    monkeypatch.setattr(pinecone, "embeddings", cache.CachedEmbeddings(inner, store))
+    monkeypatch.setattr(pinecone, "vector_store", vector_store)
+    lookups = {True: 0, False: 0}
+
+    def record_cache(name, hit, count=1):
+        lookups[hit] += count
+
+    monkeypatch.setattr(cache, "record_cache", record_cache)
+
+    licence = {"page_content": "Licensed under CC BY 4.0", "metadata": {"main_title": "Trial A", "table": False}}
+    pinecone.process_embeddings("a", [licence, {"page_content": "Trial of drug A", "metadata": {}}], "p1")
+    pinecone.process_embeddings("b", [licence, {"page_content": "Cohort study B", "metadata": {}}], "p2")
+    pinecone.process_embeddings("b", [licence, {"page_content": "Cohort study B", "metadata": {}}], "p2")
+
+    assert sorted(inner.embedded) == ["Cohort study B", "Licensed under CC BY 4.0", "Trial of drug A"]
+    assert len(vector_store.entries) == 3
+    # The vectors computed for the cache are the ones upserted, without another lookup
+    assert lookups == {True: 3, False: 3}
+    assert vector_store.vectors[cache.content_hash("Trial of drug A")] == [15.0, 1.0]
+    text, metadata = vector_store.entries[cache.content_hash(licence["page_content"])]
+    assert metadata == {"table": False, "pdf_id": ["a", "b"], "project_id": ["p1", "p2"]}
+
+
+def test_removing_a_pdf_keeps_chunks_other_pdfs_share(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25, "CHUNK_FOLDER", str(tmp_path / "chunks"))
+    store = cache.EmbeddingCache(str(tmp_path / "embeddings.db"))
+    vector_store = RecordingStore()
+    monkeypatch.setattr(pinecone, "embedding_cache", store)
+    monkeypatch.setattr(pinecone, "embeddings", cache.CachedEmbeddings(CountingEmbeddings(), store))
+    monkeypatch.setattr(pinecone, "vector_store", types.SimpleNamespace(get=lambda: vector_store, **{
+        name: getattr(vector_store, name) for name in ("update_metadata", "delete")
+    }))
+
+    licence = {"page_content": "Licensed under CC BY 4.0", "metadata": {}}
+    pinecone.process_embeddings("a", [licence, {"page_content": "Trial of drug A", "metadata": {}}], "p1")
+    pinecone.process_embeddings("b", [licence], "p2")
+
+    pinecone.remove_embeddings("a")
+
+    assert [text for text, _ in vector_store.entries.values()] == ["Licensed under CC BY 4.0"]
+    _, metadata = vector_store.entries[cache.content_hash(licence["page_content"])]
+    assert metadata["pdf_id"] == ["b"] and metadata["project_id"] == ["p2"]
+    assert store.member_pdf_ids() == {"b"}
+    assert store.prune_vectors() == 1
+
+
+def test_chunks_in_many_pdfs_are_spread_over_capped_vectors(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25, "CHUNK_FOLDER", str(tmp_path / "chunks"))
+    monkeypatch.setattr(pinecone, "MEMBERS_PER_VECTOR", 2)
+    inner = CountingEmbeddings()
+    store = cache.EmbeddingCache(str(tmp_path / "embeddings.db"))
+    vector_store = RecordingStore()
+    monkeypatch.setattr(pinecone, "embedding_cache", store)
+    monkeypatch.setattr(pinecone, "embeddings", cache.CachedEmbeddings(inner, store))
+    monkeypatch.setattr(pinecone, "vector_store", types.SimpleNamespace(get=lambda: vector_store, **{
+        name: getattr(vector_store, name) for name in ("update_metadata", "delete")
+    }))
+
+    licence = {"page_content": "Licensed under CC BY 4.0", "metadata": {}}
+    for pdf_id in ["a", "b", "c", "d", "e"]:
+        pinecone.process_embeddings(pdf_id, [licence], "p1")
+
+    h = cache.content_hash(licence["page_content"])
+    assert inner.embedded == ["Licensed under CC BY 4.0"]
+    assert {id_: metadata["pdf_id"] for id_, (_, metadata) in vector_store.entries.items()} == {
+        h: ["a", "b"], f"{h}-1": ["c", "d"], f"{h}-2": ["e"],
+    }
+
+    pinecone.remove_embeddings("c")
+    pinecone.remove_embeddings("e")
+    pinecone.process_embeddings("f", [licence], "p1")
+
+    assert {id_: metadata["pdf_id"] for id_, (_, metadata) in vector_store.entries.items()} == {
+        h: ["a", "b"], f"{h}-1": ["d", "f"],
+    }
@@ -1,10 +1,9 @@
 import sys
 import types
 from dataclasses import dataclass
-import json
 import pytest
 import asyncio
-from unittest.mock import patch
+from unittest.mock import ANY, AsyncMock, patch
 import app.systematic_review as sr
 
 # Basic stubs for modules required by app.title_extraction
@@ -108,7 +107,7 @@ class DummySplitter:
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
     @classmethod
-    def from_tiktoken_encoder(cls, model_name="gpt-4", chunk_size=0, chunk_overlap=0):
+    def from_tiktoken_encoder(cls, encoding_name="cl100k_base", chunk_size=0, chunk_overlap=0):
         return cls(chunk_size, chunk_overlap)
     def split_text(self, text):
         return [text]
@@ -131,9 +130,9 @@ tiktoken_mod = types.ModuleType('tiktoken')
 class DummyEncoding:
     def encode(self, text):
         return text.split()
-def encoding_for_model(model_name):
+def get_encoding(encoding_name):
     return DummyEncoding()
-tiktoken_mod.encoding_for_model = encoding_for_model
+tiktoken_mod.get_encoding = get_encoding
 sys.modules.setdefault('tiktoken', tiktoken_mod)
 
 # app.vector_stores.pinecone placeholder
@@ -158,14 +157,12 @@ sys.modules.setdefault('app.stard_summary', stard_mod)
 def test_get_screening_result(tmp_path):
     async def run_test():
         summary_folder = tmp_path / "summ"
-        review_folder = tmp_path / "rev"
         summary_folder.mkdir()
-        review_folder.mkdir()
 
         docs = [sr.Document(page_content="dummy", metadata={"section_title": "Sec", "main_title": "Main"})]
         criteria = ["Population"]
 
-        async def fake_summary(d):
+        async def fake_summary(d, partial_path=None):
             assert d == docs
             return "summary text"
 
@@ -173,23 +170,21 @@ def test_get_screening_result(tmp_path):
             assert q == "question"
             assert s == "summary text"
             assert c == criteria
-            return "Decision: Include\nConfidence: 5\nRationale: Good"
+            return parsed
 
         parsed = {"decision": "Include"}
 
+        on_result = AsyncMock()
         with patch.object(sr, "llm_summary", side_effect=fake_summary) as psum, \
-             patch.object(sr, "llm_screening", side_effect=fake_screening) as pscr, \
-             patch.object(sr, "parse_llm_screening_output", return_value=parsed) as pparse:
+             patch.object(sr, "llm_screening", side_effect=fake_screening) as pscr:
             result_path = await sr.get_screening_result(
-                "id1", "question", str(summary_folder), str(review_folder), docs, criteria
+                "id1", "proj1", "question", str(summary_folder), docs, criteria, on_result=on_result
             )
 
         assert result_path == str(summary_folder / "id1.txt")
         assert (summary_folder / "id1.txt").read_text() == "summary text"
-        written = json.loads((review_folder / "id1_screening_result.json").read_text())
-        assert written == parsed
+        on_result.assert_awaited_once_with(parsed, ANY)
         assert psum.called
         assert pscr.called
-        assert pparse.called
 
     asyncio.run(run_test())
\ No newline at end of file
@@ -0,0 +1,90 @@
+import sys
+import types
+import importlib
+from dataclasses import dataclass, field
+
+# Provide dummy modules required for import
+@dataclass
+class Document:
+    page_content: str
+    metadata: dict = field(default_factory=dict)
+
+doc_mod = types.ModuleType("langchain_core.documents")
+doc_mod.Document = Document
+sys.modules.setdefault("langchain_core.documents", doc_mod)
+core_mod = sys.modules.setdefault("langchain_core", types.ModuleType("langchain_core"))
+core_mod.documents = doc_mod
+
+embeddings_mod = types.ModuleType("langchain_core.embeddings")
+embeddings_mod.Embeddings = object
+sys.modules.setdefault("langchain_core.embeddings", embeddings_mod)
+
+class BaseRetriever:
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+retrievers_mod = types.ModuleType("langchain_core.retrievers")
+retrievers_mod.BaseRetriever = BaseRetriever
+sys.modules.setdefault("langchain_core.retrievers", retrievers_mod)
+callbacks_mod = types.ModuleType("langchain_core.callbacks")
+callbacks_mod.CallbackManagerForRetrieverRun = object
+sys.modules.setdefault("langchain_core.callbacks", callbacks_mod)
+
+bm25 = importlib.import_module("app.vector_stores.bm25")
+hybrid = importlib.import_module("app.vector_stores.hybrid")
+
+chunks = [
+    {"page_content": "Patients received 2.5 mg of risperidone daily.", "metadata": {"pdf_id": "p1"}},
+    {"page_content": "The PHQ-9 scale measured depression severity at baseline.", "metadata": {"pdf_id": "p1"}},
+    {"page_content": "Sensitivity of the index test was 0.91 against the reference standard.", "metadata": {"pdf_id": "p1"}},
+    {"page_content": "Participants were recruited from outpatient clinics.", "metadata": {"pdf_id": "p1"}},
+]
+
+
+def test_bm25_ranks_exact_terms_first():
+    index = bm25.BM25Index([Document(**c) for c in chunks])
+
+    results = index.search("Which scale, PHQ-9?", k=2)
+
+    assert results[0][0].page_content.startswith("The PHQ-9 scale")
+    assert len(results) == 1
+
+
+def test_tokenize_keeps_hyphenated_and_decimal_terms():
+    assert bm25.tokenize("The PHQ-9 dose was 2.5 mg") == ["phq-9", "dose", "2.5", "mg"]
+
+
+def test_index_is_rebuilt_from_persisted_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25, "CHUNK_FOLDER", str(tmp_path))
+    bm25.add_pdf_chunks("p1", chunks)
+    bm25._indexes.clear()
+
+    index = bm25.get_index("p1")
+
+    assert index is not None
+    assert len(index.docs) == 4
+    assert bm25.get_index("missing") is None
+
+
+def test_reciprocal_rank_fusion_combines_rankings():
+    a, b, c = Document("a"), Document("b"), Document("c")
+
+    fused = hybrid.reciprocal_rank_fusion([[a, b], [b, c]], [0.5, 0.5])
+
+    assert [d.page_content for d in fused] == ["b", "a", "c"]
+
+
+def test_hybrid_retriever_falls_back_to_lexical_when_vector_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25, "CHUNK_FOLDER", str(tmp_path))
+    bm25.add_pdf_chunks("p1", chunks)
+
+    class FailingVectorStore:
+        def similarity_search(self, query, k=4, filter=None):
+            raise RuntimeError("backend down")
+
+    retriever = hybrid.HybridRetriever(vector_store=FailingVectorStore(), pdf_id="p1", k=2, lexical_weight=0.5, vector_timeout=1)
+
+    docs = retriever._get_relevant_documents("risperidone dose", run_manager=None)
+
+    assert docs[0].page_content.startswith("Patients received")
@@ -63,7 +63,7 @@ class DummySplitter:
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
     @classmethod
-    def from_tiktoken_encoder(cls, model_name="gpt-4", chunk_size=0, chunk_overlap=0):
+    def from_tiktoken_encoder(cls, encoding_name="cl100k_base", chunk_size=0, chunk_overlap=0):
         return cls(chunk_size, chunk_overlap)
     def split_text(self, text):
         return [text]
@@ -89,10 +89,10 @@ class DummyEncoding:
     def encode(self, text):
         return text.split()
 
-def encoding_for_model(model_name):
+def get_encoding(encoding_name):
     return DummyEncoding()
 
-tiktoken_mod.encoding_for_model = encoding_for_model
+tiktoken_mod.get_encoding = get_encoding
 sys.modules.setdefault("tiktoken", tiktoken_mod)
 
 # Fixture to set asyncio backend for anyio
@@ -171,21 +171,26 @@ async def test_llm_screening_requires_question(anyio_backend):
         await sr.llm_screening(None, "summary", ["crit"])
 
 @pytest.mark.anyio
-async def test_llm_screening_returns_llm_output(anyio_backend):
-    expected = "ok"
-
+async def test_llm_screening_returns_structured_result(anyio_backend):
     class DummyPrompt:
         def __init__(self):
             self.template = "dummy"
+            self.input_variables = ["review_question", "summary"]
         def __or__(self, other):
             return other
 
-    class DummyOutputLLM:
+    class DummyStructuredLLM:
+        def with_structured_output(self, schema):
+            return self
         async def ainvoke(self, inputs):
-            return types.SimpleNamespace(content=expected)
+            return {"decision": "Include", "confidence": 4, "crit": "Matched", "rationale": "ok"}
 
-    dummy_llm = DummyOutputLLM()
     with patch.object(sr, "generate_review_prompt", return_value=DummyPrompt()), \
-         patch.object(sr, "light_llm", dummy_llm):
+         patch.object(sr, "light_llm", DummyStructuredLLM()):
         result = await sr.llm_screening("question", "summary", ["crit"])
-    assert result == expected
\ No newline at end of file
+    assert result == {
+        "decision": "Include",
+        "confidence": 4,
+        "rationale": "ok",
+        "criteria_matches": {"crit": "Matched"},
+    }
@@ -102,10 +102,13 @@ class DummyEncoding:
     def encode(self, text):
         return text.split()
 
-def encoding_for_model(model_name):
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+def get_encoding(encoding_name):
     return DummyEncoding()
 
-tiktoken_mod.encoding_for_model = encoding_for_model
+tiktoken_mod.get_encoding = get_encoding
 sys.modules.setdefault("tiktoken", tiktoken_mod)
 
 # Stub for langchain.prompts
@@ -174,9 +177,86 @@ def test_llm_summary_basic(monkeypatch):
     monkeypatch.setattr(stard_summary, "chunk_summary_chain", pytypes.SimpleNamespace(ainvoke=AsyncMock(side_effect=fake_chunk)))
     monkeypatch.setattr(stard_summary, "section_summary_chain", pytypes.SimpleNamespace(ainvoke=AsyncMock(side_effect=fake_section)))
     monkeypatch.setattr(stard_summary, "document_reduce_chain", pytypes.SimpleNamespace(ainvoke=AsyncMock(side_effect=fake_doc)))
-    monkeypatch.setattr(stard_summary, "stard_checklist", "check")
+    monkeypatch.setattr(stard_summary, "load_checklist", lambda path: "check")
 
     result = asyncio.run(stard_summary.llm_summary(docs))
 
     expected = "doc:Doc:sec:Intro:chunk:a\nchunk:b\n\nsec:Methods:chunk:c"
-    assert result == expected
\ No newline at end of file
+    assert result == expected
+
+def test_llm_summary_streams_partial_html(monkeypatch, tmp_path):
+    docs = [
+        stard_summary.Document(page_content="a", metadata={"section_title": "Intro", "main_title": "Doc"}),
+    ]
+    partial_path = tmp_path / "id1.partial"
+    snapshots = []
+
+    async def fake_chunk(args):
+        return pytypes.SimpleNamespace(content="chunk")
+
+    async def fake_section(args):
+        return pytypes.SimpleNamespace(content="sec")
+
+    async def fake_astream(args):
+        for token in ["<h1>Doc</h1>", "<p>one</p>", "<p>two</p>"]:
+            yield pytypes.SimpleNamespace(content=token)
+
+    async def fake_write(path, html):
+        snapshots.append(html)
+
+    monkeypatch.setattr(stard_summary, "chunk_summary_chain", pytypes.SimpleNamespace(ainvoke=AsyncMock(side_effect=fake_chunk)))
+    monkeypatch.setattr(stard_summary, "section_summary_chain", pytypes.SimpleNamespace(ainvoke=AsyncMock(side_effect=fake_section)))
+    monkeypatch.setattr(stard_summary, "document_reduce_chain", pytypes.SimpleNamespace(astream=fake_astream))
+    monkeypatch.setattr(stard_summary, "write_partial_summary", fake_write)
+    monkeypatch.setattr(stard_summary, "PARTIAL_FLUSH_CHARS", 1)
+
+    result = asyncio.run(stard_summary.llm_summary(docs, partial_path=str(partial_path)))
+
+    assert result == "<h1>Doc</h1><p>one</p><p>two</p>"
+    assert snapshots[0] == ""
+    assert snapshots[1] == "<h1>Doc</h1>"
+    assert snapshots[-1] == result
+
+
+def test_tree_reduce_summaries_merges_groups_until_within_budget(monkeypatch):
+    merged_inputs = []
+
+    async def fake_merge(args):
+        merged_inputs.append(args["summaries"])
+        return pytypes.SimpleNamespace(content="merged")
+
+    monkeypatch.setattr(stard_summary, "section_merge_chain", pytypes.SimpleNamespace(ainvoke=AsyncMock(side_effect=fake_merge)))
+
+    summaries = ["one two", "three four", "five six", "seven eight", "nine ten"]
+    result = asyncio.run(stard_summary.tree_reduce_summaries(summaries, group_tokens=4, final_tokens=3))
+
+    assert merged_inputs == ["one two\n\nthree four", "five six\n\nseven eight", "merged\n\nmerged\n\nnine ten"]
+    assert result == ["merged"]
+
+
+def test_tree_reduce_summaries_skips_short_documents(monkeypatch):
+    monkeypatch.setattr(stard_summary, "section_merge_chain", pytypes.SimpleNamespace(ainvoke=AsyncMock()))
+
+    result = asyncio.run(stard_summary.tree_reduce_summaries(["a", "b"], group_tokens=4, final_tokens=10))
+
+    assert result == ["a", "b"]
+    assert not stard_summary.section_merge_chain.ainvoke.called
+
+
+def test_tree_reduce_summaries_condenses_and_truncates_oversized_summaries(monkeypatch):
+    merged_inputs = []
+
+    async def fake_merge(args):
+        merged_inputs.append(args["summaries"])
+        return pytypes.SimpleNamespace(content="still far too many words here")
+
+    monkeypatch.setattr(stard_summary, "section_merge_chain", pytypes.SimpleNamespace(ainvoke=AsyncMock(side_effect=fake_merge)))
+
+    long_summary = " ".join(f"w{i}" for i in range(12))
+    summaries = [long_summary, "a b c", "d e f"]
+    result = asyncio.run(stard_summary.tree_reduce_summaries(summaries, group_tokens=4, final_tokens=6, max_levels=1))
+
+    # The summary over the group budget is condensed alone; ones that can't be paired are left as they are
+    assert merged_inputs == [long_summary]
+    assert result == ["still", "a", "d"]
+    assert stard_summary.count_tokens("\n\n".join(result)) <= 6
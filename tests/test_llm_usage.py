@@ -0,0 +1,151 @@
+import sys
+import types
+import importlib
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+# Provide dummy modules required for import
+dotenv_mod = types.ModuleType("dotenv")
+dotenv_mod.load_dotenv = lambda *args, **kwargs: None
+sys.modules.setdefault("dotenv", dotenv_mod)
+
+messages_mod = types.ModuleType("langchain.schema.messages")
+messages_mod.AIMessage = messages_mod.HumanMessage = messages_mod.SystemMessage = object
+sys.modules.setdefault("langchain.schema.messages", messages_mod)
+
+db = importlib.import_module("web.db")
+Project = importlib.import_module("web.db.models.project").Project
+api = importlib.import_module("web.api")
+usage = importlib.import_module("app.usage")
+metrics = importlib.import_module("app.metrics")
+
+
+def usage_row(stage, model="gpt-4o-mini", pdf_id="a", calls=1, prompt_tokens=100, completion_tokens=10, cost_usd=0.5):
+    return {
+        "project_id": "p1", "pdf_id": pdf_id, "stage": stage, "model": model, "calls": calls,
+        "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost_usd": cost_usd,
+    }
+
+
+def test_prices_match_dated_model_snapshots():
+    assert usage.price_for("gpt-4o-mini-2024-07-18") == usage.MODEL_PRICES["gpt-4o-mini"]
+    assert usage.price_for("gpt-4-turbo-2024-04-09") == usage.MODEL_PRICES["gpt-4-turbo"]
+    assert usage.price_for("unknown-model") == (0.0, 0.0)
+    assert usage.estimate_cost("gpt-4-turbo", 1_000_000, 1_000_000) == pytest.approx(40.0)
+
+
+def test_structured_chain_usage_is_attributed_to_project_pdf_and_stage():
+    usage.ledger.drain()
+    raw = types.SimpleNamespace(
+        usage_metadata={"input_tokens": 1000, "output_tokens": 100},
+        response_metadata={"model_name": "gpt-3.5-turbo-0125"},
+    )
+
+    async def ainvoke(inputs):
+        return {"raw": raw, "parsed": {"decision": "Include"}, "parsing_error": None}
+
+    chain = metrics.instrument_chain(types.SimpleNamespace(ainvoke=ainvoke), "screening", structured=True)
+
+    async def run():
+        with metrics.attributed_to("p1", "a"), metrics.span("screen"):
+            return await chain.ainvoke({})
+
+    assert asyncio.run(run()) == {"decision": "Include"}
+    [row] = usage.ledger.drain()
+    assert row["project_id"] == "p1"
+    assert row["pdf_id"] == "a"
+    assert row["stage"] == "screen"
+    assert row["model"] == "gpt-3.5-turbo-0125"
+    assert (row["calls"], row["prompt_tokens"], row["completion_tokens"]) == (1, 1000, 100)
+    assert row["cost_usd"] == pytest.approx(0.00065)
+
+
+def test_streamed_usage_on_the_final_chunk_is_recorded():
+    usage.ledger.drain()
+    chunks = [
+        types.SimpleNamespace(content="Sum", usage_metadata=None, response_metadata={}),
+        types.SimpleNamespace(content="mary", usage_metadata=None, response_metadata={}),
+        types.SimpleNamespace(
+            content="",
+            usage_metadata={"input_tokens": 2000, "output_tokens": 300},
+            response_metadata={"model_name": "gpt-4-turbo-2024-04-09"},
+        ),
+    ]
+
+    async def astream(inputs):
+        for chunk in chunks:
+            yield chunk
+
+    chain = metrics.instrument_chain(types.SimpleNamespace(astream=astream), "document_reduce")
+
+    async def run():
+        with metrics.attributed_to("p1", "a"), metrics.span("summarise"):
+            return [chunk.content async for chunk in chain.astream({})]
+
+    assert "".join(asyncio.run(run())) == "Summary"
+    [row] = usage.ledger.drain()
+    assert (row["stage"], row["model"]) == ("summarise", "gpt-4-turbo-2024-04-09")
+    assert (row["calls"], row["prompt_tokens"], row["completion_tokens"]) == (1, 2000, 300)
+    assert row["cost_usd"] == pytest.approx(0.029)
+
+
+def test_chat_clients_request_usage_on_streams(monkeypatch):
+    openai_mod = types.ModuleType("langchain_openai")
+    openai_mod.ChatOpenAI = lambda **kwargs: kwargs
+    monkeypatch.setitem(sys.modules, "langchain_openai", openai_mod)
+    chatopenai = importlib.import_module("app.llms.chatopenai")
+
+    assert chatopenai.chat_openai(model="gpt-4-turbo")()["stream_usage"] is True
+    assert chatopenai.build_llm(types.SimpleNamespace(streaming=True))["stream_usage"] is True
+
+
+def test_add_llm_usage_accumulates_totals(tmp_path):
+    async def run_test():
+        engine = db.create_async_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(db.Base.metadata.create_all)
+        session = async_sessionmaker(bind=engine, expire_on_commit=False)()
+        session.add(Project(id="p1", name="Review", review_type="diagnostic"))
+        await session.commit()
+
+        await api.add_llm_usage(session, [usage_row("summarise"), usage_row("screen", cost_usd=0.1)])
+        await api.add_llm_usage(session, [usage_row("summarise", pdf_id="b", model="gpt-4-turbo", cost_usd=2.0)])
+        await api.add_llm_usage(session, [usage_row("summarise")])
+
+        by_stage = await api.get_project_usage(session, "p1", group_by="stage")
+        assert [row["stage"] for row in by_stage] == ["summarise", "screen"]
+        assert by_stage[0]["calls"] == 3
+        assert by_stage[0]["prompt_tokens"] == 300
+        assert by_stage[0]["cost_usd"] == pytest.approx(3.0)
+
+        by_pdf = await api.get_project_usage(session, "p1", group_by="pdf")
+        assert {row["pdf_id"]: row["calls"] for row in by_pdf} == {"a": 3, "b": 1}
+        await session.close()
+        await engine.dispose()
+
+    asyncio.run(run_test())
+
+
+def test_flush_hands_usage_to_the_sink_and_keeps_it_if_storing_fails(monkeypatch):
+    usage.ledger.drain()
+    usage.ledger.record("p1", "a", "embed", "text-embedding-3-small", 100, 0)
+    stored = []
+
+    async def failing_sink(rows):
+        raise RuntimeError("database is locked")
+
+    async def sink(rows):
+        stored.extend(rows)
+
+    monkeypatch.setattr(usage, "_usage_sink", None)
+    asyncio.run(usage.flush_usage())
+    usage.set_usage_sink(failing_sink)
+    asyncio.run(usage.flush_usage())
+    usage.ledger.record("p1", "a", "embed", "text-embedding-3-small", 50, 0)
+    usage.set_usage_sink(sink)
+    asyncio.run(usage.flush_usage())
+
+    [row] = stored
+    assert (row["calls"], row["prompt_tokens"]) == (2, 150)
+    assert usage.ledger.drain() == []
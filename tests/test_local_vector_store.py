@@ -0,0 +1,77 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from app.vector_stores.local import LocalVectorStore, normalise
+
+
+def clustered_vectors(n, dim=64, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(20, dim))
+    return (centres[rng.integers(0, 20, n)] + rng.normal(size=(n, dim)) * 0.5).astype(np.float32)
+
+
+def build_store(path, vectors, **kwargs):
+    store = LocalVectorStore(str(path), embedding=None, **kwargs)
+    store.add_vectors(
+        vectors,
+        [f"chunk {i}" for i in range(len(vectors))],
+        [{"pdf_id": [f"pdf{i % 3}"], "page": i % 5} for i in range(len(vectors))],
+        [f"id{i}" for i in range(len(vectors))],
+    )
+    return store
+
+
+@pytest.mark.parametrize("quantization, compression", [("int8", 3.5), ("pq", 16)])
+def test_quantised_search_matches_exact_top_k(tmp_path, quantization, compression):
+    vectors = clustered_vectors(2000)
+    queries = clustered_vectors(20, seed=1)
+    store = build_store(tmp_path, vectors, quantization=quantization, pq_train_size=1000)
+
+    exact = normalise(vectors) @ normalise(queries).T
+    recall = np.mean([
+        len({row for row, _ in store.search_rows(query, 10)} & set(np.argsort(-exact[:, i])[:10])) / 10
+        for i, query in enumerate(queries)
+    ])
+
+    assert recall >= 0.95
+    assert vectors.shape[1] * 4 / store.bytes_per_vector >= compression
+
+
+def test_filters_upserts_and_reload(tmp_path):
+    vectors = clustered_vectors(300)
+    store = build_store(tmp_path, vectors, quantization="int8")
+
+    results = store.similarity_search_by_vector_with_score(vectors[4], k=3, filter={"pdf_id": "pdf1", "page": 4})
+    assert results[0][0].page_content == "chunk 4"
+    assert all(doc.metadata["page"] == 4 and doc.metadata["pdf_id"] == ["pdf1"] for doc, _ in results)
+
+    store.add_vectors(vectors[4:5], ["chunk 4"], [{"pdf_id": ["pdf1", "pdf9"], "page": 4}], ["id4"])
+    assert len(store) == 300
+    assert [doc.page_content for doc in store.similarity_search_by_vector(vectors[4], k=5, filter={"pdf_id": "pdf9"})] == ["chunk 4"]
+
+    reloaded = LocalVectorStore(str(tmp_path), embedding=None, quantization="int8")
+    assert len(reloaded) == 300
+    top, score = reloaded.similarity_search_by_vector_with_score(vectors[4], k=1, filter={"pdf_id": {"$in": ["pdf9"]}})[0]
+    assert top.page_content == "chunk 4"
+    assert score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_deleted_rows_are_excluded_and_reclaimed_by_compaction(tmp_path):
+    vectors = clustered_vectors(300)
+    store = build_store(tmp_path, vectors, quantization="int8")
+
+    store.delete(filter={"pdf_id": "pdf0"})
+    store.delete(ids=["id1"])
+    store.update_metadata({"id2": {"pdf_id": ["pdf7"]}})
+
+    assert len(store) == 199
+    assert store.similarity_search_by_vector(vectors[0], k=1)[0].page_content != "chunk 0"
+    assert [d.page_content for d in store.similarity_search_by_vector(vectors[2], k=3, filter={"pdf_id": "pdf7"})] == ["chunk 2"]
+
+    assert store.compact() == 101
+    assert store.deleted_count == 0
+    reloaded = LocalVectorStore(str(tmp_path), embedding=None, quantization="int8")
+    assert len(reloaded) == 199
+    assert reloaded.similarity_search_by_vector(vectors[5], k=1)[0].page_content == "chunk 5"
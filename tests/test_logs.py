@@ -0,0 +1,48 @@
+import io
+import json
+import logging
+import pytest
+
+from app.logs import current_job, sampled, setup_logging, stop_logging
+from app.metrics import current_project
+
+
+@pytest.fixture
+def log_stream():
+    stream = io.StringIO()
+    setup_logging(level="INFO", levels="test.quiet=WARNING", fmt="json", stream=stream)
+    yield stream
+    stop_logging()
+    logging.getLogger().handlers.clear()
+
+
+def read_lines(stream):
+    stop_logging()
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_records_carry_correlation_ids_and_extra_fields(log_stream):
+    project_token = current_project.set("proj-1")
+    job_token = current_job.set("job-1")
+    try:
+        logging.getLogger("test.app").info("Screened %s", "doc", extra={"pdf_id": "pdf-1"})
+    finally:
+        current_project.reset(project_token)
+        current_job.reset(job_token)
+
+    [entry] = read_lines(log_stream)
+    assert entry["message"] == "Screened doc"
+    assert entry["level"] == "INFO"
+    assert entry["pdf_id"] == "pdf-1"
+    assert entry["project_id"] == "proj-1"
+    assert entry["job_id"] == "job-1"
+
+
+def test_per_module_levels_and_sampling(log_stream):
+    logging.getLogger("test.quiet").info("below the module level")
+    logging.getLogger("test.quiet").warning("kept")
+    for _ in range(100):
+        logging.getLogger("test.app").info("dropped", extra=sampled(0.0))
+    logging.getLogger("test.app").info("always", extra=sampled(1.0))
+
+    assert [entry["message"] for entry in read_lines(log_stream)] == ["kept", "always"]
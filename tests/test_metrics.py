@@ -0,0 +1,103 @@
+import types
+import asyncio
+import pytest
+
+from app import metrics
+from app.metrics import (
+    Counter, Histogram, current_project, instrument_chain, render_metrics,
+    span, stage_errors, stage_latency, timed, llm_tokens, queue_depth,
+)
+
+
+def test_span_records_latency_and_errors_per_project():
+    token = current_project.set("proj-metrics")
+    try:
+        with span("test_stage"):
+            pass
+        with pytest.raises(ValueError):
+            with span("test_stage"):
+                raise ValueError("boom")
+    finally:
+        current_project.reset(token)
+
+    output = render_metrics()
+    assert 'pipeline_stage_seconds_count{stage="test_stage",project="proj-metrics"} 2' in output
+    assert 'pipeline_stage_seconds_bucket{stage="test_stage",project="proj-metrics",le="+Inf"} 2' in output
+    assert 'pipeline_stage_errors_total{stage="test_stage",project="proj-metrics"} 1' in output
+
+
+def test_timed_wraps_async_functions():
+    @timed("test_async_stage")
+    async def work(x):
+        await asyncio.sleep(0)
+        return x * 2
+
+    assert asyncio.run(work(3)) == 6
+    assert 'pipeline_stage_seconds_count{stage="test_async_stage",project=""} 1' in render_metrics()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_histogram_seconds", "test", ("stage",), buckets=(1, 5))
+    for value in (0.5, 2, 10):
+        histogram.observe(value, stage="s")
+
+    output = histogram.render()
+    assert 'test_histogram_seconds_bucket{stage="s",le="1"} 1' in output
+    assert 'test_histogram_seconds_bucket{stage="s",le="5"} 2' in output
+    assert 'test_histogram_seconds_bucket{stage="s",le="+Inf"} 3' in output
+    assert 'test_histogram_seconds_sum{stage="s"} 12.5' in output
+
+
+def test_label_values_are_escaped():
+    counter = Counter("test_escape_total", "test", ("name",))
+    counter.inc(name='a "quoted"\nvalue')
+    assert 'test_escape_total{name="a \\"quoted\\"\\nvalue"} 1' in counter.render()
+
+
+def test_instrumented_chain_counts_tokens_per_model():
+    message = types.SimpleNamespace(
+        content="ok",
+        usage_metadata={"input_tokens": 11, "output_tokens": 4},
+        response_metadata={"model_name": "test-model"},
+    )
+
+    async def ainvoke(inputs):
+        return message
+
+    chain = instrument_chain(types.SimpleNamespace(ainvoke=ainvoke, name="inner"), "test_chain")
+
+    assert asyncio.run(chain.ainvoke({})) is message
+    assert chain.name == "test_chain"
+    key = ("test_chain", "test-model", "prompt")
+    assert llm_tokens._values[key] == 11
+    assert llm_tokens._values[("test_chain", "test-model", "completion")] == 4
+    assert 'llm_calls_total{chain="test_chain",model="test-model"} 1' in render_metrics()
+
+
+def test_gauge_functions_are_read_at_scrape_time():
+    depth = [2]
+    queue_depth.set_function(lambda: depth[0], queue="test_queue")
+    assert 'queue_depth{queue="test_queue"} 2' in render_metrics()
+    depth[0] = 5
+    assert 'queue_depth{queue="test_queue"} 5' in render_metrics()
+
+
+def test_span_passes_exceptions_to_the_trace_span(monkeypatch):
+    exits = []
+
+    class FakeSpan:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            exits.append(exc_info)
+
+    monkeypatch.setattr(metrics, "_tracer", types.SimpleNamespace(start_as_current_span=lambda *a, **k: FakeSpan()))
+    with span("test_traced_stage"):
+        pass
+    with pytest.raises(ValueError):
+        with span("test_traced_stage"):
+            raise ValueError("boom")
+
+    assert exits[0] == (None, None, None)
+    assert exits[1][0] is ValueError and str(exits[1][1]) == "boom" and exits[1][2] is not None
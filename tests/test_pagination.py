@@ -0,0 +1,102 @@
+import sys
+import types
+import importlib
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+# Provide dummy modules required for import
+dotenv_mod = types.ModuleType("dotenv")
+dotenv_mod.load_dotenv = lambda *args, **kwargs: None
+sys.modules.setdefault("dotenv", dotenv_mod)
+
+messages_mod = types.ModuleType("langchain.schema.messages")
+messages_mod.AIMessage = messages_mod.HumanMessage = messages_mod.SystemMessage = object
+sys.modules.setdefault("langchain.schema.messages", messages_mod)
+
+db = importlib.import_module("web.db")
+Project = importlib.import_module("web.db.models.project").Project
+Pdf = importlib.import_module("web.db.models.pdf").Pdf
+ScreeningResult = importlib.import_module("web.db.models.screening_result").ScreeningResult
+api = importlib.import_module("web.api")
+pagination = importlib.import_module("web.pagination")
+
+
+async def make_session(tmp_path):
+    engine = db.create_async_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(db.Base.metadata.create_all)
+    session = async_sessionmaker(bind=engine, expire_on_commit=False)()
+    session.add_all([
+        Project(id="p1", name="Beta", review_type="diagnostic"),
+        Project(id="p2", name="Alpha", review_type="diagnostic"),
+    ])
+    for i in range(7):
+        session.add(Pdf(id=f"pdf{i}", name=f"doc{i % 3}.pdf", project_id="p1"))
+        if i % 2 == 0:
+            session.add(ScreeningResult(pdf_id=f"pdf{i}", project_id="p1", decision="Include", confidence=i % 4))
+    await session.commit()
+    return session
+
+
+async def collect_pages(session, **kwargs):
+    ids, cursor, pages = [], None, 0
+    while True:
+        rows, cursor = await api.list_project_pdfs(session, "p1", cursor=cursor, limit=3, **kwargs)
+        ids.extend(row.id for row in rows)
+        pages += 1
+        if not cursor:
+            return ids, pages
+
+
+def test_cursor_round_trip():
+    cursor = pagination.encode_cursor(["doc1.pdf", "pdf4"])
+
+    assert pagination.decode_cursor(cursor) == ["doc1.pdf", "pdf4"]
+    assert pagination.decode_cursor(None) is None
+
+
+def test_malformed_cursors_are_rejected():
+    for cursor in [
+        "not a cursor",
+        pagination.encode_cursor({"a": 1}),
+        pagination.encode_cursor(["only one"]),
+        pagination.encode_cursor(["a", "b", "c"]),
+        pagination.encode_cursor([["nested"], "pdf4"]),
+    ]:
+        with pytest.raises(pagination.InvalidCursor):
+            pagination.decode_cursor(cursor)
+
+
+def test_list_project_pdfs_pages_through_every_sort(tmp_path):
+    async def run_test():
+        session = await make_session(tmp_path)
+        for sort in ["name", "decision", "confidence"]:
+            ids, pages = await collect_pages(session, sort=sort)
+            assert sorted(ids) == [f"pdf{i}" for i in range(7)]
+            assert pages == 3
+
+        ids, _ = await collect_pages(session, sort="confidence")
+        assert ids[:2] == ["pdf2", "pdf6"]
+
+        included, _ = await collect_pages(session, decision="Include")
+        assert sorted(included) == ["pdf0", "pdf2", "pdf4", "pdf6"]
+        await session.close()
+
+    asyncio.run(run_test())
+
+
+def test_list_projects_counts_pdfs_in_sql(tmp_path):
+    async def run_test():
+        session = await make_session(tmp_path)
+        projects, cursor = await api.list_projects(session, limit=1)
+        assert [(p.name, p.pdf_count) for p in projects] == [("Alpha", 0)]
+
+        projects, cursor = await api.list_projects(session, cursor=cursor, limit=1)
+        assert [(p.name, p.pdf_count) for p in projects] == [("Beta", 7)]
+        assert cursor is None
+
+        assert await api.count_project_decisions(session, "p1") == {"Include": 4, "Not screened": 3}
+        await session.close()
+
+    asyncio.run(run_test())
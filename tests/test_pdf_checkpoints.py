@@ -0,0 +1,117 @@
+import sys
+import types
+import importlib
+import json
+import asyncio
+from sqlalchemy import select, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+# Provide dummy modules required for import
+dotenv_mod = types.ModuleType("dotenv")
+dotenv_mod.load_dotenv = lambda *args, **kwargs: None
+sys.modules.setdefault("dotenv", dotenv_mod)
+
+messages_mod = types.ModuleType("langchain.schema.messages")
+messages_mod.AIMessage = messages_mod.HumanMessage = messages_mod.SystemMessage = object
+sys.modules.setdefault("langchain.schema.messages", messages_mod)
+
+db = importlib.import_module("web.db")
+Project = importlib.import_module("web.db.models.project").Project
+Pdf = importlib.import_module("web.db.models.pdf").Pdf
+ScreeningResult = importlib.import_module("web.db.models.screening_result").ScreeningResult
+api = importlib.import_module("web.api")
+
+
+async def make_session(tmp_path):
+    engine = db.create_async_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(db.Base.metadata.create_all)
+    session = async_sessionmaker(bind=engine, expire_on_commit=False)()
+    session.add(Project(id="p1", name="Review", review_type="diagnostic"))
+    session.add_all([Pdf(id=pdf_id, name=f"{pdf_id}.pdf", project_id="p1") for pdf_id in ["a", "b", "c"]])
+    await session.commit()
+    return session
+
+
+def test_mark_pdf_stage_is_idempotent(tmp_path):
+    async def run_test():
+        session = await make_session(tmp_path)
+
+        await api.mark_pdf_stage(session, ["a", "b", "c"], "parsed")
+        await api.mark_pdf_stage(session, ["a", "b"], "embedded")
+        await api.mark_pdf_stage(session, ["a", "b"], "embedded")
+        await api.mark_pdf_stage(session, ["a"], "screened")
+
+        stages = await api.get_pdf_stages(session, ["a", "b", "c"])
+        assert stages == {"a": {"parsed", "embedded", "screened"}, "b": {"parsed", "embedded"}, "c": {"parsed"}}
+
+        counts = await api.count_project_stages(session, "p1")
+        assert counts == {"parsed": 3, "embedded": 2, "filtered": 0, "summarised": 0, "screened": 1}
+        await session.close()
+
+    asyncio.run(run_test())
+
+
+def test_pdf_errors_are_listed_until_cleared(tmp_path):
+    async def run_test():
+        session = await make_session(tmp_path)
+
+        await api.set_pdf_error(session, "b", "Embedding failed: timeout")
+        rows, _ = await api.list_project_pdfs(session, "p1")
+        assert {row.id: row.error for row in rows} == {"a": None, "b": "Embedding failed: timeout", "c": None}
+
+        await api.set_pdf_error(session, "b", None)
+        rows, _ = await api.list_project_pdfs(session, "p1")
+        assert all(row.error is None for row in rows)
+        await session.close()
+
+    asyncio.run(run_test())
+
+
+def test_backfill_marks_previously_processed_pdfs(tmp_path):
+    engine = db.create_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    db.Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        session.add(Project(id="p1", name="Review", review_type="diagnostic"))
+        session.add_all([Pdf(id=pdf_id, name=f"{pdf_id}.pdf", project_id="p1") for pdf_id in ["a", "b"]])
+        session.add(ScreeningResult(pdf_id="a", project_id="p1", decision="Include"))
+        session.commit()
+
+        api.backfill_pdf_stages(session)
+
+        rows = session.execute(db.Base.metadata.tables["pdf_checkpoints"].select()).all()
+        stages = {(row.pdf_id, row.stage) for row in rows}
+    assert stages == {
+        ("a", "parsed"), ("a", "embedded"), ("a", "filtered"), ("a", "summarised"), ("a", "screened"),
+        ("b", "parsed"), ("b", "embedded"), ("b", "filtered"),
+    }
+
+
+def test_upgrade_imports_screening_result_files_of_a_baseline_database(tmp_path):
+    engine = db.create_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE projects (id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, review_question TEXT, "
+            "review_type VARCHAR(14) NOT NULL, search_criteria VARCHAR, filtered_pdf_ids TEXT)"
+        ))
+        conn.execute(text("CREATE TABLE pdfs (id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, project_id VARCHAR, title VARCHAR)"))
+        conn.execute(text("INSERT INTO projects (id, name, review_type) VALUES ('p1', 'Review', 'diagnostic')"))
+        conn.execute(text("INSERT INTO pdfs (id, name, project_id) VALUES ('a', 'a.pdf', 'p1'), ('b', 'b.pdf', 'p1')"))
+    results = tmp_path / "review_results"
+    results.mkdir()
+    (results / "a_screening_result.json").write_text(json.dumps({
+        "decision": "Include", "confidence": 4, "rationale": "Relevant", "criteria_matches": {"Population": "Adults"},
+    }))
+    (results / "deleted_screening_result.json").write_text(json.dumps({"decision": "Exclude"}))
+    (results / "p1_evidence_table.json").write_text("[]")
+
+    api.upgrade_schema(engine, str(results))
+
+    with sessionmaker(bind=engine)() as session:
+        [result] = session.scalars(select(ScreeningResult)).all()
+        assert (result.pdf_id, result.project_id, result.decision, result.confidence) == ("a", "p1", "Include", 4)
+        assert result.criteria_matches == {"Population": "Adults"}
+        stages = {(row.pdf_id, row.stage) for row in session.execute(select(db.Base.metadata.tables["pdf_checkpoints"]))}
+    assert ("a", "screened") in stages
+    assert ("b", "screened") not in stages
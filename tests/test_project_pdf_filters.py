@@ -0,0 +1,85 @@
+import sys
+import types
+import importlib
+import asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+# Provide dummy modules required for import
+dotenv_mod = types.ModuleType("dotenv")
+dotenv_mod.load_dotenv = lambda *args, **kwargs: None
+sys.modules.setdefault("dotenv", dotenv_mod)
+
+messages_mod = types.ModuleType("langchain.schema.messages")
+messages_mod.AIMessage = messages_mod.HumanMessage = messages_mod.SystemMessage = object
+sys.modules.setdefault("langchain.schema.messages", messages_mod)
+
+db = importlib.import_module("web.db")
+Project = importlib.import_module("web.db.models.project").Project
+Pdf = importlib.import_module("web.db.models.pdf").Pdf
+api = importlib.import_module("web.api")
+
+
+async def make_session(tmp_path):
+    engine = db.create_async_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(db.Base.metadata.create_all)
+    session = async_sessionmaker(bind=engine, expire_on_commit=False)()
+    session.add(Project(id="p1", name="Review", review_type="diagnostic"))
+    session.add_all([Pdf(id=pdf_id, name=f"{pdf_id}.pdf", project_id="p1") for pdf_id in ["a", "b", "c"]])
+    await session.commit()
+    return session
+
+
+def test_add_filtered_pdfs_merges_without_duplicates(tmp_path):
+    async def run_test():
+        session = await make_session(tmp_path)
+
+        await api.add_filtered_pdfs(session, "p1", [("a", 0.9), ("b", 0.5)])
+        await api.add_filtered_pdfs(session, "p1", [("b", 0.7), ("c", 0.8)])
+
+        assert await api.get_filtered_pdf_ids(session, "p1") == ["a", "c", "b"]
+        assert await api.count_filtered_pdfs(session, "p1") == 3
+        assert await api.count_filtered_pdfs(session, "p2") == 0
+        await session.close()
+
+    asyncio.run(run_test())
+
+
+def test_add_filtered_pdfs_from_concurrent_sessions(tmp_path):
+    async def run_test():
+        first = await make_session(tmp_path)
+        second = async_sessionmaker(bind=first.bind, expire_on_commit=False)()
+
+        await asyncio.gather(
+            api.add_filtered_pdfs(first, "p1", [("a", 0.9)]),
+            api.add_filtered_pdfs(second, "p1", [("a", 0.9), ("b", 0.4)]),
+        )
+
+        assert await api.get_filtered_pdf_ids(first, "p1") == ["a", "b"]
+        await first.close()
+        await second.close()
+
+    asyncio.run(run_test())
+
+
+def test_upgrade_copies_shortlists_from_the_old_json_column(tmp_path):
+    engine = db.create_db_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE projects (id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, review_question TEXT, "
+            "review_type VARCHAR(14) NOT NULL, search_criteria VARCHAR, filtered_pdf_ids TEXT)"
+        ))
+        conn.execute(text("CREATE TABLE pdfs (id VARCHAR PRIMARY KEY, name VARCHAR NOT NULL, project_id VARCHAR, title VARCHAR)"))
+        conn.execute(text(
+            "INSERT INTO projects (id, name, review_type, filtered_pdf_ids) VALUES "
+            "('p1', 'Review', 'diagnostic', '[\"a\", \"b\", \"a\", \"gone\"]'), ('p2', 'Other', 'diagnostic', NULL)"
+        ))
+        conn.execute(text("INSERT INTO pdfs (id, name, project_id) VALUES ('a', 'a.pdf', 'p1'), ('b', 'b.pdf', 'p1')"))
+
+    api.upgrade_schema(engine)
+    api.upgrade_schema(engine)
+
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT project_id, pdf_id FROM project_pdf_filters ORDER BY pdf_id")).all()
+    assert [tuple(row) for row in rows] == [("p1", "a"), ("p1", "b")]
@@ -0,0 +1,60 @@
+import os
+import sys
+import types
+import subprocess
+import threading
+import pytest
+
+from app.providers import LazyProvider, get_provider, warm_up
+
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "5"))
+
+
+def test_provider_builds_once_on_first_use():
+    calls = []
+
+    def build():
+        calls.append(1)
+        return types.SimpleNamespace(ready=True)
+
+    provider = LazyProvider("test_client", build)
+    assert not provider.initialised
+
+    threads = [threading.Thread(target=provider.get) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert calls == [1]
+    assert provider.ready is True
+    assert get_provider("test_client") is provider
+
+
+def test_warm_up_logs_failures_instead_of_raising():
+    def fail():
+        raise ConnectionError("offline")
+
+    provider = LazyProvider("test_offline", fail)
+    warm_up("test_offline", "not_registered")
+
+    assert not provider.initialised
+
+
+def test_importing_the_app_creates_no_clients():
+    pytest.importorskip("langchain_openai")
+    pytest.importorskip("langchain_community")
+
+    code = (
+        "import time; start = time.perf_counter()\n"
+        "import app.systematic_review, app.stard_summary, app.evidence_table\n"
+        "elapsed = time.perf_counter() - start\n"
+        "from app.providers import _providers\n"
+        "assert not any(p.initialised for p in _providers.values())\n"
+        "print(elapsed)\n"
+    )
+    env = {**os.environ, "OPENAI_API_KEY": "", "PINECONE_API_KEY": ""}
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env)
+
+    assert result.returncode == 0, result.stderr
+    assert float(result.stdout.strip().splitlines()[-1]) < IMPORT_TIME_BUDGET
@@ -0,0 +1,96 @@
+import sys
+import types
+import importlib
+import asyncio
+from dataclasses import dataclass
+
+# Provide dummy modules required for import
+def stub_module(name, **attrs):
+    mod = types.ModuleType(name)
+    for key, value in attrs.items():
+        setattr(mod, key, value)
+    return sys.modules.setdefault(name, mod)
+
+@dataclass
+class Message:
+    content: str
+    type: str = "human"
+
+class SystemMessage(Message):
+    def __init__(self, content):
+        super().__init__(content, "system")
+
+class DummyPromptTemplate:
+    def __init__(self, input_variables=None, template=""):
+        self.template = template
+    def __or__(self, other):
+        return other
+
+class DummyEncoding:
+    def encode(self, text):
+        return text.split()
+
+stub_module("tiktoken", get_encoding=lambda encoding_name: DummyEncoding())
+stub_module("langchain.memory", ConversationBufferMemory=object)
+stub_module("langchain.schema", BaseChatMessageHistory=object)
+stub_module("langchain.schema.messages", SystemMessage=SystemMessage)
+stub_module("langchain.prompts", PromptTemplate=DummyPromptTemplate)
+stub_module("sqlalchemy.orm", Session=object)
+stub_module("app.llms.chatopenai", light_llm=None)
+stub_module("web.db", SessionLocal=lambda: types.SimpleNamespace(close=lambda: None))
+stub_module(
+    "web.api",
+    get_messages_by_conversation_id=None,
+    add_message_to_conversation=None,
+    get_messages_outside_window=None,
+    get_conversation_summary=None,
+    set_conversation_summary=None,
+)
+
+sql_memory = importlib.import_module("app.memories.sql_memory")
+
+
+def test_trim_to_token_budget_keeps_most_recent_messages():
+    messages = [Message(" ".join(letter * 10)) for letter in "abc"]
+
+    assert sql_memory.trim_to_token_budget(messages, max_tokens=25) == messages[1:]
+    assert sql_memory.trim_to_token_budget(messages, max_tokens=1) == messages[2:]
+
+
+def test_messages_loads_window_and_prepends_summary(monkeypatch):
+    calls = {}
+
+    def fake_get_messages(conversation_id, db, limit=None):
+        calls["limit"] = limit
+        return [Message("question"), Message("answer", "ai")]
+
+    monkeypatch.setattr(sql_memory, "get_messages_by_conversation_id", fake_get_messages)
+    monkeypatch.setattr(sql_memory, "get_conversation_summary", lambda db, cid: ("earlier turns", None))
+
+    history = sql_memory.SQLMessageHistory("c1", db=None, window=6, max_tokens=100)
+    messages = history.messages
+
+    assert calls["limit"] == 6
+    assert messages[0].type == "system"
+    assert "earlier turns" in messages[0].content
+    assert [m.content for m in messages[1:]] == ["question", "answer"]
+
+
+def test_update_history_summary_folds_old_messages(monkeypatch):
+    stored = {}
+    old_messages = [types.SimpleNamespace(role="human", content=f"m{i}", created_on=i) for i in range(4)]
+
+    async def fake_summarise(inputs):
+        assert inputs["summary"] == "None yet."
+        assert "human: m3" in inputs["messages"]
+        return types.SimpleNamespace(content="new summary ")
+
+    monkeypatch.setattr(sql_memory, "HISTORY_SUMMARY", True)
+    monkeypatch.setattr(sql_memory, "get_conversation_summary", lambda db, cid: (None, None))
+    monkeypatch.setattr(sql_memory, "get_messages_outside_window", lambda cid, db, window, after=None: old_messages)
+    monkeypatch.setattr(sql_memory, "set_conversation_summary", lambda db, cid, summary, until: stored.update(summary=summary, until=until))
+    monkeypatch.setattr(sql_memory, "history_summary_chain", types.SimpleNamespace(ainvoke=fake_summarise))
+
+    asyncio.run(sql_memory.update_history_summary("c1"))
+
+    assert stored == {"summary": "new summary", "until": 3}
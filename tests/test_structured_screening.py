@@ -0,0 +1,122 @@
+import sys
+import types
+from dataclasses import dataclass
+import importlib
+import asyncio
+
+from app.criteria.criteria import build_screening_schema, validate_screening_fields, to_screening_result
+
+# Provide dummy modules required for import
+dotenv_mod = types.ModuleType("dotenv")
+dotenv_mod.load_dotenv = lambda *args, **kwargs: None
+sys.modules.setdefault("dotenv", dotenv_mod)
+sys.modules.setdefault("aiofiles", types.ModuleType("aiofiles"))
+
+@dataclass
+class Document:
+    page_content: str
+    metadata: dict
+
+doc_mod = types.ModuleType("langchain_core.documents")
+doc_mod.Document = Document
+sys.modules.setdefault("langchain_core.documents", doc_mod)
+core_mod = sys.modules.setdefault("langchain_core", types.ModuleType("langchain_core"))
+core_mod.documents = doc_mod
+
+class PromptTemplate:
+    def __init__(self, input_variables=None, template=""):
+        self.input_variables = input_variables
+        self.template = template
+    def __or__(self, other):
+        return types.SimpleNamespace(ainvoke=lambda inputs: other.ainvoke(self.template, inputs))
+
+prompts_mod = types.ModuleType("langchain.prompts")
+prompts_mod.PromptTemplate = PromptTemplate
+sys.modules.setdefault("langchain.prompts", prompts_mod)
+
+class DummyLLM:
+    async def ainvoke(self, *args, **kwargs):
+        return types.SimpleNamespace(content="")
+
+llm_mod = types.ModuleType("app.llms.chatopenai")
+llm_mod.light_llm = DummyLLM()
+llm_mod.strong_llm = DummyLLM()
+sys.modules.setdefault("app.llms.chatopenai", llm_mod)
+
+vector_mod = types.ModuleType("app.vector_stores.pinecone")
+vector_mod.vector_store = None
+sys.modules.setdefault("app.vector_stores.pinecone", vector_mod)
+
+stard_mod = types.ModuleType("app.stard_summary")
+async def dummy_summary(docs):
+    return ""
+stard_mod.llm_summary = dummy_summary
+stard_mod.group_doc_by_section = lambda docs: [docs]
+sys.modules.setdefault("app.stard_summary", stard_mod)
+
+api_mod = types.ModuleType("web.api")
+api_mod.save_screening_result = lambda *args, **kwargs: None
+sys.modules.setdefault("web.api", api_mod)
+
+sr = importlib.import_module("app.systematic_review")
+
+criteria = ["Population", "Study Design"]
+
+
+def test_validate_screening_fields_drops_invalid_values():
+    fields, missing = validate_screening_fields(
+        {"decision": "Include", "confidence": 9, "population": "Matched adults", "study_design": ""},
+        criteria,
+    )
+
+    assert fields == {"decision": "Include", "population": "Matched adults"}
+    assert missing == ["confidence", "study_design", "rationale"]
+
+
+def test_to_screening_result_fills_defaults():
+    result = to_screening_result({"decision": "Exclude", "population": "Not Matched"}, criteria)
+
+    assert result == {
+        "decision": "Exclude",
+        "confidence": 0,
+        "rationale": "",
+        "criteria_matches": {"Population": "Not Matched", "Study Design": "N/A"},
+    }
+
+
+def test_build_screening_schema_for_missing_fields_is_required():
+    schema = build_screening_schema(criteria, fields=["study_design"]).model_json_schema()
+
+    assert list(schema["properties"]) == ["study_design"]
+    assert schema["required"] == ["study_design"]
+
+
+def test_invoke_structured_screening_reasks_only_missing_fields(monkeypatch):
+    calls = []
+
+    class StructuredLLM:
+        def with_structured_output(self, schema, include_raw=False):
+            return types.SimpleNamespace(ainvoke=lambda template, inputs: self.answer(schema, template, include_raw))
+
+        async def answer(self, schema, template, include_raw):
+            calls.append(list(schema["properties"]))
+            if len(calls) == 1:
+                parsed = {"decision": "Include", "confidence": 4, "population": "Matched adults"}
+            else:
+                assert "study_design, rationale" in template
+                parsed = {"study_design": "Matched RCT", "rationale": "Relevant trial"}
+            raw = types.SimpleNamespace(usage_metadata={"input_tokens": 10, "output_tokens": 5}, response_metadata={})
+            return {"raw": raw, "parsed": parsed, "parsing_error": None} if include_raw else parsed
+
+    monkeypatch.setattr(sr, "light_llm", StructuredLLM())
+    prompt = PromptTemplate(input_variables=["summary"], template="Screen {summary}")
+
+    result = asyncio.run(sr.invoke_structured_screening(prompt, {"summary": "text"}, criteria))
+
+    assert calls[1] == ["study_design", "rationale"]
+    assert result == {
+        "decision": "Include",
+        "confidence": 4,
+        "rationale": "Relevant trial",
+        "criteria_matches": {"Population": "Matched adults", "Study Design": "Matched RCT"},
+    }
@@ -62,7 +62,7 @@ class DummySplitter:
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
     @classmethod
-    def from_tiktoken_encoder(cls, model_name="gpt-4", chunk_size=0, chunk_overlap=0):
+    def from_tiktoken_encoder(cls, encoding_name="cl100k_base", chunk_size=0, chunk_overlap=0):
         return cls(chunk_size, chunk_overlap)
     def split_text(self, text):
         return [text]
@@ -88,10 +88,10 @@ class DummyEncoding:
     def encode(self, text):
         return text.split()
 
-def encoding_for_model(model_name):
+def get_encoding(encoding_name):
     return DummyEncoding()
 
-tiktoken_mod.encoding_for_model = encoding_for_model
+tiktoken_mod.get_encoding = get_encoding
 sys.modules.setdefault("tiktoken", tiktoken_mod)
 
 def test_chunk_document_by_titles_with_titles(tmp_path):
@@ -99,8 +99,7 @@ def test_chunk_document_by_titles_with_titles(tmp_path):
     text = "Introduction\nIntro text\nMethods\nMethods text"
     with patch.object(te, "get_partitioned_elements", return_value=dummy_elements), \
          patch.object(te, "get_intersecting_titles", return_value=(["Introduction", "Methods"], "Mock Title")), \
-         patch.object(te, "extract_cleaned_text", return_value=text), \
-         patch.object(te, "_write_chunk_to_file"):
+         patch.object(te, "extract_cleaned_text", return_value=text):
         docs, main_title = te.chunk_document_by_titles("dummy.pdf", chunk_size=1000, chunk_overlap=0)
 
     assert main_title == "Mock Title"
@@ -119,10 +118,10 @@ def test_chunk_document_by_titles_no_titles():
     text = "Only text without titles"
     with patch.object(te, "get_partitioned_elements", return_value=dummy_elements), \
          patch.object(te, "get_intersecting_titles", return_value=([], "Mock Title")), \
-         patch.object(te, "extract_cleaned_text", return_value=text), \
-         patch.object(te, "_write_chunk_to_file"):
-        docs = te.chunk_document_by_titles("dummy.pdf", chunk_size=1000, chunk_overlap=0)
+         patch.object(te, "extract_cleaned_text", return_value=text):
+        docs, main_title = te.chunk_document_by_titles("dummy.pdf", chunk_size=1000, chunk_overlap=0)
 
+    assert main_title == "Mock Title"
     assert len(docs) == 1
     assert docs[0].metadata == {
         "source": "dummy.pdf",
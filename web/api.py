@@ -1,29 +1,84 @@
-from typing import Dict, List
+import os
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+from sqlalchemy import delete, func, insert, inspect, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from langchain.schema.messages import AIMessage, HumanMessage, SystemMessage
-from web.db import get_db
+from web.db import AsyncSessionLocal, get_db, create_missing_schema
 from web.db.models.message import Message
 from web.db.models.conversation import Conversation
+from web.db.models.screening_result import ScreeningResult
+from web.db.models.project_pdf_filter import ProjectPdfFilter
+from web.db.models.llm_usage import LlmUsage
+from web.db.models.pdf_checkpoint import PdfCheckpoint, PDF_STAGES
+from web.db.models.pdf import Pdf
+from web.db.models.project import Project
+from web.pagination import PAGE_SIZE, paginate_keyset
+
+logger = logging.getLogger(__name__)
 
 
 def get_messages_by_conversation_id(
     conversation_id: str,
     db: Session,
+    limit: int | None = None,
 ) -> List[AIMessage | HumanMessage | SystemMessage]:
     """
-    Retrieves all messages that belong to the given conversation_id.
+    Retrieves the messages that belong to the given conversation_id, oldest first.
 
     :param conversation_id: The ID of the conversation.
     :param db: SQLAlchemy session (from FastAPI dependency).
+    :param limit: If given, only the most recent `limit` messages are loaded.
     :return: List of LangChain messages.
     """
-    messages = (
+    query = (
         db.query(Message)
         .filter(Message.conversation_id == conversation_id)
         .order_by(Message.created_on.desc())
-        .all()
     )
-    return [message.as_lc_message() for message in messages]
+    if limit:
+        query = query.limit(limit)
+    messages = query.all()
+    return [message.as_lc_message() for message in reversed(messages)]
+
+
+def get_messages_outside_window(
+    conversation_id: str,
+    db: Session,
+    window: int,
+    after: datetime | None = None,
+) -> List[Message]:
+    """
+    Retrieves the messages older than the most recent `window` messages, oldest first.
+
+    :param conversation_id: The ID of the conversation.
+    :param db: SQLAlchemy session
+    :param window: Number of most recent messages to leave out
+    :param after: If given, only messages created after this time are returned
+    :return: List of Message objects
+    """
+    window_start = (
+        db.query(Message.created_on)
+        .filter(Message.conversation_id == conversation_id)
+        .order_by(Message.created_on.desc())
+        .offset(window - 1)
+        .limit(1)
+        .scalar()
+    )
+    if window_start is None:
+        return []
+
+    query = db.query(Message).filter(
+        Message.conversation_id == conversation_id,
+        Message.created_on < window_start,
+    )
+    if after is not None:
+        query = query.filter(Message.created_on > after)
+    return query.order_by(Message.created_on.asc()).all()
 
 
 def add_message_to_conversation(
@@ -84,3 +139,508 @@ def set_conversation_components(
     conversation.retriever = retriever
     conversation.memory = memory
     db.commit()
+
+
+def get_conversation_summary(db: Session, conversation_id: str) -> tuple[str | None, datetime | None]:
+    """
+    Returns the rolling summary of older messages in a conversation and the
+    creation time of the last message it covers.
+    """
+    row = (
+        db.query(Conversation.history_summary, Conversation.summarised_until)
+        .filter(Conversation.id == conversation_id)
+        .first()
+    )
+    if not row:
+        raise ValueError(f"Conversation {conversation_id} not found.")
+    return row.history_summary, row.summarised_until
+
+
+def set_conversation_summary(
+    db: Session, conversation_id: str, summary: str, summarised_until: datetime
+) -> None:
+    """
+    Stores the rolling summary of older messages in a conversation.
+    """
+    conversation = db.query(Conversation).filter_by(id=conversation_id).first()
+    if not conversation:
+        raise ValueError(f"Conversation {conversation_id} not found.")
+
+    conversation.history_summary = summary
+    conversation.summarised_until = summarised_until
+    db.commit()
+
+
+async def add_chat_turn(
+    db: AsyncSession,
+    conversation_id: str,
+    user_input: str,
+    answer: str,
+) -> None:
+    """
+    Stores a question and its answer in one transaction.
+
+    :param db: Async SQLAlchemy session
+    :param conversation_id: The id of the conversation
+    :param user_input: The user's question
+    :param answer: The assistant's answer
+    """
+    # History is ordered by created_on, so the answer must sort after the question even on a coarse clock
+    asked_on = datetime.now(timezone.utc)
+    db.add_all([
+        Message(conversation_id=conversation_id, role="human", content=user_input, created_on=asked_on),
+        Message(conversation_id=conversation_id, role="ai", content=answer,
+                created_on=asked_on + timedelta(microseconds=1)),
+    ])
+    await db.commit()
+
+
+async def save_screening_result(
+    db: AsyncSession,
+    pdf_id: str,
+    project_id: str | None,
+    result: dict,
+    model: str | None = None,
+) -> ScreeningResult:
+    """
+    Creates or replaces the screening result stored for a PDF.
+
+    :param db: Async SQLAlchemy session
+    :param pdf_id: The id of the screened PDF
+    :param project_id: The id of the project the PDF belongs to
+    :param result: Screening result with decision, confidence, rationale and criteria_matches
+    :param model: Name of the model that produced the decision
+    :return: The stored ScreeningResult object
+    """
+    screening_result = await db.scalar(select(ScreeningResult).filter_by(pdf_id=pdf_id))
+    if not screening_result:
+        screening_result = ScreeningResult(pdf_id=pdf_id)
+        db.add(screening_result)
+
+    screening_result.project_id = project_id
+    screening_result.decision = result.get("decision", "Unclear")
+    screening_result.confidence = result.get("confidence", 0)
+    screening_result.rationale = result.get("rationale", "")
+    screening_result.criteria_matches = result.get("criteria_matches", {})
+    screening_result.screening_stage = result.get("screening_stage")
+    screening_result.model = model
+    await db.commit()
+    return screening_result
+
+
+async def add_filtered_pdfs(
+    db: AsyncSession,
+    project_id: str,
+    ranked_pdfs: List[Tuple[str, float]],
+) -> None:
+    """
+    Adds PDFs to the filtered shortlist of a project in one statement.
+    PDFs already on the shortlist are left untouched, so concurrent uploads
+    to the same project never overwrite each other's entries.
+
+    :param db: Async SQLAlchemy session
+    :param project_id: The id of the project
+    :param ranked_pdfs: (pdf_id, score) pairs
+    """
+    if not ranked_pdfs:
+        return
+
+    rows = [{"project_id": project_id, "pdf_id": pdf_id, "score": score} for pdf_id, score in ranked_pdfs]
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(ProjectPdfFilter).on_conflict_do_nothing()
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(ProjectPdfFilter).on_conflict_do_nothing()
+    else:
+        existing = set(await get_filtered_pdf_ids(db, project_id))
+        rows = [row for row in rows if row["pdf_id"] not in existing]
+        stmt = insert(ProjectPdfFilter)
+
+    if rows:
+        await db.execute(stmt, rows)
+    await db.commit()
+
+
+async def get_filtered_pdf_ids(db: AsyncSession, project_id: str) -> List[str]:
+    """
+    Returns the ids of the PDFs on a project's filtered shortlist, best match first.
+    """
+    result = await db.scalars(
+        select(ProjectPdfFilter.pdf_id)
+        .where(ProjectPdfFilter.project_id == project_id)
+        .order_by(ProjectPdfFilter.score.desc(), ProjectPdfFilter.created_on)
+    )
+    return list(result)
+
+
+async def mark_pdf_stage(db: AsyncSession, pdf_ids: List[str], stage: str) -> None:
+    """
+    Records that a processing stage has completed for the given PDFs.
+    Stages already recorded are left untouched, so stage functions can rerun safely.
+
+    :param db: Async SQLAlchemy session
+    :param pdf_ids: The ids of the PDFs
+    :param stage: One of PDF_STAGES
+    """
+    if stage not in PDF_STAGES:
+        raise ValueError(f"Unknown PDF stage: {stage}")
+    if not pdf_ids:
+        return
+
+    rows = [{"pdf_id": pdf_id, "stage": stage} for pdf_id in pdf_ids]
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(PdfCheckpoint).on_conflict_do_nothing()
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(PdfCheckpoint).on_conflict_do_nothing()
+    else:
+        existing = await get_pdf_stages(db, pdf_ids)
+        rows = [row for row in rows if stage not in existing[row["pdf_id"]]]
+        stmt = insert(PdfCheckpoint)
+
+    if rows:
+        await db.execute(stmt, rows)
+    await db.commit()
+
+
+async def set_pdf_error(db: AsyncSession, pdf_id: str, error: str | None) -> None:
+    """
+    Records why processing a PDF failed, or clears it with None once it succeeds.
+    """
+    await db.execute(update(Pdf).where(Pdf.id == pdf_id).values(error=error))
+    await db.commit()
+
+
+async def get_pdf_stages(db: AsyncSession, pdf_ids: List[str]) -> Dict[str, set]:
+    """
+    Returns the completed processing stages of each of the given PDFs.
+    """
+    stages = {pdf_id: set() for pdf_id in pdf_ids}
+    rows = await db.execute(
+        select(PdfCheckpoint.pdf_id, PdfCheckpoint.stage).where(PdfCheckpoint.pdf_id.in_(pdf_ids))
+    )
+    for pdf_id, stage in rows:
+        stages[pdf_id].add(stage)
+    return stages
+
+
+def backfill_pdf_stages(db: Session) -> None:
+    """
+    Records checkpoints for the PDFs processed before checkpoints existed. Those went
+    through parsing, embedding and filtering in one request, and were summarised and
+    screened if they have a screening result. Run once, when the table is created.
+    """
+    pdf_ids = list(db.scalars(select(Pdf.id)))
+    screened = set(db.scalars(select(ScreeningResult.pdf_id)))
+    for stage in PDF_STAGES:
+        stage_ids = pdf_ids if stage in ("parsed", "embedded", "filtered") else [i for i in pdf_ids if i in screened]
+        db.add_all(PdfCheckpoint(pdf_id=pdf_id, stage=stage) for pdf_id in stage_ids)
+    db.commit()
+
+
+def backfill_pdf_filters(db: Session) -> None:
+    """
+    Copies the shortlists that earlier versions kept as a JSON list in
+    projects.filtered_pdf_ids into project_pdf_filters. Their similarity scores were
+    not stored, so the copied entries have none. Run once, when the table is created.
+    """
+    columns = {column["name"] for column in inspect(db.get_bind()).get_columns(Project.__tablename__)}
+    if "filtered_pdf_ids" not in columns:
+        return
+
+    pdf_ids = set(db.scalars(select(Pdf.id)))
+    rows = db.execute(text("SELECT id, filtered_pdf_ids FROM projects WHERE filtered_pdf_ids IS NOT NULL"))
+    for project_id, filtered_pdf_ids in rows.all():
+        try:
+            shortlist = json.loads(filtered_pdf_ids or "[]")
+        except ValueError:
+            continue
+        db.add_all(
+            ProjectPdfFilter(project_id=project_id, pdf_id=pdf_id)
+            for pdf_id in dict.fromkeys(shortlist) if pdf_id in pdf_ids
+        )
+    db.commit()
+
+
+def import_screening_result_files(db: Session, review_result_folder: str) -> None:
+    """
+    Copies the screening results that earlier versions wrote to
+    <review_result_folder>/<pdf_id>_screening_result.json into screening_results.
+    The files are left in place. Run once, when the table is created.
+    """
+    if not os.path.isdir(review_result_folder):
+        return
+
+    suffix = "_screening_result.json"
+    projects = dict(db.execute(select(Pdf.id, Pdf.project_id)).all())
+    for name in sorted(os.listdir(review_result_folder)):
+        pdf_id = name[:-len(suffix)]
+        if not name.endswith(suffix) or pdf_id not in projects:
+            continue
+        try:
+            with open(os.path.join(review_result_folder, name), "r", encoding="utf-8") as f:
+                result = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Skipping unreadable screening result %s: %s", name, e)
+            continue
+        db.add(ScreeningResult(
+            pdf_id=pdf_id,
+            project_id=projects[pdf_id],
+            decision=result.get("decision") or "Unclear",
+            confidence=result.get("confidence") or 0,
+            rationale=result.get("rationale", ""),
+            criteria_matches=result.get("criteria_matches") or {},
+        ))
+    db.commit()
+
+
+def upgrade_schema(bind, review_result_folder: str | None = None) -> None:
+    """
+    Creates whatever schema the database is missing and, for tables created now,
+    copies over the data earlier versions kept elsewhere. Safe to run at every startup.
+    Screening results are imported before checkpoints are backfilled, since the
+    backfill marks PDFs with a result as screened.
+    """
+    inspector = inspect(bind)
+    new_tables = {
+        table for table in (
+            ProjectPdfFilter.__tablename__, ScreeningResult.__tablename__, PdfCheckpoint.__tablename__
+        )
+        if not inspector.has_table(table)
+    }
+    create_missing_schema(bind)
+    with Session(bind=bind) as db:
+        if ProjectPdfFilter.__tablename__ in new_tables:
+            backfill_pdf_filters(db)
+        if ScreeningResult.__tablename__ in new_tables and review_result_folder:
+            import_screening_result_files(db, review_result_folder)
+        if PdfCheckpoint.__tablename__ in new_tables:
+            backfill_pdf_stages(db)
+
+
+async def delete_pdf_rows(db: AsyncSession, pdf_ids: List[str]) -> None:
+    """
+    Deletes PDFs and every row that belongs to them in one transaction. Deletes are
+    explicit rather than ORM cascades, since SQLite does not enforce foreign keys here.
+    LLM usage rows are kept so project cost totals still include the deleted PDFs.
+    """
+    if not pdf_ids:
+        return
+    conversation_ids = select(Conversation.id).where(Conversation.pdf_id.in_(pdf_ids))
+    await db.execute(delete(Message).where(Message.conversation_id.in_(conversation_ids)))
+    await db.execute(delete(Conversation).where(Conversation.pdf_id.in_(pdf_ids)))
+    await db.execute(delete(ScreeningResult).where(ScreeningResult.pdf_id.in_(pdf_ids)))
+    await db.execute(delete(PdfCheckpoint).where(PdfCheckpoint.pdf_id.in_(pdf_ids)))
+    await db.execute(delete(ProjectPdfFilter).where(ProjectPdfFilter.pdf_id.in_(pdf_ids)))
+    await db.execute(delete(Pdf).where(Pdf.id.in_(pdf_ids)))
+    await db.commit()
+
+
+async def delete_project_rows(db: AsyncSession, project_id: str) -> List[str]:
+    """
+    Deletes a project with its PDFs, shortlist and usage rows. Returns the deleted PDF ids.
+    """
+    pdf_ids = list(await db.scalars(select(Pdf.id).where(Pdf.project_id == project_id)))
+    await delete_pdf_rows(db, pdf_ids)
+    await db.execute(delete(ProjectPdfFilter).where(ProjectPdfFilter.project_id == project_id))
+    await db.execute(delete(ScreeningResult).where(ScreeningResult.project_id == project_id))
+    await db.execute(delete(LlmUsage).where(LlmUsage.project_id == project_id))
+    await db.execute(delete(Project).where(Project.id == project_id))
+    await db.commit()
+    return pdf_ids
+
+
+async def delete_orphaned_rows(db: AsyncSession) -> int:
+    """
+    Deletes rows that belong to PDFs which no longer exist, e.g. a checkpoint or
+    screening result written by a pipeline still running when its PDF was deleted.
+    Returns the number of rows deleted.
+    """
+    live_pdfs = select(Pdf.id)
+    conversation_ids = select(Conversation.id).where(Conversation.pdf_id.not_in(live_pdfs))
+    deleted = 0
+    for statement in (
+        delete(Message).where(Message.conversation_id.in_(conversation_ids)),
+        delete(Conversation).where(Conversation.pdf_id.not_in(live_pdfs)),
+        delete(ScreeningResult).where(ScreeningResult.pdf_id.not_in(live_pdfs)),
+        delete(PdfCheckpoint).where(PdfCheckpoint.pdf_id.not_in(live_pdfs)),
+        delete(ProjectPdfFilter).where(ProjectPdfFilter.pdf_id.not_in(live_pdfs)),
+    ):
+        deleted += (await db.execute(statement)).rowcount
+    await db.commit()
+    return deleted
+
+
+async def count_project_stages(db: AsyncSession, project_id: str) -> Dict[str, int]:
+    """
+    Returns the number of a project's PDFs that have completed each processing stage.
+    """
+    rows = await db.execute(
+        select(PdfCheckpoint.stage, func.count(PdfCheckpoint.pdf_id))
+        .join(Pdf, Pdf.id == PdfCheckpoint.pdf_id)
+        .where(Pdf.project_id == project_id)
+        .group_by(PdfCheckpoint.stage)
+    )
+    counts = dict(rows.all())
+    return {stage: counts.get(stage, 0) for stage in PDF_STAGES}
+
+
+# Sort options for a project's PDF list: (sort key, descending)
+PDF_SORT_KEYS = {
+    "name": (Pdf.name, False),
+    "decision": (func.coalesce(ScreeningResult.decision, ""), False),
+    "confidence": (func.coalesce(ScreeningResult.confidence, -1), True),
+}
+
+
+async def list_projects(
+    db: AsyncSession, cursor: str | None = None, limit: int = PAGE_SIZE
+) -> Tuple[list, str | None]:
+    """
+    Returns one page of projects ordered by name, each with its PDF count.
+
+    :param db: Async SQLAlchemy session
+    :param cursor: Cursor returned with the previous page, None for the first page
+    :param limit: Maximum number of projects on the page
+    :return: The rows (id, name, review_type, review_question, pdf_count) and the next page cursor
+    """
+    pdf_counts = (
+        select(Pdf.project_id, func.count(Pdf.id).label("pdf_count"))
+        .group_by(Pdf.project_id)
+        .subquery()
+    )
+    query = (
+        select(
+            Project.id, Project.name, Project.review_type, Project.review_question,
+            func.coalesce(pdf_counts.c.pdf_count, 0).label("pdf_count"),
+        )
+        .outerjoin(pdf_counts, pdf_counts.c.project_id == Project.id)
+    )
+    query, page = paginate_keyset(query, Project.name, Project.id, cursor=cursor, limit=limit)
+    return page((await db.execute(query)).all())
+
+
+async def list_project_pdfs(
+    db: AsyncSession,
+    project_id: str,
+    decision: str | None = None,
+    sort: str = "name",
+    cursor: str | None = None,
+    limit: int = PAGE_SIZE,
+) -> Tuple[list, str | None]:
+    """
+    Returns one page of a project's PDFs with their screening decision.
+
+    :param db: Async SQLAlchemy session
+    :param project_id: The id of the project
+    :param decision: Only include PDFs with this screening decision
+    :param sort: One of PDF_SORT_KEYS
+    :param cursor: Cursor returned with the previous page, None for the first page
+    :param limit: Maximum number of PDFs on the page
+    :return: The rows (id, name, decision, confidence, error) and the next page cursor
+    """
+    sort_key, descending = PDF_SORT_KEYS.get(sort, PDF_SORT_KEYS["name"])
+    query = (
+        select(Pdf.id, Pdf.name, ScreeningResult.decision, ScreeningResult.confidence, Pdf.error)
+        .outerjoin(ScreeningResult, ScreeningResult.pdf_id == Pdf.id)
+        .where(Pdf.project_id == project_id)
+    )
+    if decision:
+        query = query.where(ScreeningResult.decision == decision)
+    query, page = paginate_keyset(query, sort_key, Pdf.id, descending, cursor, limit)
+    return page((await db.execute(query)).all())
+
+
+async def count_project_decisions(db: AsyncSession, project_id: str) -> Dict[str, int]:
+    """
+    Returns the number of PDFs in a project per screening decision,
+    with unscreened PDFs counted under "Not screened".
+    """
+    rows = await db.execute(
+        select(func.coalesce(ScreeningResult.decision, "Not screened"), func.count(Pdf.id))
+        .outerjoin(ScreeningResult, ScreeningResult.pdf_id == Pdf.id)
+        .where(Pdf.project_id == project_id)
+        .group_by(func.coalesce(ScreeningResult.decision, "Not screened"))
+    )
+    return {decision: count for decision, count in rows}
+
+
+async def count_filtered_pdfs(db: AsyncSession, project_id: str) -> int:
+    """
+    Returns the number of PDFs on a project's filtered shortlist.
+    """
+    return await db.scalar(
+        select(func.count()).select_from(ProjectPdfFilter).where(ProjectPdfFilter.project_id == project_id)
+    )
+
+
+USAGE_TOTALS = ("calls", "prompt_tokens", "completion_tokens", "cost_usd")
+
+
+async def add_llm_usage(db: AsyncSession, rows: List[dict]) -> None:
+    """
+    Adds usage totals to the stored running totals in one statement,
+    creating the (project, pdf, stage, model) rows that do not exist yet.
+
+    :param db: Async SQLAlchemy session
+    :param rows: Dicts with project_id, pdf_id, stage, model and the USAGE_TOTALS fields
+    """
+    if not rows:
+        return
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert_fn = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert_fn(LlmUsage)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[LlmUsage.project_id, LlmUsage.pdf_id, LlmUsage.stage, LlmUsage.model],
+            set_={
+                **{name: getattr(LlmUsage, name) + getattr(stmt.excluded, name) for name in USAGE_TOTALS},
+                "updated_on": datetime.now(timezone.utc),
+            },
+        )
+        await db.execute(stmt, rows)
+    else:
+        for row in rows:
+            key = (row["project_id"], row["pdf_id"], row["stage"], row["model"])
+            usage = await db.get(LlmUsage, key)
+            if usage is None:
+                db.add(LlmUsage(**row))
+                continue
+            for name in USAGE_TOTALS:
+                setattr(usage, name, getattr(usage, name) + row[name])
+    await db.commit()
+
+
+async def store_llm_usage(rows: List[dict]) -> None:
+    """
+    Usage sink for app.usage.flush_usage(), adding the drained rows in a session of its own.
+    """
+    async with AsyncSessionLocal() as db:
+        await add_llm_usage(db, rows)
+
+
+async def get_project_usage(db: AsyncSession, project_id: str, group_by: str = "stage") -> List[dict]:
+    """
+    Returns a project's LLM and embedding usage totals, grouped by stage, model or pdf,
+    most expensive first.
+
+    :param db: Async SQLAlchemy session
+    :param project_id: The id of the project
+    :param group_by: One of "stage", "model", "pdf" or "stage_model"
+    :return: Dicts with the group columns and the USAGE_TOTALS fields
+    """
+    group_columns = {
+        "stage": [LlmUsage.stage],
+        "model": [LlmUsage.model],
+        "pdf": [LlmUsage.pdf_id],
+        "stage_model": [LlmUsage.stage, LlmUsage.model],
+    }[group_by]
+    totals = [func.sum(getattr(LlmUsage, name)).label(name) for name in USAGE_TOTALS]
+    rows = await db.execute(
+        select(*group_columns, *totals)
+        .where(LlmUsage.project_id == project_id)
+        .group_by(*group_columns)
+        .order_by(func.sum(LlmUsage.cost_usd).desc())
+    )
+    return [dict(row._mapping) for row in rows]
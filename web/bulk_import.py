@@ -0,0 +1,174 @@
+"""
+Bulk import of a directory or zip archive of PDFs into a project, for search exports
+too large to upload through the browser.
+
+Files are copied into the upload folder and their rows committed in batches, then the
+project runs through the same staged pipeline as an upload, with a bounded number of
+PDFs in flight. Rerunning the same command resumes: files already imported (matched
+by their path in the source) are not copied again, and only unfinished stages run.
+
+    python -m web.bulk_import exports/search.zip --name "Review" --review-question "..."
+    python -m web.bulk_import exports/search.zip --project <project_id>    # resume
+"""
+import os
+import sys
+import time
+import uuid
+import shutil
+import asyncio
+import logging
+import zipfile
+import argparse
+from typing import Callable, Iterator, List, Tuple, IO
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.logs import setup_logging
+from app.metrics import current_project
+from app.usage import set_usage_sink
+from app.criteria.criteria import criteria_dict
+from web.db import AsyncSessionLocal, engine, async_engine
+from web.db.models.pdf import Pdf
+from web.db.models.project import Project
+from web.db.models.pdf_checkpoint import PDF_STAGES
+from web.api import count_project_stages, store_llm_usage, upgrade_schema
+from web.pipeline import (
+    UPLOAD_FOLDER, SUMMARY_FOLDER, REVIEW_RESULT_FOLDER, FILTER_TOP_N, upload_path, run_project_pipeline,
+)
+
+logger = logging.getLogger(__name__)
+
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "8"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "100"))
+PROGRESS_INTERVAL = 10
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import a directory or zip of PDFs into a project")
+    parser.add_argument("source", help="Directory (searched recursively) or .zip archive of PDFs")
+    parser.add_argument("--project", help="Add to, or resume, this existing project ID")
+    parser.add_argument("--name", help="Name of the new project")
+    parser.add_argument("--review-question", help="Review question of the new project")
+    parser.add_argument("--review-type", default="diagnostic", choices=Project.review_type.type.enums)
+    parser.add_argument("--criteria", default="PICOS", choices=sorted(criteria_dict))
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="PDFs processed concurrently")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Files copied per commit")
+    parser.add_argument("--top-n", type=int, default=FILTER_TOP_N, help="PDFs shortlisted for screening")
+    args = parser.parse_args(argv)
+    if not args.project and not (args.name and args.review_question):
+        parser.error("either --project or both --name and --review-question are required")
+    return args
+
+def source_pdfs(source: str) -> Iterator[Tuple[str, Callable[[], IO[bytes]]]]:
+    """(name relative to the source, opener) for each PDF in a directory tree or zip archive, in name order"""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in sorted(archive.infolist(), key=lambda info: info.filename):
+                if not info.is_dir() and info.filename.lower().endswith(".pdf") \
+                        and not info.filename.startswith("__MACOSX/"):
+                    yield info.filename, lambda info=info: archive.open(info)
+    elif os.path.isdir(source):
+        paths = []
+        for root, _, names in os.walk(source):
+            paths.extend(os.path.join(root, name) for name in names if name.lower().endswith(".pdf"))
+        for path in sorted(paths):
+            yield os.path.relpath(path, source).replace(os.sep, "/"), lambda path=path: open(path, "rb")
+    else:
+        raise SystemExit(f"{source} is neither a directory nor a zip archive")
+
+def copy_pdf(opener: Callable[[], IO[bytes]], path: str) -> bool:
+    """Stream a PDF to path without loading it into memory; False if it isn't a PDF"""
+    with opener() as src:
+        if src.read(5) != b"%PDF-":
+            return False
+        with open(path, "wb") as dst:
+            dst.write(b"%PDF-")
+            shutil.copyfileobj(src, dst)
+    return True
+
+async def import_files(db: AsyncSession, project: Project, source: str, batch_size: int) -> Tuple[int, int]:
+    """Copy PDFs the project doesn't have yet and create their rows. Returns (imported, skipped)."""
+    existing = set(await db.scalars(select(Pdf.name).where(Pdf.project_id == project.id)))
+    imported = skipped = pending = 0
+    for name, opener in source_pdfs(source):
+        if name in existing:
+            continue
+        pdf_id = str(uuid.uuid4())
+        if not await asyncio.to_thread(copy_pdf, opener, upload_path(pdf_id)):
+            logger.warning("Skipping %s: not a PDF", name)
+            skipped += 1
+            continue
+        db.add(Pdf(id=pdf_id, name=name, project_id=project.id))
+        imported += 1
+        pending += 1
+        if pending >= batch_size:
+            await db.commit()
+            pending = 0
+            print(f"Copied {imported} PDFs", flush=True)
+    await db.commit()
+    return imported, skipped
+
+async def report_progress(project_id: str, total: int, interval: float = PROGRESS_INTERVAL) -> None:
+    """Print how many of the project's PDFs have completed each stage until cancelled"""
+    start = time.perf_counter()
+    while True:
+        await asyncio.sleep(interval)
+        async with AsyncSessionLocal() as db:
+            counts = await count_project_stages(db, project_id)
+        stages = "  ".join(f"{stage} {counts[stage]}/{total}" for stage in PDF_STAGES)
+        print(f"[{time.perf_counter() - start:7.0f}s] {stages}", flush=True)
+
+async def run_import(args) -> None:
+    # Same as the web server's startup, so a database first touched by an import is upgraded
+    upgrade_schema(engine, REVIEW_RESULT_FOLDER)
+    set_usage_sink(store_llm_usage)
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(SUMMARY_FOLDER, exist_ok=True)
+
+    async with AsyncSessionLocal() as db:
+        if args.project:
+            project = await db.get(Project, args.project)
+            if not project:
+                raise SystemExit(f"Project {args.project} not found")
+        else:
+            project = Project(
+                name=args.name,
+                review_question=args.review_question,
+                review_type=args.review_type,
+                search_criteria=args.criteria,
+            )
+            db.add(project)
+            await db.commit()
+            print(f"Created project {project.id}; resume with --project {project.id}", flush=True)
+        current_project.set(project.id)
+
+        start = time.perf_counter()
+        imported, skipped = await import_files(db, project, args.source, args.batch_size)
+        pdf_ids = list(await db.scalars(select(Pdf.id).where(Pdf.project_id == project.id)))
+        print(f"Imported {imported} new PDFs ({skipped} skipped); processing {len(pdf_ids)}", flush=True)
+
+    progress = asyncio.create_task(report_progress(project.id, len(pdf_ids)))
+    try:
+        await run_project_pipeline(project, pdf_ids, workers=args.workers, top_n=args.top_n)
+    finally:
+        progress.cancel()
+
+    async with AsyncSessionLocal() as db:
+        counts = await count_project_stages(db, project.id)
+    print(f"Finished in {time.perf_counter() - start:.0f}s: " + ", ".join(
+        f"{stage} {counts[stage]}/{len(pdf_ids)}" for stage in PDF_STAGES
+    ), flush=True)
+
+async def run(args) -> None:
+    try:
+        await run_import(args)
+    finally:
+        # Pooled aiosqlite connections run in threads that otherwise keep the process alive
+        await async_engine.dispose()
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    setup_logging()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
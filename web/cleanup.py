@@ -0,0 +1,136 @@
+"""
+Deleting PDFs and projects, and garbage collection of whatever a crash or an
+interrupted delete left behind.
+
+A delete removes the database rows first, then the PDF's vectors, chunks and files.
+If removing artefacts fails part way, the PDF no longer exists in the database, and
+collect_garbage() finds and removes the remaining artefacts on its next run. It also
+removes rows a pipeline still running at the time wrote for the deleted PDF.
+
+    python -m web.cleanup    # run garbage collection once, e.g. from cron
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.embeddings.cache import embedding_cache
+from app.vector_stores.bm25 import remove_chunks, stored_pdf_ids
+from app.vector_stores.pinecone import remove_embeddings, vector_store
+from web.db import AsyncSessionLocal, async_engine
+from web.db.models.pdf import Pdf
+from web.db.models.project import Project
+from web.api import delete_orphaned_rows, delete_pdf_rows, delete_project_rows
+from web.pipeline import UPLOAD_FOLDER, SUMMARY_FOLDER, REVIEW_RESULT_FOLDER, upload_path, evidence_table_path
+
+logger = logging.getLogger(__name__)
+
+# Files younger than this are left alone: an upload writes its file before its row is committed
+GC_GRACE_SECONDS = int(os.getenv("GC_GRACE_SECONDS", "3600"))
+# Cached vectors of chunks no PDF contains are dropped; set to false to keep them for re-uploads
+GC_PRUNE_EMBEDDING_CACHE = os.getenv("GC_PRUNE_EMBEDDING_CACHE", "true").lower() in ("1", "true", "yes")
+
+def pdf_files(pdf_id: str) -> List[str]:
+    return [
+        upload_path(pdf_id),
+        os.path.join(SUMMARY_FOLDER, f"{pdf_id}.txt"),
+        os.path.join(SUMMARY_FOLDER, f"{pdf_id}.partial"),
+    ]
+
+def remove_file(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+def remove_pdf_artefacts(pdf_id: str) -> None:
+    """Remove a PDF's vectors, chunks, summary and upload"""
+    remove_embeddings(pdf_id)
+    remove_chunks(pdf_id)
+    for path in pdf_files(pdf_id):
+        remove_file(path)
+
+async def delete_pdfs(db: AsyncSession, pdf_ids: List[str]) -> None:
+    project_ids = set(await db.scalars(select(Pdf.project_id).where(Pdf.id.in_(pdf_ids))))
+    await delete_pdf_rows(db, pdf_ids)
+    for pdf_id in pdf_ids:
+        await asyncio.to_thread(remove_pdf_artefacts, pdf_id)
+    # The cached evidence table would otherwise keep listing the deleted PDFs
+    for project_id in project_ids:
+        remove_file(evidence_table_path(project_id))
+    logger.info("Deleted PDFs", extra={"pdf_ids": pdf_ids})
+
+async def delete_project(db: AsyncSession, project_id: str) -> None:
+    pdf_ids = await delete_project_rows(db, project_id)
+    for pdf_id in pdf_ids:
+        await asyncio.to_thread(remove_pdf_artefacts, pdf_id)
+    remove_file(evidence_table_path(project_id))
+    logger.info("Deleted project", extra={"deleted_project": project_id, "pdf_ids": pdf_ids})
+
+def file_stems(folder: str, suffixes: tuple) -> dict:
+    """File name stem -> newest modification time, for files with the given suffixes"""
+    stems = {}
+    if os.path.isdir(folder):
+        for name in os.listdir(folder):
+            stem, suffix = os.path.splitext(name)
+            if suffix in suffixes:
+                stems[stem] = max(stems.get(stem, 0), os.path.getmtime(os.path.join(folder, name)))
+    return stems
+
+async def collect_garbage(db: AsyncSession, grace_seconds: int = GC_GRACE_SECONDS,
+                          prune_cache: bool = GC_PRUNE_EMBEDDING_CACHE) -> dict:
+    """
+    Removes database rows and artefacts of PDFs and projects that no longer exist:
+    vectors, chunks, uploads, summaries and evidence tables. Then drops cached vectors no PDF uses and
+    compacts the local vector index. Returns what was removed.
+    """
+    orphaned_rows = await delete_orphaned_rows(db)
+    live_pdfs = set(await db.scalars(select(Pdf.id)))
+    live_projects = set(await db.scalars(select(Project.id)))
+    cutoff = time.time() - grace_seconds
+
+    files = {}
+    for folder, suffixes in ((UPLOAD_FOLDER, (".pdf",)), (SUMMARY_FOLDER, (".txt", ".partial"))):
+        for stem, mtime in file_stems(folder, suffixes).items():
+            files[stem] = max(files.get(stem, 0), mtime)
+
+    candidates = (embedding_cache.member_pdf_ids() | set(stored_pdf_ids()) | set(files)) - live_pdfs
+    orphaned = sorted(pdf_id for pdf_id in candidates if files.get(pdf_id, 0) < cutoff)
+    for pdf_id in orphaned:
+        await asyncio.to_thread(remove_pdf_artefacts, pdf_id)
+
+    evidence_tables = [
+        stem[:-len("_evidence_table")]
+        for stem in file_stems(REVIEW_RESULT_FOLDER, (".json",))
+        if stem.endswith("_evidence_table")
+    ]
+    orphaned_tables = [project_id for project_id in evidence_tables if project_id not in live_projects]
+    for project_id in orphaned_tables:
+        remove_file(evidence_table_path(project_id))
+
+    pruned = await asyncio.to_thread(embedding_cache.prune_vectors) if prune_cache else 0
+    store = vector_store.get()
+    compacted = await asyncio.to_thread(store.compact) if hasattr(store, "compact") else 0
+
+    report = {
+        "orphaned_rows": orphaned_rows,
+        "orphaned_pdfs": len(orphaned),
+        "evidence_tables": len(orphaned_tables),
+        "cached_vectors_pruned": pruned,
+        "index_rows_compacted": compacted,
+    }
+    logger.info("Garbage collection finished", extra=report)
+    return report
+
+async def main() -> None:
+    try:
+        async with AsyncSessionLocal() as db:
+            print(json.dumps(await collect_garbage(db), indent=2))
+    finally:
+        # Pooled aiosqlite connections run in threads that otherwise keep the process alive
+        await async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
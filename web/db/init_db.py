@@ -3,6 +3,10 @@ from web.db.models.pdf import Pdf
 from web.db.models.conversation import Conversation  
 from web.db.models.message import Message 
 from web.db.models.project import Project
+from web.db.models.screening_result import ScreeningResult
+from web.db.models.project_pdf_filter import ProjectPdfFilter
+from web.db.models.llm_usage import LlmUsage
+from web.db.models.pdf_checkpoint import PdfCheckpoint
 
 Base.metadata.drop_all(bind=engine)
 Base.metadata.create_all(bind=engine)
@@ -1,6 +1,6 @@
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, DateTime, ForeignKey, Integer
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Text, Index
 from sqlalchemy.orm import relationship
 
 from web.db import Base, BaseMixin
@@ -8,6 +8,9 @@ from web.db import Base, BaseMixin
 
 class Conversation(Base, BaseMixin):
     __tablename__ = "conversation"
+    __table_args__ = (
+        Index("ix_conversation_pdf_id_created_on", "pdf_id", "created_on"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     created_on = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -16,6 +19,9 @@ class Conversation(Base, BaseMixin):
     memory = Column(String, nullable=True)
     llm = Column(String, nullable=True)
 
+    history_summary = Column(Text, nullable=True)
+    summarised_until = Column(DateTime, nullable=True)
+
     pdf_id = Column(String, ForeignKey("pdfs.id"), nullable=False)
     pdf = relationship("Pdf", back_populates="conversations")
 
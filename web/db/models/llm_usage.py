@@ -0,0 +1,35 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Float, Index
+from sqlalchemy.orm import relationship
+
+from web.db import Base, BaseMixin
+
+
+class LlmUsage(Base, BaseMixin):
+    """
+    Running totals of LLM and embedding usage for a project, broken down by PDF,
+    pipeline stage and model. Usage not tied to a single PDF has an empty pdf_id.
+    """
+
+    __tablename__ = "llm_usage"
+    __table_args__ = (
+        Index("ix_llm_usage_project_id_stage", "project_id", "stage"),
+    )
+
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    pdf_id = Column(String, primary_key=True, default="")
+    stage = Column(String, primary_key=True)
+    model = Column(String, primary_key=True)
+
+    calls = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    cost_usd = Column(Float, nullable=False, default=0.0)
+
+    updated_on = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    project = relationship("Project", back_populates="llm_usage")
@@ -2,7 +2,7 @@
 
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy import Column, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from langchain.schema.messages import AIMessage, HumanMessage, SystemMessage
 
@@ -11,6 +11,9 @@ from web.db import Base, BaseMixin
 
 class Message(Base, BaseMixin):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_conversation_id_created_on", "conversation_id", "created_on"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     created_on = Column(DateTime, default=lambda: datetime.now(timezone.utc))
@@ -1,15 +1,20 @@
-from sqlalchemy import Column, String, ForeignKey
+from sqlalchemy import Column, String, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from web.db import Base, BaseMixin
 import uuid
 
 class Pdf(Base, BaseMixin):
     __tablename__ = "pdfs"
+    __table_args__ = (
+        Index("ix_pdfs_project_id_name_id", "project_id", "name", "id"),
+    )
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     name = Column(String, nullable=False)
     project_id = Column(String, ForeignKey("projects.id"))
     title = Column(String, nullable=True) 
+    # Why the last processing attempt failed, shown until a resume succeeds
+    error = Column(String, nullable=True)
 
     conversations = relationship(
         "Conversation",
@@ -19,6 +24,10 @@ class Pdf(Base, BaseMixin):
     )
 
     project = relationship("Project", back_populates="pdfs")
+    screening_result = relationship(
+        "ScreeningResult", back_populates="pdf", uselist=False, cascade="all, delete-orphan"
+    )
+    checkpoints = relationship("PdfCheckpoint", back_populates="pdf", cascade="all, delete-orphan")
 
     def as_dict(self):
         return {"id": self.id, "name": self.name, "project_id": self.project_id, "title": self.title}
@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy.orm import relationship
+
+from web.db import Base, BaseMixin
+
+# Processing stages of a PDF, in pipeline order
+PDF_STAGES = ("parsed", "embedded", "filtered", "summarised", "screened")
+
+
+class PdfCheckpoint(Base, BaseMixin):
+    """Records that a processing stage has completed for a PDF, so reruns can skip it"""
+
+    __tablename__ = "pdf_checkpoints"
+
+    pdf_id = Column(String, ForeignKey("pdfs.id", ondelete="CASCADE"), primary_key=True)
+    stage = Column(String, primary_key=True)
+    completed_on = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    pdf = relationship("Pdf", back_populates="checkpoints")
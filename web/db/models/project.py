@@ -7,10 +7,11 @@ class Project(Base):
     __tablename__ = "projects"
 
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, index=True)
     review_question = Column(Text, nullable=True)
     review_type = Column(Enum("intervention", "diagnostic", "prognostic", "methodological", "qualitative", name="review_type"), nullable=False)
     search_criteria = Column(String, nullable=True)
-    filtered_pdf_ids = Column(Text, nullable=True)
     
     pdfs = relationship("Pdf", back_populates="project", cascade="all, delete-orphan")
+    pdf_filters = relationship("ProjectPdfFilter", back_populates="project", cascade="all, delete-orphan")
+    llm_usage = relationship("LlmUsage", back_populates="project", cascade="all, delete-orphan")
@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, DateTime, ForeignKey, Float, Index
+from sqlalchemy.orm import relationship
+
+from web.db import Base, BaseMixin
+
+
+class ProjectPdfFilter(Base, BaseMixin):
+    """Membership of a PDF in the similarity-filtered shortlist of its project"""
+
+    __tablename__ = "project_pdf_filters"
+    __table_args__ = (
+        Index("ix_project_pdf_filters_project_id_score", "project_id", "score"),
+    )
+
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    pdf_id = Column(String, ForeignKey("pdfs.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=True)
+    created_on = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+    project = relationship("Project", back_populates="pdf_filters")
+    pdf = relationship("Pdf")
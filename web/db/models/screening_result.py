@@ -0,0 +1,43 @@
+import uuid
+from datetime import datetime, timezone
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, Text, JSON, Index
+from sqlalchemy.orm import relationship
+
+from web.db import Base, BaseMixin
+
+
+class ScreeningResult(Base, BaseMixin):
+    __tablename__ = "screening_results"
+    __table_args__ = (
+        Index("ix_screening_results_project_id_decision", "project_id", "decision"),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    pdf_id = Column(String, ForeignKey("pdfs.id"), nullable=False, unique=True)
+    project_id = Column(String, ForeignKey("projects.id"), nullable=True)
+
+    decision = Column(String, nullable=False, default="Unclear")
+    confidence = Column(Integer, nullable=False, default=0)
+    criteria_matches = Column(JSON, nullable=False, default=dict)
+    rationale = Column(Text, nullable=True)
+    screening_stage = Column(String, nullable=True)
+    model = Column(String, nullable=True)
+
+    created_on = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+    updated_on = Column(
+        DateTime,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+    )
+
+    pdf = relationship("Pdf", back_populates="screening_result")
+
+    def as_dict(self):
+        return {
+            "decision": self.decision,
+            "confidence": self.confidence,
+            "rationale": self.rationale,
+            "criteria_matches": self.criteria_matches or {},
+            "screening_stage": self.screening_stage,
+            "model": self.model,
+        }
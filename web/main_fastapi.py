@@ -4,44 +4,54 @@ import asyncio
 import time
 import json
 import logging
-from typing import List, Dict
-from langchain_core.documents import Document
+from typing import List
 # What is the effectiveness of cognitive behavioral therapy (CBT) for treating depression in adolescents?
 
 from fastapi import FastAPI, UploadFile, File, Request, Depends, Form
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.templating import Jinja2Templates
-from fastapi.responses import FileResponse, RedirectResponse
 from fastapi.concurrency import run_in_threadpool
+from fastapi.templating import Jinja2Templates
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
 
-from app.vector_stores.pinecone import process_embeddings
-from app.title_extraction import chunk_document_by_titles
 from app.celery.tasks import embeddings
 from web.routes.conversation_messages import router as conversation_router
-from app.systematic_review import filter_documents_by_similarity, wait_for_embeddings, get_screening_result
 from app.evidence_table import create_evidence_table
 from app.criteria.criteria import criteria_dict
+from app.providers import WARM_UP_PROVIDERS, warm_up
+from app.metrics import current_project, render_metrics
+from app.logs import current_job, setup_logging
+from app.usage import flush_usage, set_usage_sink
 
-from web.db import get_db
+from web.db import engine, get_async_db
 from web.db.models.pdf import Pdf
 from web.db.models.project import Project
 from web.db.models.conversation import Conversation
-from sqlalchemy.orm import Session
+from web.api import (
+    list_projects, list_project_pdfs, count_project_decisions, count_project_stages, get_project_usage,
+    count_filtered_pdfs, store_llm_usage, upgrade_schema,
+)
+from web.pipeline import (
+    UPLOAD_FOLDER, SUMMARY_FOLDER, REVIEW_RESULT_FOLDER, upload_path, evidence_table_path, run_project_pipeline,
+)
+from web.cleanup import delete_pdfs, delete_project
+from web.pagination import InvalidCursor
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 import uuid
 
 
 # Configure Logging
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Paths
-UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
-SUMMARY_FOLDER = os.path.join(os.getcwd(), 'summaries')
-REVIEW_RESULT_FOLDER = os.path.join(os.getcwd(), 'review_results')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(SUMMARY_FOLDER, exist_ok=True)
 os.makedirs(REVIEW_RESULT_FOLDER, exist_ok=True)
+SUMMARY_STREAM_POLL_INTERVAL = 0.5
+SUMMARY_STREAM_TIMEOUT = 900
 
 # FastAPI Setup
 app = FastAPI()
@@ -50,51 +60,51 @@ app.mount("/uploads", StaticFiles(directory=UPLOAD_FOLDER), name="uploads")
 app.mount("/static", StaticFiles(directory="web/static"), name="static")
 templates = Jinja2Templates(directory="web/templates") 
 
-# Helpers
-async def process_single_pdf(pdf: UploadFile, project: Project, db: Session) -> tuple[str, List[Document]]:
-    if not pdf.filename.endswith('.pdf'):
-        return None, []
-
-    pdf_id = str(uuid.uuid4())
-    file_path = os.path.join(UPLOAD_FOLDER, f"{pdf_id}.pdf")
-
-    async with aiofiles.open(file_path, 'wb') as f:
-        await f.write(await pdf.read())
-
-    logger.info(f"Uploaded {pdf.filename} to {file_path}")
-
-    chunked_docs, pdf_title = await run_in_threadpool(chunk_document_by_titles, file_path, 500, 50)
-
-    db_pdf = Pdf(id=pdf_id, name=pdf.filename, project_id=project.id, title=pdf_title)
-    db.add(db_pdf)
-
-    serialized_docs = [
-        {"page_content": doc.page_content, "metadata": {**doc.metadata, "pdf_id": pdf_id}}
-        for doc in chunked_docs
-    ]
-
-    logger.info(f"Creating embeddings for {pdf.filename}")
+@app.middleware("http")
+async def correlate_request(request: Request, call_next):
+    """Tag everything logged while handling a request with its ID, echoed in X-Request-ID"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:12]
+    token = current_job.set(request_id)
     try:
-        await run_in_threadpool(process_embeddings, pdf_id, serialized_docs)
-    except Exception as e:
-        logger.error(f"Failed to process embeddings for {pdf.filename}: {e}")
-
-    return pdf_id, chunked_docs
+        response = await call_next(request)
+    finally:
+        current_job.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+@app.on_event("startup")
+def ensure_db_schema():
+    upgrade_schema(engine, REVIEW_RESULT_FOLDER)
+
+@app.on_event("startup")
+def store_usage_in_db():
+    set_usage_sink(store_llm_usage)
+
+@app.on_event("startup")
+async def warm_up_providers():
+    """Connect to OpenAI and Pinecone in the background so the first request doesn't pay for it"""
+    if WARM_UP_PROVIDERS:
+        asyncio.get_running_loop().run_in_executor(None, warm_up)
 
-async def process_uploaded_pdfs(pdfs: List[UploadFile], project: Project, db: Session) -> Dict[str, List]:
-    tasks = [process_single_pdf(pdf, project, db) for pdf in pdfs]
-    results = await asyncio.gather(*tasks)
+# Helpers
+async def save_uploads(pdfs: List[UploadFile], project: Project, db: AsyncSession) -> List[str]:
+    """Store the uploaded PDF files and create their rows; processing happens in stages afterwards"""
+    pdf_ids = []
+    for pdf in pdfs:
+        if not pdf.filename.endswith('.pdf'):
+            continue
 
-    all_pdf_ids = []
-    chunks_dict = {}
+        pdf_id = str(uuid.uuid4())
+        file_path = upload_path(pdf_id)
+        async with aiofiles.open(file_path, 'wb') as f:
+            await f.write(await pdf.read())
+        logger.info("Uploaded %s to %s", pdf.filename, file_path)
 
-    for pdf_id, chunks in results:
-        if pdf_id:
-            all_pdf_ids.append(pdf_id)
-            chunks_dict[pdf_id] = chunks
+        db.add(Pdf(id=pdf_id, name=pdf.filename, project_id=project.id))
+        pdf_ids.append(pdf_id)
 
-    db.commit()
-    return all_pdf_ids, chunks_dict
+    await db.commit()
+    return pdf_ids
 
 # Routes
 @app.post("/projects/new", response_class=HTMLResponse)
@@ -105,7 +115,7 @@ async def create_project(
     review_type: str = Form(...),
     search_criteria: str = Form(...),
     pdfs: List[UploadFile] = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     project = Project(
         name=name,
@@ -114,105 +124,135 @@ async def create_project(
         search_criteria=search_criteria,
     )
     db.add(project)
-    db.commit()
-    db.refresh(project)
+    await db.commit()
+    current_project.set(project.id)
 
     logger.info("Starting upload and processing")
     start = time.perf_counter()
 
-    all_pdf_ids, chunks_dict = await process_uploaded_pdfs(pdfs, project, db)
+    pdf_ids = await save_uploads(pdfs, project, db)
+    await run_project_pipeline(project, pdf_ids)
 
-    await wait_for_embeddings(all_pdf_ids, timeout=120, poll_interval=5)
-
-    filtered_ids = filter_documents_by_similarity(review_question, all_pdf_ids, n=3)
-    project.filtered_pdf_ids = json.dumps(filtered_ids)
-    db.commit()
-
-    tasks = [
-        get_screening_result(
-            pdf_id, review_question, SUMMARY_FOLDER, REVIEW_RESULT_FOLDER,
-            chunks_dict[pdf_id], criteria_dict.get(project.search_criteria, [])
-        )
-        for pdf_id in filtered_ids
-    ]
-    await asyncio.gather(*tasks)
-
-    logger.info(f"Project completed in {time.perf_counter() - start:.2f}s")
+    logger.info("Project completed in %.2fs", time.perf_counter() - start)
     return RedirectResponse("/", status_code=303)
 
 @app.get("/", response_class=HTMLResponse)
-async def home(request: Request, db: Session = Depends(get_db)):
-    projects = db.query(Project).all()
-    return templates.TemplateResponse("home.html", {"request": request, "projects": projects})
+async def home(request: Request, cursor: str | None = None, db: AsyncSession = Depends(get_async_db)):
+    try:
+        projects, next_cursor = await list_projects(db, cursor=cursor)
+    except InvalidCursor:
+        return HTMLResponse(content="Invalid page cursor", status_code=400)
+    return templates.TemplateResponse("home.html", {
+        "request": request,
+        "projects": projects,
+        "next_cursor": next_cursor,
+        "is_first_page": cursor is None,
+    })
 
 @app.post("/projects/{project_id}/upload", response_class=HTMLResponse)
 async def handle_upload(
     request: Request,
     project_id: str,
     pdfs: List[UploadFile] = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     
     logger.info("Starting upload and processing")
     start = time.perf_counter()
     
-    project = db.query(Project).filter_by(id=project_id).first()
+    project = await db.get(Project, project_id)
     if not project:
         return HTMLResponse(content="Invalid project ID", status_code=400)
+    current_project.set(project.id)
 
-    all_pdf_ids, chunks_dict = await process_uploaded_pdfs(pdfs, project, db)
+    pdf_ids = await save_uploads(pdfs, project, db)
+    await run_project_pipeline(project, pdf_ids)
+    
+    logger.info("Upload completed in %.2fs", time.perf_counter() - start)
 
+    return RedirectResponse(f"/projects/{project_id}", status_code=303)
 
-    await wait_for_embeddings(all_pdf_ids, timeout=120, poll_interval=5)
+@app.post("/projects/{project_id}/resume", response_class=HTMLResponse)
+async def resume_project(project_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Run whatever stages are unfinished for the project's PDFs, e.g. after a crash or deploy"""
+    project = await db.get(Project, project_id)
+    if not project:
+        return HTMLResponse(content="Project not found", status_code=404)
+    current_project.set(project.id)
 
-    review_question = project.review_question
-    filtered_ids = json.loads(project.filtered_pdf_ids or "[]")
-    new_filtered = filter_documents_by_similarity(review_question, all_pdf_ids, n=3)
-    merged_filtered_ids = list(set(filtered_ids + new_filtered))
-    project.filtered_pdf_ids = json.dumps(merged_filtered_ids)
-    
-    db_pdfs = db.query(Pdf).filter(Pdf.id.in_(merged_filtered_ids)).all()
-    db.commit()
-    
-    criteria = criteria_dict.get(project.search_criteria, [])
+    logger.info("Resuming project processing")
+    start = time.perf_counter()
 
-    tasks = [
-        get_screening_result(pdf_id, review_question, SUMMARY_FOLDER, REVIEW_RESULT_FOLDER, chunks_dict[pdf_id], criteria)
-        for pdf_id in new_filtered
-    ]
-    await asyncio.gather(*tasks)
-    
-    logger.info(f"Upload completed in {time.perf_counter() - start:.2f}s")
+    pdf_ids = list(await db.scalars(select(Pdf.id).where(Pdf.project_id == project_id)))
+    await run_project_pipeline(project, pdf_ids)
 
+    logger.info("Resume completed in %.2fs", time.perf_counter() - start)
+    return RedirectResponse(f"/projects/{project_id}", status_code=303)
+
+
+@app.post("/projects/{project_id}/delete")
+async def remove_project(project_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Delete a project with its PDFs, vectors, chunks and files"""
+    if not await db.get(Project, project_id):
+        return HTMLResponse(content="Project not found", status_code=404)
+
+    current_project.set(project_id)
+    await delete_project(db, project_id)
+    return RedirectResponse("/", status_code=303)
+
+
+@app.post("/pdfs/{pdf_id}/delete")
+async def remove_pdf(pdf_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Delete a PDF with its vectors, chunks, summary and conversations"""
+    pdf = await db.get(Pdf, pdf_id)
+    if not pdf:
+        return HTMLResponse(content="PDF not found", status_code=404)
+
+    project_id = pdf.project_id
+    current_project.set(project_id)
+    await delete_pdfs(db, [pdf_id])
     return RedirectResponse(f"/projects/{project_id}", status_code=303)
 
 
 @app.get("/projects/{project_id}", response_class=HTMLResponse)
-async def view_project(request: Request, project_id: str, db: Session = Depends(get_db)):
-    project = db.query(Project).filter_by(id=project_id).first()
+async def view_project(
+    request: Request,
+    project_id: str,
+    decision: str | None = None,
+    sort: str = "name",
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    project = await db.get(Project, project_id)
     if not project:
         return HTMLResponse(content="Project not found", status_code=404)
 
-    pdfs = db.query(Pdf).filter_by(project_id=project_id).all()
-    filtered_ids = json.loads(project.filtered_pdf_ids or "[]")
-    
-    screening_decisions = {}
-    for pdf_id in filtered_ids:
-        review_path = os.path.join("review_results", f"{pdf_id}_screening_result.json")
-        if os.path.exists(review_path):
-            with open(review_path, "r", encoding="utf-8") as f:
-                try:
-                    result = json.load(f)
-                    screening_decisions[pdf_id] = result.get("decision", "Unclear")
-                except Exception:
-                    screening_decisions[pdf_id] = "Unclear"
+    try:
+        pdfs, next_cursor = await list_project_pdfs(db, project_id, decision=decision, sort=sort, cursor=cursor)
+    except InvalidCursor:
+        return HTMLResponse(content="Invalid page cursor", status_code=400)
+    screening_decisions = {pdf.id: pdf.decision for pdf in pdfs if pdf.decision}
+    decision_counts = await count_project_decisions(db, project_id)
+    usage = await get_project_usage(db, project_id, group_by="stage_model")
+    stage_counts = await count_project_stages(db, project_id)
+    shortlisted_count = await count_filtered_pdfs(db, project_id)
 
     return templates.TemplateResponse("project_detail.html", {
         "request": request,
         "project": project,
         "pdfs": pdfs,
         "screening_decisions": screening_decisions,
+        "decision_counts": decision_counts,
+        "total_pdfs": sum(decision_counts.values()),
+        "decision_filter": decision,
+        "sort": sort,
+        "next_cursor": next_cursor,
+        "is_first_page": cursor is None,
         "evidence_table": [],
+        "usage": usage,
+        "stage_counts": stage_counts,
+        "shortlisted_count": shortlisted_count,
+        "total_cost": sum(row["cost_usd"] for row in usage),
     })
     
 @app.post("/projects/{project_id}/evidence", response_class=HTMLResponse)
@@ -220,17 +260,19 @@ async def generate_evidence_table(
     request: Request,
     project_id: str,
     pdf_ids: List[str] = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    pdfs = db.query(Pdf).filter(Pdf.id.in_(pdf_ids)).all()
+    pdfs = (await db.scalars(select(Pdf).where(Pdf.id.in_(pdf_ids)))).all()
     pdf_dict = {pdf.id: pdf for pdf in pdfs}
 
-    project = db.query(Project).filter_by(id=project_id).first()
+    project = await db.get(Project, project_id)
     criteria = criteria_dict.get(project.search_criteria, [])
+    current_project.set(project.id)
 
     table = await create_evidence_table(pdf_dict, criteria, k=5)
+    await flush_usage()
 
-    cached_path = os.path.join("review_results", f"{project_id}_evidence_table.json")
+    cached_path = evidence_table_path(project_id)
     with open(cached_path, "w", encoding="utf-8") as f:
         json.dump(table, f, indent=2)
 
@@ -243,9 +285,8 @@ async def generate_evidence_table(
 async def get_cached_evidence_table(
     request: Request,
     project_id: str,
-    db: Session = Depends(get_db)
 ):
-    path = os.path.join("review_results", f"{project_id}_evidence_table.json")
+    path = evidence_table_path(project_id)
     
     if not os.path.exists(path):
         return HTMLResponse(content="Evidence table not found.", status_code=404)
@@ -259,43 +300,107 @@ async def get_cached_evidence_table(
     })
 
 @app.get("/view/{pdf_id}", response_class=HTMLResponse)
-async def view_pdf(request: Request, pdf_id: str, db: Session = Depends(get_db)):
+async def view_pdf(request: Request, pdf_id: str, db: AsyncSession = Depends(get_async_db)):
     summary_path = os.path.join(SUMMARY_FOLDER, f"{pdf_id}.txt")
-    review_path = os.path.join(REVIEW_RESULT_FOLDER, f"{pdf_id}_screening_result.json")
-    pdf = db.query(Pdf).filter_by(id=pdf_id).first()
+    pdf = await db.get(Pdf, pdf_id, options=[selectinload(Pdf.screening_result)])
 
     if not pdf:
         return {"error": "PDF not found"}
 
-    conversation = db.query(Conversation).filter_by(pdf_id=pdf.id).order_by(Conversation.created_on.desc()).first()
+    conversation = await db.scalar(
+        select(Conversation).filter_by(pdf_id=pdf.id).order_by(Conversation.created_on.desc()).limit(1)
+    )
     if not conversation:
         conversation = Conversation(pdf_id=pdf.id)
         db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
+        await db.commit()
 
+    partial_path = os.path.join(SUMMARY_FOLDER, f"{pdf_id}.partial")
     summary_text = "Summary not available."
+    summary_streaming = False
     if os.path.exists(summary_path):
         async with aiofiles.open(summary_path, "r", encoding="utf-8") as f:
             summary_text = await f.read()
+    elif os.path.exists(partial_path):
+        async with aiofiles.open(partial_path, "r", encoding="utf-8") as f:
+            summary_text = await f.read() or "Summary is being generated..."
+        summary_streaming = True
 
-    screening_result = {}
-    if os.path.exists(review_path):
-        async with aiofiles.open(review_path, "r", encoding="utf-8") as f:
-            screening_result = json.loads(await f.read())
+    screening_result = pdf.screening_result.as_dict() if pdf.screening_result else {}
 
     return templates.TemplateResponse("view.html", {
         "request": request,
         "filename": f"{pdf.id}.pdf",
+        "pdf_id": pdf.id,
         "summary_text": summary_text,
+        "summary_streaming": summary_streaming,
         "screening_result": screening_result,
         "display_name": pdf.name,
         "conversation_id": conversation.id,
     })
 
+@app.get("/view/{pdf_id}/summary/stream")
+async def stream_summary(pdf_id: str):
+    """
+    Server-sent events stream of a summary that is still being generated.
+    Sends the partial HTML whenever it changes and a final "done" event once
+    the finished summary has been written.
+    """
+    summary_path = os.path.join(SUMMARY_FOLDER, f"{pdf_id}.txt")
+    partial_path = os.path.join(SUMMARY_FOLDER, f"{pdf_id}.partial")
+
+    async def event_stream():
+        last_sent = None
+        start = time.perf_counter()
+        while time.perf_counter() - start < SUMMARY_STREAM_TIMEOUT:
+            if os.path.exists(summary_path):
+                async with aiofiles.open(summary_path, "r", encoding="utf-8") as f:
+                    final_html = await f.read()
+                yield f"event: done\ndata: {json.dumps({'html': final_html})}\n\n"
+                return
+
+            if os.path.exists(partial_path):
+                async with aiofiles.open(partial_path, "r", encoding="utf-8") as f:
+                    partial_html = await f.read()
+                if partial_html and partial_html != last_sent:
+                    last_sent = partial_html
+                    yield f"data: {json.dumps({'html': partial_html})}\n\n"
+            elif last_sent is None:
+                yield "event: missing\ndata: {}\n\n"
+                return
+
+            await asyncio.sleep(SUMMARY_STREAM_POLL_INTERVAL)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
 @app.get("/download_summary/{filename}")
 async def download_summary(filename: str):
     path = os.path.join(SUMMARY_FOLDER, filename)
     if os.path.exists(path):
         return FileResponse(path, filename=filename, media_type='application/octet-stream')
     return {"error": "File not found"}
+
+@app.get("/projects/{project_id}/usage")
+async def project_usage(project_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Token and cost totals for a project by stage, model and PDF"""
+    project = await db.get(Project, project_id)
+    if not project:
+        return JSONResponse({"error": "Project not found"}, status_code=404)
+
+    by_stage = await get_project_usage(db, project_id, group_by="stage")
+    return {
+        "project_id": project_id,
+        "total": {
+            name: sum(row[name] for row in by_stage)
+            for name in ("calls", "prompt_tokens", "completion_tokens", "cost_usd")
+        },
+        "by_stage": by_stage,
+        "by_model": await get_project_usage(db, project_id, group_by="model"),
+        "by_pdf": await get_project_usage(db, project_id, group_by="pdf"),
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Pipeline, LLM and cache metrics in the Prometheus text format"""
+    # Gauges such as the broker queue length do blocking I/O when read, so scrape off the event loop
+    return PlainTextResponse(await run_in_threadpool(render_metrics), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,56 @@
+import os
+import json
+import base64
+from sqlalchemy import and_, or_
+
+PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "50"))
+
+def encode_cursor(values: list) -> str:
+    """Opaque URL-safe cursor holding the sort key of the last row on a page"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+class InvalidCursor(ValueError):
+    """A page cursor that was not produced by encode_cursor, e.g. edited by hand"""
+
+def decode_cursor(cursor: str | None) -> list | None:
+    """The (sort value, id) pair held by a cursor; raises InvalidCursor if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list) or len(values) != 2 \
+            or not all(value is None or isinstance(value, (str, int, float)) for value in values):
+        raise InvalidCursor(cursor)
+    return values
+
+def keyset_filter(sort_key, id_column, descending: bool, last_value, last_id):
+    """
+    Condition selecting the rows that come after (last_value, last_id) when ordering by
+    sort_key (ascending or descending) with id_column as the ascending tie-breaker.
+    """
+    after_value = sort_key < last_value if descending else sort_key > last_value
+    return or_(after_value, and_(sort_key == last_value, id_column > last_id))
+
+def keyset_order(sort_key, id_column, descending: bool) -> list:
+    return [sort_key.desc() if descending else sort_key.asc(), id_column.asc()]
+
+def paginate_keyset(query, sort_key, id_column, descending: bool = False, cursor: str | None = None, limit: int = PAGE_SIZE):
+    """
+    Apply keyset pagination to a select. The sort key and id are added as the last two
+    result columns so the next cursor can be built without another query.
+    Returns the statement and a function turning the fetched rows into (rows, next_cursor).
+    """
+    position = decode_cursor(cursor)
+    if position:
+        query = query.where(keyset_filter(sort_key, id_column, descending, *position))
+    query = query.add_columns(sort_key, id_column).order_by(*keyset_order(sort_key, id_column, descending)).limit(limit + 1)
+
+    def page(rows):
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][-2], rows[-1][-1]]) if has_more else None
+        return rows, next_cursor
+
+    return query, page
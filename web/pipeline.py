@@ -0,0 +1,173 @@
+"""
+Project processing as resumable stages: parse -> embed -> filter -> summarise -> screen.
+
+Each stage records a checkpoint per PDF when it completes, and is skipped for PDFs
+that already have one, so rerunning a project after a crash or deploy only does the
+unfinished work. Parsed chunks are persisted, so later stages never re-parse.
+"""
+import os
+import asyncio
+import logging
+from typing import Awaitable, Dict, Iterable, List, Set
+from fastapi.concurrency import run_in_threadpool
+from langchain_core.documents import Document
+
+from app.title_extraction import chunk_document_by_titles
+from app.vector_stores.bm25 import add_pdf_chunks, load_chunks
+from app.vector_stores.pinecone import process_embeddings
+from app.systematic_review import rank_documents_by_similarity, wait_for_embeddings, get_screening_result
+from app.criteria.criteria import criteria_dict
+from app.metrics import attributed_to
+from app.usage import flush_usage
+from web.db import AsyncSessionLocal
+from web.db.models.pdf import Pdf
+from web.db.models.project import Project
+from web.api import (
+    add_filtered_pdfs, get_filtered_pdf_ids, get_pdf_stages, mark_pdf_stage, save_screening_result, set_pdf_error,
+)
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", os.path.join(os.getcwd(), 'uploads'))
+SUMMARY_FOLDER = os.getenv("SUMMARY_FOLDER", os.path.join(os.getcwd(), 'summaries'))
+REVIEW_RESULT_FOLDER = os.getenv("REVIEW_RESULT_FOLDER", os.path.join(os.getcwd(), 'review_results'))
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+FILTER_TOP_N = 3
+
+def upload_path(pdf_id: str) -> str:
+    return os.path.join(UPLOAD_FOLDER, f"{pdf_id}.pdf")
+
+def evidence_table_path(project_id: str) -> str:
+    return os.path.join(REVIEW_RESULT_FOLDER, f"{project_id}_evidence_table.json")
+
+async def gather_limited(coros: Iterable[Awaitable], workers: int = 0) -> list:
+    """asyncio.gather with at most `workers` coroutines running at once; 0 means no limit"""
+    if not workers:
+        return await asyncio.gather(*coros)
+    semaphore = asyncio.Semaphore(workers)
+
+    async def run(coro: Awaitable):
+        async with semaphore:
+            return await coro
+    return await asyncio.gather(*[run(coro) for coro in coros])
+
+async def checkpoint(pdf_ids: List[str], stage: str, stages: Dict[str, Set[str]]) -> None:
+    # Stages run concurrently per PDF, so each checkpoint gets its own session
+    async with AsyncSessionLocal() as db:
+        await mark_pdf_stage(db, pdf_ids, stage)
+    for pdf_id in pdf_ids:
+        stages[pdf_id].add(stage)
+
+async def parse_pdf(pdf_id: str, stages: Dict[str, Set[str]]) -> List[Document]:
+    """Chunk a PDF and persist the chunks, or load them if it was already parsed"""
+    if "parsed" in stages[pdf_id]:
+        docs = await run_in_threadpool(load_chunks, pdf_id)
+        if docs:
+            return docs
+
+    chunked_docs, pdf_title = await run_in_threadpool(
+        chunk_document_by_titles, upload_path(pdf_id), CHUNK_SIZE, CHUNK_OVERLAP
+    )
+    serialized_docs = [
+        {"page_content": doc.page_content, "metadata": {**doc.metadata, "pdf_id": pdf_id}}
+        for doc in chunked_docs
+    ]
+    await run_in_threadpool(add_pdf_chunks, pdf_id, serialized_docs)
+
+    async with AsyncSessionLocal() as db:
+        pdf = await db.get(Pdf, pdf_id)
+        pdf.title = pdf_title
+        await mark_pdf_stage(db, [pdf_id], "parsed")
+    stages[pdf_id].add("parsed")
+    return [Document(**d) for d in serialized_docs]
+
+async def embed_pdf(pdf_id: str, docs: List[Document], stages: Dict[str, Set[str]]) -> None:
+    """Add a PDF's chunks to the vector store unless that already completed"""
+    if "embedded" in stages[pdf_id]:
+        return
+
+    serialized_docs = [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+    try:
+        await run_in_threadpool(process_embeddings, pdf_id, serialized_docs)
+    except Exception as e:
+        # Left without a checkpoint, so resuming the project retries it
+        logger.exception("Failed to process embeddings for %s: %s", pdf_id, e)
+        async with AsyncSessionLocal() as db:
+            await set_pdf_error(db, pdf_id, f"Embedding failed: {e}")
+        return
+    async with AsyncSessionLocal() as db:
+        await set_pdf_error(db, pdf_id, None)
+        await mark_pdf_stage(db, [pdf_id], "embedded")
+    stages[pdf_id].add("embedded")
+
+async def prepare_pdf(pdf_id: str, stages: Dict[str, Set[str]]) -> None:
+    docs = await parse_pdf(pdf_id, stages)
+    await embed_pdf(pdf_id, docs, stages)
+
+async def filter_pdfs(project: Project, pdf_ids: List[str], stages: Dict[str, Set[str]],
+                      top_n: int = FILTER_TOP_N) -> List[str]:
+    """
+    Rank the embedded PDFs that have not been ranked yet and add the best matches
+    to the project's shortlist. Returns the shortlisted PDFs among pdf_ids.
+    """
+    pending = [pdf_id for pdf_id in pdf_ids if "embedded" in stages[pdf_id] and "filtered" not in stages[pdf_id]]
+    if pending:
+        await wait_for_embeddings(pending, timeout=120, poll_interval=5)
+        ranked = rank_documents_by_similarity(project.review_question, pending, n=top_n)
+        async with AsyncSessionLocal() as db:
+            await add_filtered_pdfs(db, project.id, ranked)
+        await checkpoint(pending, "filtered", stages)
+
+    async with AsyncSessionLocal() as db:
+        shortlisted = await get_filtered_pdf_ids(db, project.id)
+    return [pdf_id for pdf_id in shortlisted if pdf_id in stages]
+
+async def screen_pdf(project: Project, pdf_id: str, stages: Dict[str, Set[str]]) -> None:
+    """Summarise and screen a shortlisted PDF, reusing its summary if only screening is missing"""
+    if "screened" in stages[pdf_id]:
+        return
+    docs = await parse_pdf(pdf_id, stages)
+
+    async def on_checkpoint(stage: str) -> None:
+        await checkpoint([pdf_id], stage, stages)
+
+    async def on_result(screening_result: dict, model: str | None) -> None:
+        async with AsyncSessionLocal() as db:
+            await save_screening_result(db, pdf_id, project.id, screening_result, model=model)
+
+    await get_screening_result(
+        pdf_id, project.id, project.review_question, SUMMARY_FOLDER, docs,
+        criteria_dict.get(project.search_criteria, []),
+        reuse_summary="summarised" in stages[pdf_id],
+        on_checkpoint=on_checkpoint,
+        on_result=on_result,
+    )
+    await checkpoint([pdf_id], "screened", stages)
+
+async def run_project_pipeline(project: Project, pdf_ids: List[str], workers: int = 0,
+                               top_n: int = FILTER_TOP_N) -> None:
+    """
+    Run every stage that has not completed yet for the given PDFs of a project, with
+    at most `workers` PDFs in flight per stage (0 means all at once). Chunks are reloaded
+    from disk for screening rather than held for every PDF, so memory stays bounded.
+    """
+    if not pdf_ids:
+        return
+
+    with attributed_to(project.id):
+        async with AsyncSessionLocal() as db:
+            stages = await get_pdf_stages(db, pdf_ids)
+
+        missing = [
+            pdf_id for pdf_id in pdf_ids
+            if "parsed" not in stages[pdf_id] and not os.path.exists(upload_path(pdf_id))
+        ]
+        if missing:
+            logger.warning("Skipping PDFs without an uploaded file", extra={"pdf_ids": missing})
+        pdf_ids = [pdf_id for pdf_id in pdf_ids if pdf_id not in missing]
+
+        await gather_limited((prepare_pdf(pdf_id, stages) for pdf_id in pdf_ids), workers)
+        shortlisted = await filter_pdfs(project, pdf_ids, {pdf_id: stages[pdf_id] for pdf_id in pdf_ids}, top_n)
+        await gather_limited((screen_pdf(project, pdf_id, stages) for pdf_id in shortlisted), workers)
+        await flush_usage()
@@ -1,53 +1,110 @@
-from fastapi import APIRouter, Depends, Request
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
+import json
+from fastapi import APIRouter, BackgroundTasks, Depends, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.chat.chat import build_chat
+from app.memories.sql_memory import update_history_summary
 from app.models import ChatArgs
-from web.db.models.pdf import Pdf
+from web.api import add_chat_turn
+from web.db.models.message import Message
 from web.db.models.conversation import Conversation
-from web.db import get_db
+from web.db import get_async_db, SessionLocal, AsyncSessionLocal
 
 router = APIRouter(prefix="/api/conversations")
 
+async def save_chat_turn(conversation_id: str, user_input: str, answer: str) -> None:
+    """
+    Persists a question and answer pair using a fresh session, since a streamed
+    response outlives the request-scoped session.
+    """
+    async with AsyncSessionLocal() as db:
+        await add_chat_turn(db, conversation_id, user_input, answer)
+
+def sse_event(data: dict, event: str | None = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
 @router.post("/{conversation_id}/messages")
-async def create_message(conversation_id: str, request: Request, db: Session = Depends(get_db)):
+async def create_message(
+    conversation_id: str,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db),
+):
     data = await request.json()
     user_input = data.get("input")
 
-    conversation = db.query(Conversation).filter_by(id=conversation_id).first()
+    conversation = await db.get(Conversation, conversation_id)
     if not conversation:
         return JSONResponse({"error": "Conversation not found"}, status_code=404)
-    pdf = db.query(Pdf).filter_by(id=conversation.pdf_id).first()
 
     chat_args = ChatArgs(
         conversation_id=conversation.id,
-        pdf_id=pdf.id,
-        streaming=False,
+        pdf_id=conversation.pdf_id,
+        streaming=bool(data.get("streaming", False)),
+        llm=conversation.llm,
+        retriever=conversation.retriever,
+        memory=conversation.memory,
         metadata={
             "conversation_id": conversation.id,
-            "pdf_id": pdf.id,
+            "pdf_id": conversation.pdf_id,
         }
     )
 
-    rag_chain, memory = build_chat(chat_args, db)
-    chat_history = memory.chat_memory.messages
-    response = rag_chain.invoke({
+    # LangChain memory is synchronous, so it gets its own session and only runs in the threadpool
+    memory_db = SessionLocal()
+    try:
+        rag_chain, memory = await run_in_threadpool(build_chat, chat_args, memory_db)
+        chat_history = await run_in_threadpool(lambda: memory.chat_memory.messages)
+    finally:
+        await run_in_threadpool(memory_db.close)
+    chain_input = {
         "input": user_input,
         "chat_history": chat_history
-    })
+    }
+
+    if not chat_args.streaming:
+        response = await rag_chain.ainvoke(chain_input)
+        await save_chat_turn(chat_args.conversation_id, user_input, response["answer"])
+        # Summarising older turns is another LLM call, so it runs after the answer is sent
+        background_tasks.add_task(update_history_summary, chat_args.conversation_id)
+        return {"role": "assistant", "content": response["answer"]}
 
-    memory.save_context({"input": user_input}, {"answer": response["answer"]})
+    async def event_stream():
+        answer_parts = []
+        try:
+            async for chunk in rag_chain.astream(chain_input):
+                token = chunk.get("answer")
+                if token:
+                    answer_parts.append(token)
+                    yield sse_event({"token": token})
+        except Exception as e:
+            yield sse_event({"error": str(e)}, event="error")
+            return
 
-    return {"role": "assistant", "content": response["answer"]}
+        answer = "".join(answer_parts)
+        await save_chat_turn(chat_args.conversation_id, user_input, answer)
+        yield sse_event({"role": "assistant", "content": answer}, event="done")
+        background_tasks.add_task(update_history_summary, chat_args.conversation_id)
+
+    # Background tasks added while streaming run once the stream has closed
+    return StreamingResponse(event_stream(), media_type="text/event-stream", background=background_tasks)
 
 @router.get("/{conversation_id}/messages")
-async def get_messages(conversation_id: str, db: Session = Depends(get_db)):
-    conversation = db.query(Conversation).filter_by(id=conversation_id).first()
+async def get_messages(conversation_id: str, db: AsyncSession = Depends(get_async_db)):
+    conversation = await db.get(Conversation, conversation_id)
     if not conversation:
         return JSONResponse({"error": "Conversation not found"}, status_code=404)
 
+    rows = await db.execute(
+        select(Message.role, Message.content)
+        .where(Message.conversation_id == conversation_id)
+        .order_by(Message.created_on)
+    )
     messages = [
-        {"role": m.role, "content": m.content}
-        for m in conversation.messages
+        {"role": role, "content": content}
+        for role, content in rows
     ]
     return messages
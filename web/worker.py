@@ -0,0 +1,22 @@
+"""
+Celery worker entry point: the app's tasks, with the LLM and embedding usage each task
+records stored in the web database when it finishes.
+
+    celery -A web.worker worker --loglevel=INFO
+"""
+from typing import List
+
+# celery -A loads celery_app from here
+from app.celery.worker import celery_app  # noqa: F401
+from app.usage import set_usage_sink
+from web.api import store_llm_usage
+from web.db import async_engine
+
+async def store_task_usage(rows: List[dict]) -> None:
+    try:
+        await store_llm_usage(rows)
+    finally:
+        # Each task flushes in an event loop of its own, so pooled connections can't carry over
+        await async_engine.dispose()
+
+set_usage_sink(store_task_usage)